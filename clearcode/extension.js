@@ -363,19 +363,42 @@ const assignmentsProvider = new AssignmentsProvider(
 
 let citationPromptInFlight = false;
 
-async function pushToFlask(payload, output) {
+// Server-side cap on lines per run document (LINE_RUN_MAX_LINES).
+const MAX_LINES_PER_RUN = 1000;
+
+// Split sorted 0-based line numbers into runs of consecutive lines, at most maxLen long.
+function toLineRuns(sortedLines, maxLen) {
+  const runs = [];
+  let run = [];
+  for (const line0 of sortedLines) {
+    if (run.length > 0 && (line0 !== run[run.length - 1] + 1 || run.length >= maxLen)) {
+      runs.push(run);
+      run = [];
+    }
+    run.push(line0);
+  }
+  if (run.length > 0) runs.push(run);
+  return runs;
+}
+
+// One request per flush: the server validates each event and commits them in write batches.
+async function pushBatchToFlask(payloads, output) {
+  if (payloads.length === 0) return;
   try {
-    const res = await fetch("http://localhost:5000/api/v1/assignments/push", {
+    const res = await fetch("http://localhost:5000/api/v1/assignments/push/batch", {
       method: "POST",
       headers: { "Content-Type": "application/json" },
-      body: JSON.stringify(payload),
+      body: JSON.stringify(payloads),
     });
 
     if (!res.ok) throw new Error(`HTTP ${res.status}`);
     const data = await res.json();
-    output.appendLine("Flask response: " + JSON.stringify(data));
+    output.appendLine(`Flask response: accepted=${data.accepted} rejected=${data.rejected}`);
+    for (const r of data.results || []) {
+      if (!r.ok) output.appendLine("Rejected event: " + JSON.stringify(r));
+    }
   } catch (err) {
-    output.appendLine("Failed to push payload: " + String(err?.message || err));
+    output.appendLine("Failed to push payloads: " + String(err?.message || err));
   }
 }
 
@@ -493,6 +516,7 @@ const interval = setInterval(async () => {
 
   // ---------------- your existing printing + pushing logic ----------------
   output.appendLine(`\n=== ${identity} @ ${new Date().toLocaleTimeString()} ===`);
+  const pendingPayloads = [];
 
   for (const [filePath, linesSet] of dirtyByFile.entries()) {
     const doc = getOpenDocByPath(filePath);
@@ -503,18 +527,21 @@ const interval = setInterval(async () => {
       continue;
     }
 
-    const lines = Array.from(linesSet).sort((a, b) => a - b);
+    const lines = Array.from(linesSet)
+      .filter((line0) => line0 >= 0 && line0 < doc.lineCount)
+      .sort((a, b) => a - b);
 
-    for (const line0 of lines) {
-      if (line0 < 0 || line0 >= doc.lineCount) continue;
-      const text = doc.lineAt(line0).text;
+    // build assignmentWantedFiles once per interval (optional micro-optimization)
+    const assignmentWantedFiles = assignments.map((name) => {
+      const key = `assignmentFile:${name}`;
+      const wanted = context.globalState.get(key, "not set");
+      return { name, file: wanted };
+    });
 
-      // build assignmentWantedFiles once per interval (optional micro-optimization)
-      const assignmentWantedFiles = assignments.map((name) => {
-        const key = `assignmentFile:${name}`;
-        const wanted = context.globalState.get(key, "not set");
-        return { name, file: wanted };
-      });
+    for (const run of toLineRuns(lines, MAX_LINES_PER_RUN)) {
+      const texts = run.map((line0) => doc.lineAt(line0).text);
+      const first = run[0];
+      const last = run[run.length - 1];
 
       for (const a of assignmentWantedFiles) {
         // IMPORTANT: compare by basename in case you stored relative path in globalState
@@ -524,7 +551,7 @@ const interval = setInterval(async () => {
           output.appendLine(`File ${wantedBase} is associated with assignment ${a.name}`);
 
           output.appendLine(
-            `${identity} | ${repoLink} | ${path.basename(filePath)} : Line ${line0 + 1} → ${text}`,
+            `${identity} | ${repoLink} | ${path.basename(filePath)} : Lines ${first + 1}-${last + 1} → ${texts.join(" ⏎ ")}`,
           );
 
           const payload = {
@@ -532,18 +559,26 @@ const interval = setInterval(async () => {
             GitHubName: identity,
             GitHubLink: repoLink,
             FilePath: path.basename(filePath),
-            LineNumber: line0 + 1,
-            LineContent: text,
+            LineNumber: first + 1,
             updatedAt: new Date().toISOString(),
           };
+          if (run.length === 1) {
+            payload.LineContent = texts[0];
+          } else {
+            // Run form: the server stores lines first..last as one document.
+            payload.LineNumberEnd = last + 1;
+            payload.LineContents = texts;
+          }
 
           output.appendLine("payload to send to flask: " + JSON.stringify(payload));
-          await pushToFlask(payload, output);
+          pendingPayloads.push(payload);
         }
       }
     }
   }
 
+  await pushBatchToFlask(pendingPayloads, output);
+
   dirtyByFile.clear();
   output.show(true);
 }, 20_000);
@@ -1,43 +1,43 @@
 """Assignments CRUD via Flask; data stored in Firestore."""
-from flask import Blueprint, current_app, jsonify, request
-from datetime import datetime, timezone, timedelta
-
-from server.fb_admin import get_firestore, verify_id_token
-
-import os
-import firebase_admin
-from firebase_admin import credentials, firestore
-
-def get_firestore():
-    try:
-        # Initialize only once
-        if not firebase_admin._apps:
-            cred_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
-            if not cred_path:
-                print("Missing GOOGLE_APPLICATION_CREDENTIALS")
-                return None
-            firebase_admin.initialize_app(credentials.Certificate(cred_path))
-
-        return firestore.client()
-    except Exception as e:
-        print("Firestore init failed:", e)
-        return None
+import click
+from flask import Blueprint, current_app, jsonify, request, stream_with_context
+from datetime import datetime, timezone
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from server import line_events, progress, sessionize
+from server.cascade_delete import (
+    DELETIONS_COLLECTION,
+    assignment_statuses,
+    cascade_delete,
+    get_deletion_queue,
+    ingest_rejection,
+    requeue_deletion,
+    status_cache,
+)
+from server.fb_admin import verify_id_token
+from server.ingest_queue import Rejected, WriteBehindQueue, get_line_event_queue
+from server.line_events import LINE_EVENTS_COLLECTION, VERSIONS_COLLECTION, to_epoch_ms
+from server.progress import CITATIONS_COLLECTION
+from server.session_store import GROUPS_COLLECTION as SESSION_GROUPS_COLLECTION, SESSIONS_COLLECTION
+from server.storage import Increment, count, get_db
 
 
 def _doc_id_from_add_result(result):
     """Return document id from collection.add() result (DocumentReference or tuple)."""
     if hasattr(result, "id"):
         return str(result.id)
-    if isinstance(result, (list, tuple)) and len(result) >= 1:
-        first = result[0]
-        if hasattr(first, "id"):
-            return str(first.id)
+    if isinstance(result, (list, tuple)):
+        # Firestore (and server.storage) return (write_time, DocumentReference)
+        for item in result:
+            if hasattr(item, "id"):
+                return str(item.id)
     return ""
 
 bp = Blueprint("assignments", __name__, url_prefix="")
 COLLECTION = "assignments"
 INVITES_COLLECTION = "assignmentInvites"
-CITATIONS_COLLECTION = "citations"
 
 CITATION_TYPES = {"agent prompt", "external ai prompt", "external source (manual)"}
 
@@ -54,6 +54,30 @@ def _uid_from_request():
     return claims.get("uid"), None
 
 
+# Assignment fields returned to students (GET /user/<github_username>).
+STUDENT_ASSIGNMENT_FIELDS = ["name", "description", "createdAt", "dueDate", "isGroup", "maxGroupSize", "groups"]
+# Assignment fields the extension needs (GET /by-github-id).
+EXTENSION_ASSIGNMENT_FIELDS = ["name", "description"]
+
+
+def _invited_assignment_ids(db, github_username):
+    """Ids of the assignments a GitHub user is invited to, in invite order without duplicates."""
+    invites = db.collection(INVITES_COLLECTION).where("githubUsername", "==", github_username).select(["assignmentId"]).stream()
+    return list(dict.fromkeys(a for a in (invite.to_dict().get("assignmentId") for invite in invites) if a))
+
+
+def _get_assignments(db, assignment_ids, fields):
+    """
+    {id: data} for the assignments that exist, fetched with one batched get_all (projected
+    to fields) instead of one get() round trip per assignment.
+    """
+    if not assignment_ids:
+        return {}
+    refs = [db.collection(COLLECTION).document(assignment_id) for assignment_id in assignment_ids]
+    found = {snap.id: snap.to_dict() or {} for snap in db.get_all(refs, field_paths=[*fields, "deletedAt"]) if snap.exists}
+    return {assignment_id: d for assignment_id, d in found.items() if not d.pop("deletedAt", None)}
+
+
 
 
 
@@ -86,39 +110,25 @@ def _uid_from_request():
 def get_assignments_by_github_id():
     identity = (request.args.get("identity") or "").strip().lower()
     current_app.logger.info("[extension] identity=%r", identity)
-    print("here!")
 
     if not identity:
         return jsonify({"identity": "", "assignments": []}), 200
 
-    db = get_firestore()
+    db = get_db()
     if db is None:
-        print("no db!")
         return jsonify({"error": "Database not configured"}), 503
 
     try:
-        print("db:", db)
-        # Query the junction table based on your schema
-        invites_ref = db.collection("assignmentInvites")
-        docs = invites_ref.where("githubUsername", "==", identity).stream()
-
-        assignments_list = []
-        for doc in docs:
-            data = doc.to_dict()
-            assignments_list.append({
-                "id": data.get("assignmentId"),
-                "name": data.get("assignmentName"),
-
-                "desc": data.get("assignmentDesc")
-            })
+        # Two round trips however many assignments: the user's invites (assignment ids
+        # only), then one batched read of those assignments' current name and description
+        assignment_ids = _invited_assignment_ids(db, identity)
+        found = _get_assignments(db, assignment_ids, EXTENSION_ASSIGNMENT_FIELDS)
+        assignments_list = [
+            {"id": assignment_id, "name": found[assignment_id].get("name"), "desc": found[assignment_id].get("description")}
+            for assignment_id in assignment_ids
+            if assignment_id in found
+        ]
 
-
-        print("here!?!??!")
-        print(assignments_list)
-        print(jsonify({
-            "assignments": assignments_list,
-            "identity": identity
-        }))
         # Final response matches your requested format
         return jsonify({
             "assignments": assignments_list,
@@ -135,42 +145,239 @@ def get_assignments_by_github_id():
 
 
 
+LINE_EVENT_REQUIRED_FIELDS = ["AssignmentID", "GitHubName", "GitHubLink", "FilePath", "LineNumber", "LineContent"]
+# Run form: lines LineNumber..LineNumberEnd with one LineContents entry per line, stored as one doc.
+LINE_RUN_REQUIRED_FIELDS = ["AssignmentID", "GitHubName", "GitHubLink", "FilePath", "LineNumber", "LineNumberEnd", "LineContents"]
+# Longest run accepted in one document (keeps docs well under Firestore's 1 MiB limit).
+LINE_RUN_MAX_LINES = 1000
+# Upper bound on events accepted by one /push/batch request.
+PUSH_BATCH_MAX_EVENTS = 2000
+
+
+def _line_event_from_payload(payload):
+    """
+    Validate one /push payload and build the lineEvents document.
+    Payloads with LineNumberEnd are runs (LineContents holds one string per line);
+    a one-line run is stored as a plain per-line doc.
+    Returns (event_doc, None) on success, or (None, error_dict) on error.
+    """
+    if not isinstance(payload, dict):
+        return None, {"error": "Expected JSON object"}
+    is_run = "LineNumberEnd" in payload
+    required = LINE_RUN_REQUIRED_FIELDS if is_run else LINE_EVENT_REQUIRED_FIELDS
+    missing = [k for k in required if k not in payload]
+    if missing:
+        return None, {"error": "Missing fields", "missing": missing}
+    try:
+        line_number = int(payload["LineNumber"])
+        line_number_end = int(payload["LineNumberEnd"]) if is_run else line_number
+    except (TypeError, ValueError):
+        return None, {"error": "LineNumber and LineNumberEnd must be integers"}
+    event_doc = {
+        "assignmentId": str(payload["AssignmentID"]),
+        "githubUsername": str(payload["GitHubName"]).strip().lower(),
+        "githubLink": str(payload.get("GitHubLink", "")),
+        "filePath": str(payload["FilePath"]),
+        "lineNumber": line_number,
+        "updatedAt": str(payload.get("updatedAt", "")),
+    }
+    if not is_run:
+        event_doc["lineContent"] = str(payload["LineContent"])
+        return event_doc, None
+
+    contents = payload["LineContents"]
+    line_count = line_number_end - line_number + 1
+    if line_count < 1:
+        return None, {"error": "LineNumberEnd must be >= LineNumber"}
+    if line_count > LINE_RUN_MAX_LINES:
+        return None, {"error": f"At most {LINE_RUN_MAX_LINES} lines per run"}
+    if not isinstance(contents, list) or len(contents) != line_count:
+        return None, {"error": "LineContents must be a list with one entry per line in the run"}
+    contents = ["" if c is None else str(c) for c in contents]
+    if line_count == 1:
+        event_doc["lineContent"] = contents[0]
+    else:
+        event_doc["lineNumberEnd"] = line_number_end
+        event_doc["lineContents"] = contents
+    return event_doc, None
+
+
+def _line_event_queue():
+    """Return the write-behind queue if PUSH_WRITE_BEHIND is on, else None."""
+    if not current_app.config.get("PUSH_WRITE_BEHIND"):
+        return None
+    app = current_app._get_current_object()
+
+    def commit(items):
+        # Runs on the flusher thread: needs its own app context for config and logging.
+        with app.app_context():
+            db = get_db()
+            if db is None:
+                return ["Database not configured"] * len(items)
+            # The assignment may have been deleted since the events were queued: reject them for good.
+            statuses = assignment_statuses(db, COLLECTION, (event_doc["assignmentId"] for _, event_doc in items))
+            rejections = [ingest_rejection(statuses[event_doc["assignmentId"]]) for _, event_doc in items]
+            live = [item for item, rejection in zip(items, rejections) if rejection is None]
+            results = line_events.commit(db, live) if live else []
+            progress.apply_to_session_store(db, live, results)
+            progress.invalidate(event_doc["assignmentId"] for _, event_doc in live)
+            errors = iter(error for _, error in results)
+            return [Rejected(rejection[0]) if rejection else next(errors) for rejection in rejections]
+
+    return get_line_event_queue(lambda: WriteBehindQueue(
+        commit,
+        maxsize=app.config.get("PUSH_QUEUE_MAXSIZE", 20000),
+        batch_size=min(app.config.get("PUSH_QUEUE_BATCH_SIZE", line_events.BATCH_LIMIT), line_events.BATCH_LIMIT),
+        flush_interval=app.config.get("PUSH_QUEUE_FLUSH_SECONDS", 1.0),
+        name="lineEvents-writer",
+        max_retries=app.config.get("PUSH_QUEUE_MAX_RETRIES", 3),
+    ))
+
+
+def _enqueue_line_events(q, items):
+    """
+    Assign ids to (doc_id, event_doc) items that have none and enqueue them all.
+    Returns (ids, None) on success, or (None, 429 response) when the queue is full.
+    """
+    db = get_db()
+    if db is None:
+        return None, (jsonify({"error": "Database not configured"}), 503)
+    collection = db.collection(LINE_EVENTS_COLLECTION)
+    # document() only generates an id client-side; the write happens on the flusher thread.
+    items = [(doc_id or collection.document().id, event_doc) for doc_id, event_doc in items]
+    if not q.put_many(items):
+        retry_after = current_app.config.get("PUSH_QUEUE_RETRY_AFTER_SECONDS", 5)
+        resp = jsonify({"error": "Ingestion queue full, retry later", "retryAfter": retry_after})
+        resp.headers["Retry-After"] = str(retry_after)
+        return None, (resp, 429)
+    return [doc_id for doc_id, _ in items], None
+
+
 @bp.route("/push", methods=["POST"])
 def push_line_event():
     payload = request.get_json(silent=True)
     if payload is None or not isinstance(payload, dict):
         return jsonify({"error": "Expected JSON object"}), 400
 
-    required = ["AssignmentID", "GitHubName", "GitHubLink", "FilePath", "LineNumber", "LineContent"]
-    missing = [k for k in required if k not in payload]
-    if missing:
-        return jsonify({"error": "Missing fields", "missing": missing}), 400
+    event_doc, error = _line_event_from_payload(payload)
+    if error is not None:
+        return jsonify(error), 400
 
-    db = get_firestore()
+    db = get_db()
     if db is None:
         return jsonify({"error": "Database not configured"}), 503
-
     try:
-        event_doc = {
-            "assignmentId": str(payload["AssignmentID"]),   # ✅ string
-            "githubUsername": str(payload["GitHubName"]).strip().lower(),
-            "githubLink": str(payload.get("GitHubLink", "")),
-            "filePath": str(payload["FilePath"]),
-            "lineNumber": int(payload["LineNumber"]),
-            "lineContent": str(payload["LineContent"]),
-            "updatedAt": str(payload.get("updatedAt", "")),
-        }
+        rejection = ingest_rejection(assignment_statuses(db, COLLECTION, [event_doc["assignmentId"]])[event_doc["assignmentId"]])
+    except Exception as e:
+        current_app.logger.exception("Push failed")
+        return jsonify({"error": str(e)}), 500
+    if rejection is not None:
+        return jsonify({"error": rejection[0]}), rejection[1]
 
-        doc_ref = db.collection("lineEvents").document()
-        doc_ref.set(event_doc)
+    doc_id = line_events.dedup_id(event_doc, payload.get("IdempotencyKey"))
+    q = _line_event_queue()
+    if q is not None:
+        ids, err = _enqueue_line_events(q, [(doc_id, event_doc)])
+        if err is not None:
+            return err[0], err[1]
+        return jsonify({"ok": True, "id": ids[0], "queued": True}), 202
 
-        return jsonify({"ok": True, "id": doc_ref.id}), 200
+    try:
+        results = line_events.commit(db, [(doc_id, event_doc)])
+        written_id, error = results[0]
+        if error is not None:
+            return jsonify({"error": error}), 500
+        progress.apply_to_session_store(db, [(doc_id, event_doc)], results)
+        progress.invalidate([event_doc["assignmentId"]])
+
+        return jsonify({"ok": True, "id": written_id}), 200
 
     except Exception as e:
         current_app.logger.exception("Push failed")
         return jsonify({"error": str(e)}), 500
 
 
+@bp.route("/push/batch", methods=["POST"])
+def push_line_events_batch():
+    """
+    Store many line events in one request. Body is a JSON array of /push payloads
+    (or {"events": [...]}). Each item is validated independently; valid items are
+    committed in Firestore write batches. Returns per-item results in input order.
+    """
+    payload = request.get_json(silent=True)
+    events = payload.get("events") if isinstance(payload, dict) else payload
+    if not isinstance(events, list):
+        return jsonify({"error": "Expected JSON array of events"}), 400
+    if len(events) > PUSH_BATCH_MAX_EVENTS:
+        return jsonify({"error": f"At most {PUSH_BATCH_MAX_EVENTS} events per batch", "received": len(events)}), 413
+
+    results = [None] * len(events)
+    valid = []  # (index, (doc_id, event_doc))
+    for i, item in enumerate(events):
+        event_doc, error = _line_event_from_payload(item)
+        if error is not None:
+            results[i] = {"index": i, "ok": False, **error}
+        else:
+            valid.append((i, (line_events.dedup_id(event_doc, item.get("IdempotencyKey")), event_doc)))
+
+    rejected_status = None  # 404 / 410 of the first item whose assignment is missing or deleted
+    if valid:
+        db = get_db()
+        if db is None:
+            return jsonify({"error": "Database not configured"}), 503
+        try:
+            statuses = assignment_statuses(db, COLLECTION, (event_doc["assignmentId"] for _, (_, event_doc) in valid))
+        except Exception as e:
+            current_app.logger.exception("Push batch failed")
+            return jsonify({"error": str(e)}), 500
+        live = []
+        for i, (doc_id, event_doc) in valid:
+            rejection = ingest_rejection(statuses[event_doc["assignmentId"]])
+            if rejection is None:
+                live.append((i, (doc_id, event_doc)))
+                continue
+            results[i] = {"index": i, "ok": False, "error": rejection[0]}
+            rejected_status = rejected_status or rejection[1]
+        valid = live
+
+    q = _line_event_queue()
+    if valid and q is not None:
+        ids, err = _enqueue_line_events(q, [item for _, item in valid])
+        if err is not None:
+            return err[0], err[1]
+        for (i, _), doc_id in zip(valid, ids):
+            results[i] = {"index": i, "ok": True, "id": doc_id}
+    elif valid:
+        db = get_db()
+        if db is None:
+            return jsonify({"error": "Database not configured"}), 503
+        items = [item for _, item in valid]
+        written = line_events.commit(db, items)
+        progress.apply_to_session_store(db, items, written)
+        progress.invalidate(event_doc["assignmentId"] for _, event_doc in items)
+        for (i, _), (doc_id, error) in zip(valid, written):
+            if error is None:
+                results[i] = {"index": i, "ok": True, "id": doc_id}
+            else:
+                results[i] = {"index": i, "ok": False, "error": error}
+
+    accepted = sum(1 for r in results if r["ok"])
+    body = {
+        "ok": accepted == len(events),
+        "accepted": accepted,
+        "rejected": len(events) - accepted,
+        "results": results,
+    }
+    if events and accepted == 0:
+        # Nothing stored: 500 if valid items failed to commit, else 404 / 410 if items were
+        # for a missing / deleted assignment, 400 if every item was invalid.
+        return jsonify(body), (500 if valid else rejected_status or 400)
+    if q is not None and accepted:
+        body["queued"] = True
+        return jsonify(body), 202
+    return jsonify(body), 200
+
+
 @bp.route("/citations", methods=["POST"])
 def push_citation():
     print("==== /citations HIT ====")
@@ -266,7 +473,7 @@ def push_citation():
             "received": citation_type or "(empty)",
         }), 400
 
-    db = get_firestore()
+    db = get_db()
     print("firestore instance:", db)
 
     if db is None:
@@ -274,6 +481,11 @@ def push_citation():
         return jsonify({"error": "Database not configured"}), 503
 
     try:
+        rejection = ingest_rejection(assignment_statuses(db, COLLECTION, [assignment_id])[assignment_id])
+        if rejection is not None:
+            print("❌ assignment not writable:", rejection[0])
+            return jsonify({"error": rejection[0]}), rejection[1]
+
         if timestamp is None or timestamp == "":
             timestamp = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
         else:
@@ -296,6 +508,8 @@ def push_citation():
             "filesTouched": payload.get("filesTouched"),
         })
 
+        progress.invalidate([assignment_id])
+
         print("✅ citation stored successfully")
         return jsonify({"ok": True, "id": doc_ref.id}), 201
 
@@ -319,24 +533,51 @@ def push_citation():
 
 
 
+# Concurrent count() aggregations for assignments without a stored invitedCount.
+INVITED_COUNT_WORKERS = 8
+
+
+def _invited_count(db, assignment_id):
+    """Number of invites of an assignment, via a count() aggregation (no invite docs downloaded)."""
+    return count(db.collection(INVITES_COLLECTION).where("assignmentId", "==", assignment_id))
+
+
+def _invited_count_update(db, assignment_id, assignment_data, delta):
+    """
+    Assignment doc update for its denormalized invitedCount when one invite is added
+    (delta=1) or removed (-1): an atomic Increment, committed in the same batch as the
+    invite write. Docs written before the counter existed get the exact count instead,
+    since an Increment would start them from 0.
+    """
+    if isinstance(assignment_data.get("invitedCount"), int):
+        return {"invitedCount": Increment(delta)}
+    return {"invitedCount": max(0, _invited_count(db, assignment_id) + delta)}
+
+
 @bp.route("", methods=["GET"])
 def list_assignments():
     """List assignments for the authenticated user."""
     uid, err = _uid_from_request()
     if err is not None:
         return err[0], err[1]
-    db = get_firestore()
+    db = get_db()
     if not db:
         return jsonify({"error": "Database not configured"}), 503
     try:
-        refs = db.collection(COLLECTION).where("userId", "==", uid).stream()
+        refs = [(ref.id, ref.to_dict()) for ref in db.collection(COLLECTION).where("userId", "==", uid).stream()]
+        refs = [(ref_id, d) for ref_id, d in refs if not d.get("deletedAt")]
+        # invitedCount is kept on the assignment doc; older docs without it are counted
+        # with aggregation queries, run concurrently (repair-invited-counts backfills them).
+        missing = [ref_id for ref_id, d in refs if not isinstance(d.get("invitedCount"), int)]
+        counted = {}
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(INVITED_COUNT_WORKERS, len(missing))) as pool:
+                counted = dict(zip(missing, pool.map(lambda ref_id: _invited_count(db, ref_id), missing)))
         items = []
-        for ref in refs:
-            d = ref.to_dict()
-            invite_snaps = db.collection(INVITES_COLLECTION).where("assignmentId", "==", ref.id).stream()
-            invited_count = sum(1 for _ in invite_snaps)
+        for ref_id, d in refs:
+            invited_count = counted[ref_id] if ref_id in counted else d["invitedCount"]
             items.append({
-                "id": ref.id,
+                "id": ref_id,
                 "name": d.get("name", ""),
                 "description": d.get("description", ""),
                 "createdAt": d.get("createdAt", ""),
@@ -359,7 +600,7 @@ def create_assignment():
     uid, err = _uid_from_request()
     if err is not None:
         return err[0], err[1]
-    db = get_firestore()
+    db = get_db()
     if not db:
         return jsonify({"error": "Database not configured"}), 503
     body = request.get_json() or {}
@@ -384,6 +625,7 @@ def create_assignment():
             "isGroup": is_group,
             "maxGroupSize": max_group_size if is_group else None,
             "groups": groups,
+            "invitedCount": 0,
         })
         doc_id = _doc_id_from_add_result(add_result)
         payload = {
@@ -408,12 +650,12 @@ def get_assignment(assignment_id):
     uid, err = _uid_from_request()
     if err is not None:
         return err[0], err[1]
-    db = get_firestore()
+    db = get_db()
     if not db:
         return jsonify({"error": "Database not configured"}), 503
     try:
         ref = db.collection(COLLECTION).document(assignment_id).get()
-        if not ref.exists:
+        if not ref.exists or ref.to_dict().get("deletedAt"):
             return jsonify({"error": "Not found"}), 404
         d = ref.to_dict()
         if d.get("userId") != uid:
@@ -433,268 +675,114 @@ def get_assignment(assignment_id):
         return jsonify({"error": str(e)}), 500
 
 
-LINE_EVENTS_COLLECTION = "lineEvents"
-# Auto-close session if no new event for this many minutes (applies collectively to all members).
-SESSION_GAP_MINUTES = 10
-# Max session length in minutes; start a new session if adding this event would exceed it.
-SESSION_MAX_MINUTES = 15
-
-
-def _parse_iso(ts):
-    """Parse ISO timestamp string or Firestore datetime to datetime (timezone-aware if possible)."""
-    if ts is None:
-        return None
-    if hasattr(ts, "isoformat"):
-        return ts
-    s = (ts or "").strip()
-    if not s:
-        return None
-    try:
-        if s.endswith("Z"):
-            s = s[:-1] + "+00:00"
-        return datetime.fromisoformat(s)
-    except (ValueError, TypeError):
-        return None
-
-
-def _to_iso(ts):
-    """Convert datetime or ISO string to ISO string for JSON."""
-    if ts is None:
-        return None
-    if hasattr(ts, "isoformat"):
-        return ts.isoformat().replace("+00:00", "Z")
-    if hasattr(ts, "timestamp"):
-        # Firestore Timestamp
-        return datetime.fromtimestamp(ts.timestamp(), tz=timezone.utc).isoformat().replace("+00:00", "Z")
-    return ts if isinstance(ts, str) else None
-
-
-# Allow citations up to this long after session end to still count (clock skew / ordering).
-CITATION_SESSION_END_BUFFER_SECONDS = 120
-
-
-def _citation_in_session(citation_ts, session_start_iso, session_end_iso):
-    """Return True if citation timestamp falls within session (with small buffer after end)."""
-    start_dt = _parse_iso(session_start_iso)
-    end_dt = _parse_iso(session_end_iso)
-    if start_dt is None or end_dt is None:
-        return False
-    ts = citation_ts
-    if hasattr(ts, "timestamp"):
-        ts = datetime.fromtimestamp(ts.timestamp(), tz=timezone.utc)
-    elif isinstance(ts, str):
-        ts = _parse_iso(ts)
-    else:
-        ts = None
-    if ts is None:
-        return False
-    if ts.tzinfo is None:
-        ts = ts.replace(tzinfo=timezone.utc)
-    end_with_buffer = end_dt + timedelta(seconds=CITATION_SESSION_END_BUFFER_SECONDS)
-    return start_dt <= ts <= end_with_buffer
-
-
-def _detail_line_number(d):
-    """Return line number as int, or None if missing/invalid."""
-    v = d.get("lineNumber")
-    if v is None:
+def _get_groups_for_assignment(db, assignment_id, uid):
+    """
+    Get groups for the assignment. Returns either:
+    - A dict { repo_url: [github_username, ...], ... } (from get_groups API),
+    - Or a list of group dicts/lists from the assignment doc (legacy).
+    """
+    ref = db.collection(COLLECTION).document(assignment_id).get()
+    if not ref.exists or ref.to_dict().get("deletedAt"):
         return None
-    try:
-        return int(v)
-    except (TypeError, ValueError):
+    d = ref.to_dict()
+    if d.get("userId") != uid:
         return None
+    return d.get("groups")
 
 
-def _detail_canonical_user(d):
-    """Return canonical username for grouping (lowercase, stripped)."""
-    v = d.get("githubUsername")
-    if v is None:
-        return ""
-    return str(v).strip().lower()
-
-
-def _detail_canonical_file(d):
-    """Return canonical file path for grouping."""
-    v = d.get("filePath")
-    if v is None:
-        return ""
-    return str(v).strip()
-
-
-def _timestamp_minute_bucket(ts_str):
-    """Return a key for grouping by 'same time' (minute precision)."""
-    if not ts_str:
-        return ""
-    dt = _parse_iso(ts_str)
-    if dt is None:
-        return ts_str
-    dt = dt.replace(second=0, microsecond=0)
-    return dt.isoformat()
+def _progress_build_args(args):
+    """engine and window (see _progress_window) from /progress query args. Returns (engine, window, error)."""
+    engine = (args.get("engine") or "").strip().lower() or None
+    if engine is not None and engine not in sessionize.ENGINES + ("auto",):
+        return None, None, "engine must be one of: auto, python, numpy"
+    window, error = _progress_window(args)
+    return engine, window, error
 
 
-def _merge_consecutive_details(details):
+def _progress_window(args):
     """
-    One pass: group by (user, file, time-bucket), then within each group merge
-    consecutive line numbers into one entry per run (e.g. lines 3–49 at same time -> 3–49).
-    Handles duplicate events per line by using the set of line numbers per group.
+    Time window / page for /progress from query args: from and to (ISO 8601 or epoch ms;
+    events in [from, to)), limit (events per page; a page runs on to the next quiet gap so
+    no session spans two pages) and page (nextPage from a previous response).
+    Returns (window, error); window is None when none of them is given.
     """
-    if not details:
-        return []
-    # Group by (user, file, timestamp minute)
-    groups = {}
-    for d in details:
-        user = _detail_canonical_user(d)
-        file_ = _detail_canonical_file(d)
-        bucket = _timestamp_minute_bucket(d.get("timestamp") or "")
-        key = (user, file_, bucket)
-        if key not in groups:
-            groups[key] = []
-        groups[key].append(d)
-
-    merged = []
-    for (_user, _file, _bucket), group in groups.items():
-        # Unique line numbers in this group (same person, file, time)
-        line_numbers = set()
-        line_to_detail = {}  # line_number -> one detail (for timestamp, content, etc.)
-        for d in group:
-            ln = _detail_line_number(d)
-            if ln is not None:
-                line_numbers.add(ln)
-                if ln not in line_to_detail:
-                    line_to_detail[ln] = d
-        if not line_numbers:
-            for d in group:
-                merged.append(dict(d))
+    window = {"from": None, "to": None, "limit": None, "page": None, "start": None, "end": None}
+    for name in ("from", "to", "page"):
+        value = (args.get(name) or "").strip()
+        if not value:
             continue
-        sorted_lines = sorted(line_numbers)
-        # Consecutive runs: [3,4,5,...,49] -> (3, 49), etc.
-        runs = []
-        run_start = run_end = sorted_lines[0]
-        for ln in sorted_lines[1:]:
-            if ln == run_end + 1:
-                run_end = ln
-            else:
-                runs.append((run_start, run_end))
-                run_start = run_end = ln
-        runs.append((run_start, run_end))
-        # One merged detail per run
-        for run_start, run_end in runs:
-            if run_start == run_end:
-                d = line_to_detail.get(run_start)
-                if d:
-                    merged.append(dict(d))
-                continue
-            details_in_run = [line_to_detail[ln] for ln in range(run_start, run_end + 1) if ln in line_to_detail]
-            first = details_in_run[0]
-            last = details_in_run[-1]
-            contents = [
-                line_to_detail[ln].get("lineContent") if line_to_detail[ln].get("lineContent") is not None else ""
-                for ln in range(run_start, run_end + 1)
-                if ln in line_to_detail
-            ]
-            merged.append({
-                "timestamp": first.get("timestamp"),
-                "locChanged": sum(line_to_detail[ln].get("locChanged", 1) for ln in range(run_start, run_end + 1) if ln in line_to_detail),
-                "aiUsed": first.get("aiUsed"),
-                "githubUsername": first.get("githubUsername"),
-                "lineNumber": run_start,
-                "lineNumberEnd": run_end,
-                "filePath": first.get("filePath"),
-                "lineContent": "\n".join(contents),
-            })
+        ms = int(value) if value.isdigit() else to_epoch_ms(value)
+        if ms is None:
+            if name == "page":
+                return None, "page must be a nextPage returned by a previous /progress response"
+            return None, f"{name} must be an ISO 8601 timestamp or epoch milliseconds"
+        window[name] = ms
+    limit = (args.get("limit") or "").strip()
+    if limit:
+        try:
+            window["limit"] = int(limit)
+        except ValueError:
+            window["limit"] = 0
+        if window["limit"] < 1:
+            return None, "limit must be a positive integer"
+    if window["from"] is not None and window["to"] is not None and window["to"] <= window["from"]:
+        return None, "to must be after from"
+    if all(window[k] is None for k in ("from", "to", "limit", "page")):
+        return None, None
+    window["end"] = window["to"]
+    return window, None
 
-    merged.sort(key=lambda d: (d.get("timestamp") or "", d.get("lineNumber") or 0))
-    return merged
-
-
-def _flush_session_batch(current_batch, sessions, session_id_prefix, session_counter):
-    """Append one session from current_batch; return new session_counter."""
-    if not current_batch:
-        return session_counter
-    session_counter += 1
-    sid = f"{session_id_prefix}s{session_counter}"
-    sessions.append({
-        "id": sid,
-        "startTime": _to_iso(current_batch[0][1].get("updatedAt")),
-        "endTime": _to_iso(current_batch[-1][1].get("updatedAt")),
-        "locChanged": len(current_batch),
-        "aiUsed": None,
-        "githubUsernames": list({x[1].get("githubUsername", "").strip().lower() for x in current_batch if (x[1].get("githubUsername") or "").strip()}),
-        "details": [x[2] for x in current_batch],
-    })
-    return session_counter
-
-
-def _events_to_sessions(events, session_id_prefix="s"):
-    """
-    Group events into sessions collectively (all members in one timeline).
-    - Auto-close session if no new event for SESSION_GAP_MINUTES (10 min).
-    - Max session length SESSION_MAX_MINUTES (15 min); start new session if exceeded.
-    Returns list of session dicts: id, startTime, endTime, locChanged, aiUsed, githubUsernames, details.
-    """
-    if not events:
-        return []
-    sorted_events = sorted(
-        events,
-        key=lambda e: (e.get("updatedAt") or ""),
-    )
-    sessions = []
-    current_batch = []
-    session_counter = 0
-    gap_delta = timedelta(minutes=SESSION_GAP_MINUTES)
-    max_span_delta = timedelta(minutes=SESSION_MAX_MINUTES)
-
-    for e in sorted_events:
-        ts = _parse_iso(e.get("updatedAt"))
-        if ts is None:
-            continue
-        user = (e.get("githubUsername") or "").strip().lower()
-        detail = {
-            "timestamp": _to_iso(e.get("updatedAt")),
-            "locChanged": 1,
-            "aiUsed": None,
-            "githubUsername": user or None,
-            "lineNumber": e.get("lineNumber"),
-            "filePath": e.get("filePath") or None,
-            "lineContent": e.get("lineContent") or None,
-        }
-        if not current_batch:
-            current_batch.append((ts, e, detail))
-            continue
-        first_ts = current_batch[0][0]
-        last_ts = current_batch[-1][0]
-        gap_exceeded = (ts - last_ts) > gap_delta
-        max_span_exceeded = (ts - first_ts) > max_span_delta
-        if gap_exceeded or max_span_exceeded:
-            session_counter = _flush_session_batch(current_batch, sessions, session_id_prefix, session_counter)
-            current_batch = []
-        current_batch.append((ts, e, detail))
 
-    if current_batch:
-        session_counter = _flush_session_batch(current_batch, sessions, session_id_prefix, session_counter)
-    return sessions
+NDJSON_MIMETYPE = "application/x-ndjson"
 
 
-def _get_groups_for_assignment(db, assignment_id, uid):
-    """
-    Get groups for the assignment. Returns either:
-    - A dict { repo_url: [github_username, ...], ... } (from get_groups API),
-    - Or a list of group dicts/lists from the assignment doc (legacy).
-    """
-    ref = db.collection(COLLECTION).document(assignment_id).get()
-    if not ref.exists:
-        return None
-    d = ref.to_dict()
-    if d.get("userId") != uid:
-        return None
-    return d.get("groups")
+def _wants_progress_stream():
+    """?stream=1, or an Accept header preferring NDJSON over JSON."""
+    if (request.args.get("stream") or "").strip().lower() in ("1", "true", "yes"):
+        return True
+    return request.accept_mimetypes.best_match(["application/json", NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
 
 
-# Sample groups for testing when real groups not available: repo URL -> list of GitHub usernames.
-SAMPLE_GROUPS = {
-    "https://github.com/IainMac32/testrepoHackathon": ["iainmac32"],
-    "https://github.com/kristiandiana/demo-repo": ["kristiandiana"],
-}
+def _progress_ndjson(parts, since_ms, end, window=None):
+    """
+    NDJSON lines for /progress streaming: a "section" line (id, label, repoLink, members)
+    before a section's first session, one "session" line per session (the session plus
+    its sectionId) as soon as it is built, and a final "end" line (end holds cursor /
+    since, plus nextPage if the window has one). Sessions of different sections may
+    interleave. With since_ms, a section's line is only written once one of its sessions
+    has changed. A section whose members grew after its line was written gets it again
+    (same id, updated members) at the end.
+    """
+    dumps = current_app.json.dumps
+    pending = {}  # section id -> header not written yet
+    written = set()  # section ids
+    try:
+        for part in parts:
+            if part[0] == "section":
+                header = part[2]
+                if since_ms is None or header["id"] in written:
+                    written.add(header["id"])
+                    yield dumps({"type": "section", **header}) + "\n"
+                else:
+                    pending[header["id"]] = header
+                continue
+            _kind, section_id, session = part
+            if since_ms is not None:
+                if not progress.session_changed_since(session, since_ms):
+                    continue
+                header = pending.pop(section_id, None)
+                if header is not None:
+                    written.add(section_id)
+                    yield dumps({"type": "section", **header}) + "\n"
+            yield dumps({"type": "session", "sectionId": section_id, **session}) + "\n"
+    except Exception as e:
+        # Status and headers are already sent: report the failure in-band.
+        current_app.logger.exception(e)
+        yield dumps({"type": "error", "error": str(e)}) + "\n"
+        return
+    if window is not None and window.get("next") is not None:
+        end = {**end, "nextPage": str(window["next"])}
+    yield dumps({"type": "end", "sections": len(written), **end}) + "\n"
 
 
 @bp.route("/<assignment_id>/progress", methods=["GET"])
@@ -703,148 +791,151 @@ def get_progress_by_assignment_id(assignment_id):
     Fetch lineEvents for the assignment. Get groups (list of group dicts with id, name, members).
     For each group, filter events to that group's members and build sessions (10 min gap, 15 min max).
     Return sections: one per group with id, label, repoLink, members, sessions.
+
+    Responses carry a strong ETag derived from the newest event / citation, so an unchanged
+    assignment answers If-None-Match with 304 before any session building. They also carry
+    a cursor; ?since=<cursor> returns only sessions with activity after it.
+    ?engine=python|numpy|auto overrides the sessionization engine (same result).
+    ?stream=1 (or Accept: application/x-ndjson) streams NDJSON, one section / session per
+    line (see _progress_ndjson), each session written as soon as it closes.
+    ?from=&to=&limit=&page= read only a time window / page of events (see _progress_window);
+    windowed responses are not cached and carry nextPage while there are more pages.
+    ?view=summary returns sessions without details and citations (eventCount / citationCount
+    instead), read without line content; /progress/sessions/<id>/details loads one session's.
     """
     uid, err = _uid_from_request()
     if err is not None:
         return err[0], err[1]
-    db = get_firestore()
+    engine, window, build_error = _progress_build_args(request.args)
+    if build_error:
+        return jsonify({"error": build_error}), 400
+    view = (request.args.get("view") or "full").strip().lower()
+    if view not in progress.VIEWS:
+        return jsonify({"error": "view must be one of: full, summary"}), 400
+    summary = view == "summary"
+    since = (request.args.get("since") or "").strip()
+    since_ms = None
+    if since:
+        try:
+            since_ms = int(since)
+        except ValueError:
+            return jsonify({"error": "since must be a cursor returned by a previous /progress response"}), 400
+    stream = _wants_progress_stream()
+    db = get_db()
     if not db:
         return jsonify({"error": "Database not configured"}), 503
     try:
-        docs = (
-            db.collection(LINE_EVENTS_COLLECTION)
-            .where("assignmentId", "==", assignment_id)
-            .stream()
-        )
-        line_events_data = [doc.to_dict() for doc in docs]
+        cache = progress.progress_cache()
+        cache_key = progress.cache_key(assignment_id, view)
+        # Windowed results are not cached: the cache holds whole assignments.
+        cached = cache.get(cache_key) if window is None else None
+        if cached is None and summary and window is None:
+            # A cached full build answers a summary request too.
+            full = cache.get(progress.cache_key(assignment_id))
+            if full is not None:
+                cached = (full[0], progress.summary_sections(full[1]))
+        if cached is not None:
+            # Cache hit: no Firestore reads at all, not even the version queries.
+            version, sections = cached
+        else:
+            generation = cache.generation(cache_key)
+            version = progress.version(db, assignment_id)
+            sections = None
+        etag = None
+        if version is not None:
+            fingerprint, cursor_ms = version
+            representation = "ndjson" if stream else "json"
+            etag = hashlib.sha1(
+                f"{assignment_id}\x1f{fingerprint}\x1f{request.query_string.decode('utf-8')}\x1f{representation}".encode("utf-8")
+            ).hexdigest()
+            if request.if_none_match.contains(etag):
+                # Nothing changed since the client's copy: skip session building entirely.
+                resp = current_app.response_class(status=304)
+                resp.set_etag(etag)
+                resp.headers["Cache-Control"] = "private, no-cache"
+                resp.headers["Vary"] = "Accept"
+                return resp
+
+        end = {}
+        if version is not None:
+            end["cursor"] = str(cursor_ms)
+        if since:
+            end["since"] = since
+
+        if stream:
+            # Streamed builds are not cached: the full result is never held in memory.
+            if sections is None:
+                parts = progress.iter_parts(db, assignment_id, engine=engine, window=window, summary=summary)
+            else:
+                parts = progress.parts_from_sections(sections)
+            resp = current_app.response_class(
+                stream_with_context(_progress_ndjson(parts, since_ms, end, window)),
+                mimetype=NDJSON_MIMETYPE,
+            )
+        else:
+            if sections is None:
+                sections = progress.build_sections(db, assignment_id, engine=engine, window=window, summary=summary)
+                if window is None:
+                    cache.set(cache_key, (version, sections), generation=generation)
+            if since_ms is not None:
+                sections = progress.sections_changed_since(sections, since_ms)
+            if window is not None and window.get("next") is not None:
+                end["nextPage"] = str(window["next"])
+            resp = jsonify({"sections": sections, **end})
+        if etag is not None:
+            resp.set_etag(etag)
+            resp.headers["Cache-Control"] = "private, no-cache"
+        resp.headers["Vary"] = "Accept"
+        return resp, 200
+    except Exception as e:
+        current_app.logger.exception(e)
+        return jsonify({"error": str(e)}), 500
 
 
-        
-        
-        groups = {}  # githubLink -> set(usernames)
-
-        print("DEBUG: total events =", len(line_events_data))
-        for i, event in enumerate(line_events_data):
-            username = (event.get("githubUsername") or "").strip().lower()
-            repo_link = (event.get("githubLink") or "").strip()
-            print(f"\nDEBUG: event {i}")
-            print("  username =", username)
-            print("  repo_link =", repo_link)
-            if not username or not repo_link:
-                print("  -> missing username or repo_link, skipping")
+@bp.route("/<assignment_id>/progress/sessions/<session_id>/details", methods=["GET"])
+def get_progress_session_details(assignment_id, session_id):
+    """
+    Merged details and citations of one /progress session, for clients that load
+    ?view=summary first and expand sessions on demand. Session ids are stable (section id +
+    start time), so any /progress response's ids work here. A cached full build answers
+    without reads; otherwise only the session's own events are read (and those within its
+    citation buffer, to learn its members, when no build of the assignment is cached).
+    """
+    uid, err = _uid_from_request()
+    if err is not None:
+        return err[0], err[1]
+    parsed = progress.split_session_id(session_id)
+    if parsed is None:
+        return jsonify({"error": "Session not found"}), 404
+    section_id, start_ms = parsed
+    db = get_db()
+    if not db:
+        return jsonify({"error": "Database not configured"}), 503
+    try:
+        cache = progress.progress_cache()
+        members = None
+        for view in progress.VIEWS:
+            cached = cache.get(progress.cache_key(assignment_id, view))
+            if cached is None:
                 continue
-            if repo_link not in groups:
-                print("  -> creating new group for repo_link")
-                groups[repo_link] = set()
-            if username not in groups[repo_link]:
-                print("  -> adding user to group:", username)
-            groups[repo_link].add(username)
-        # convert sets -> lists (JSON-safe)
-        groups_json = {repo: sorted(list(users)) for repo, users in groups.items()}
-        print("\nDEBUG: FINAL groups =", groups_json)
-
-
-        # convert groups_json back to groups
-        groups = {repo: set(users) for repo, users in groups_json.items()}
-
-        print("DEBUG: groups =", groups)
-
-        # groups: dict { repo_url: [github_id, ...] } or legacy list; fall back to sample for testing
-        raw_groups = groups if groups else SAMPLE_GROUPS
-
-        # Normalize to list of (repo_url, members) for uniform iteration
-        if isinstance(raw_groups, dict):
-            group_items = list(raw_groups.items())
-        else:
-            group_items = []
-            for g in raw_groups:
-                if isinstance(g, dict):
-                    group_items.append((g.get("repoLink") or g.get("repo_link"), g.get("members") or []))
-                elif isinstance(g, (list, tuple)):
-                    group_items.append((None, list(g)))
-                else:
-                    group_items.append((None, []))
-
-        sections = []
-        for i, (repo_url, members) in enumerate(group_items):
-            members = [m for m in (members or []) if m]
-            group_id = f"g{i + 1}"
-            group_label = repo_url or f"Group {i + 1}"
-            if repo_url and "/" in repo_url:
-                group_label = repo_url.rstrip("/").split("/")[-1]  # e.g. testrepoHackathon
-            allowed = {str(m).strip().lower() for m in members}
-            group_events = [e for e in line_events_data if (e.get("githubUsername") or "").strip().lower() in allowed]
-            sessions = _events_to_sessions(group_events, session_id_prefix=f"{group_id}-")
-            repo_link = repo_url
-            if not repo_link and group_events:
-                first_event = min(group_events, key=lambda e: (e.get("updatedAt") or ""))
-                repo_link = first_event.get("githubLink")
-            if sessions:
-                sections.append({
-                    "id": group_id,
-                    "label": group_label,
-                    "repoLink": repo_link,
-                    "members": members,
-                    "sessions": sessions,
-                })
-
-        if not sections:
-            # No groups: single section with all events (e.g. solo or no groups defined)
-            all_sessions = _events_to_sessions(line_events_data, session_id_prefix="s")
-            repo_link = None
-            if line_events_data:
-                first_event = min(line_events_data, key=lambda e: (e.get("updatedAt") or ""))
-                repo_link = first_event.get("githubLink")
-            members = list({(e.get("githubUsername") or "").strip().lower() for e in line_events_data if (e.get("githubUsername") or "").strip()})
-            sections = [{
-                "id": "progress",
-                "label": "Progress",
-                "repoLink": repo_link,
-                "members": members,
-                "sessions": all_sessions,
-            }]
-
-        # Post-pass: merge consecutive same-file same-user line changes into one detail per run
-        for section in sections:
-            for session in section.get("sessions", []):
-                raw = session.get("details", [])
-                session["details"] = _merge_consecutive_details(raw)
-
-        # Fetch citations for this assignment and attach to sessions
-        try:
-            citation_docs = (
-                db.collection(CITATIONS_COLLECTION)
-                .where("assignmentId", "==", assignment_id)
-                .stream()
-            )
-            all_citations = [doc.to_dict() for doc in citation_docs]
-        except Exception:
-            all_citations = []
-
-        for section in sections:
-            allowed_users = {str(m).strip().lower() for m in (section.get("members") or []) if m}
-            for session in section.get("sessions", []):
-                start_t = session.get("startTime") or ""
-                end_t = session.get("endTime") or ""
-                session_citations = []
-                for c in all_citations:
-                    if c.get("assignmentId") != assignment_id:
-                        continue
-                    user = (c.get("githubUsername") or "").strip().lower()
-                    if user not in allowed_users:
-                        continue
-                    c_ts = c.get("timestamp")
-                    if not _citation_in_session(c_ts, start_t, end_t):
-                        continue
-                    session_citations.append({
-                        "type": c.get("type", ""),
-                        "githubUsername": c.get("githubUsername", ""),
-                        "timestamp": _to_iso(c_ts) or "",
-                        "text": c.get("text"),
-                    })
-                session["citations"] = session_citations
-
-        return jsonify({"sections": sections}), 200
+            found = progress.find_session(cached[1], session_id)
+            if found is None:
+                continue
+            section, session = found
+            if view == "full":
+                # A cached full build already has the details: no reads at all.
+                return jsonify({
+                    "id": session_id,
+                    "sectionId": section_id,
+                    "details": session.get("details") or [],
+                    "citations": session.get("citations") or [],
+                }), 200
+            members = section.get("members") or []
+        loaded = progress.session_details(db, assignment_id, section_id, start_ms, members=members)
+        if loaded is None:
+            return jsonify({"error": "Session not found"}), 404
+        details, citations = loaded
+        return jsonify({"id": session_id, "sectionId": section_id, "details": details, "citations": citations}), 200
     except Exception as e:
         current_app.logger.exception(e)
         return jsonify({"error": str(e)}), 500
@@ -856,12 +947,12 @@ def update_assignment(assignment_id):
     uid, err = _uid_from_request()
     if err is not None:
         return err[0], err[1]
-    db = get_firestore()
+    db = get_db()
     if not db:
         return jsonify({"error": "Database not configured"}), 503
     doc_ref = db.collection(COLLECTION).document(assignment_id)
     doc = doc_ref.get()
-    if not doc.exists:
+    if not doc.exists or doc.to_dict().get("deletedAt"):
         return jsonify({"error": "Not found"}), 404
     if doc.to_dict().get("userId") != uid:
         return jsonify({"error": "Forbidden"}), 403
@@ -916,13 +1007,13 @@ def get_invited_students(assignment_id):
     uid, err = _uid_from_request()
     if err is not None:
         return err[0], err[1]
-    db = get_firestore()
+    db = get_db()
     if not db:
         return jsonify({"error": "Database not configured"}), 503
     try:
         # Verify assignment belongs to user
         assignment_ref = db.collection(COLLECTION).document(assignment_id).get()
-        if not assignment_ref.exists:
+        if not assignment_ref.exists or assignment_ref.to_dict().get("deletedAt"):
             return jsonify({"error": "Assignment not found"}), 404
         if assignment_ref.to_dict().get("userId") != uid:
             return jsonify({"error": "Forbidden"}), 403
@@ -953,7 +1044,7 @@ def invite_student(assignment_id):
     uid, err = _uid_from_request()
     if err is not None:
         return err[0], err[1]
-    db = get_firestore()
+    db = get_db()
     if not db:
         return jsonify({"error": "Database not configured"}), 503
     
@@ -968,7 +1059,7 @@ def invite_student(assignment_id):
     try:
         # Verify assignment belongs to user
         assignment_ref = db.collection(COLLECTION).document(assignment_id).get()
-        if not assignment_ref.exists:
+        if not assignment_ref.exists or assignment_ref.to_dict().get("deletedAt"):
             return jsonify({"error": "Assignment not found"}), 404
         if assignment_ref.to_dict().get("userId") != uid:
             return jsonify({"error": "Forbidden"}), 403
@@ -983,9 +1074,12 @@ def invite_student(assignment_id):
         assignment_name = assignment_data.get("name", "")
         assignment_desc = assignment_data.get("description", "")
         
-        # Create invite in assignmentInvites collection
+        # Create invite in assignmentInvites collection, bumping the assignment's invitedCount
+        # in the same batch
         now = datetime.utcnow().isoformat() + "Z"
-        add_result = db.collection(INVITES_COLLECTION).add({
+        invite_ref = db.collection(INVITES_COLLECTION).document()
+        batch = db.batch()
+        batch.set(invite_ref, {
             "assignmentId": assignment_id,
             "assignmentName": assignment_name,
             "assignmentDesc": assignment_desc,
@@ -995,10 +1089,12 @@ def invite_student(assignment_id):
             "status": "pending",
             "invitedAt": now,
         })
+        batch.update(assignment_ref.reference, _invited_count_update(db, assignment_id, assignment_data, 1))
+        batch.commit()
 
         current_app.logger.info("[assignments] Invited %s to assignment %s", github_username, assignment_id)
 
-        doc_id = _doc_id_from_add_result(add_result)
+        doc_id = invite_ref.id
         payload = {
             "id": doc_id,
             "assignmentId": assignment_id,
@@ -1023,26 +1119,19 @@ def get_assignments_for_user(github_username):
     if not github_username:
         return jsonify({"error": "github_username is required"}), 400
     
-    db = get_firestore()
+    db = get_db()
     if not db:
         return jsonify({"error": "Database not configured"}), 503
     try:
-        # Get all invites for this user
-        invites = db.collection(INVITES_COLLECTION).where("githubUsername", "==", github_username).stream()
-        assignment_ids = set()
-        for invite in invites:
-            assignment_ids.add(invite.to_dict().get("assignmentId"))
-        
-        # Fetch full assignment details
+        # Get all invites for this user, then their assignments in one batched read
+        assignment_ids = _invited_assignment_ids(db, github_username)
+        found = _get_assignments(db, assignment_ids, STUDENT_ASSIGNMENT_FIELDS)
         items = []
         for assignment_id in assignment_ids:
-            if not assignment_id:
-                continue
-            ref = db.collection(COLLECTION).document(assignment_id).get()
-            if ref.exists:
-                d = ref.to_dict()
+            if assignment_id in found:
+                d = found[assignment_id]
                 items.append({
-                    "id": ref.id,
+                    "id": assignment_id,
                     "name": d.get("name", ""),
                     "description": d.get("description", ""),
                     "createdAt": d.get("createdAt", ""),
@@ -1058,13 +1147,87 @@ def get_assignments_for_user(github_username):
         return jsonify({"error": str(e)}), 500
 
 
+# Collections ingestion writes to for an assignment (by assignmentId).
+INGEST_COLLECTIONS = (
+    LINE_EVENTS_COLLECTION, CITATIONS_COLLECTION, SESSIONS_COLLECTION, SESSION_GROUPS_COLLECTION, VERSIONS_COLLECTION,
+)
+# Collections whose docs reference an assignment by assignmentId, deleted with it (in this order).
+CASCADE_COLLECTIONS = (INVITES_COLLECTION, *INGEST_COLLECTIONS)
+
+
+def _deletion_status(assignment_id, job):
+    """Public view of an assignmentDeletions doc."""
+    return {
+        "id": assignment_id,
+        "state": job.get("state"),
+        "requestedAt": job.get("requestedAt"),
+        "startedAt": job.get("startedAt"),
+        "finishedAt": job.get("finishedAt"),
+        "resweepAt": job.get("resweepAt"),
+        "deleted": job.get("deleted") or {},
+        "error": job.get("error"),
+    }
+
+
+def _cascade_delete_assignment(db, assignment_id):
+    """
+    Run the assignment's cascade deletion (see cascade_delete.cascade_delete): its
+    CASCADE_COLLECTIONS docs, INGEST_COLLECTIONS once more after the ingestion settle
+    time, then the assignment doc. Returns ({collection: docs deleted}, seconds until the
+    settle time is over and the job must run again, or None when it is done).
+    """
+    deleted, resweep_in = cascade_delete(
+        db, db.collection(COLLECTION).document(assignment_id), CASCADE_COLLECTIONS, resweep=INGEST_COLLECTIONS
+    )
+    progress.invalidate([assignment_id])
+    return deleted, resweep_in
+
+
+def _deletion_queue():
+    """Return the process-wide queue whose background thread runs cascade deletions."""
+    app = current_app._get_current_object()
+
+    def commit(assignment_ids):
+        # Runs on the worker thread: needs its own app context for config and logging.
+        with app.app_context():
+            db = get_db()
+            if db is None:
+                return ["Database not configured"] * len(assignment_ids)
+            errors = []
+            for assignment_id in assignment_ids:
+                try:
+                    deleted, resweep_in = _cascade_delete_assignment(db, assignment_id)
+                    if resweep_in is None:
+                        current_app.logger.info("[assignments] Deleted assignment %s: %s", assignment_id, deleted)
+                    else:
+                        # Not waited for here: the worker moves on to the next job meanwhile.
+                        requeue_deletion(assignment_id, resweep_in)
+                    errors.append(None)
+                except Exception as e:
+                    current_app.logger.exception("Cascade deletion of assignment %s failed", assignment_id)
+                    errors.append(str(e))
+            return errors
+
+    return get_deletion_queue(lambda: WriteBehindQueue(
+        commit,
+        maxsize=app.config.get("DELETE_QUEUE_MAXSIZE", 1000),
+        batch_size=1,
+        flush_interval=0,
+        name="assignment-deleter",
+    ))
+
+
 @bp.route("/<assignment_id>", methods=["DELETE"])
 def delete_assignment(assignment_id):
-    """Delete an assignment (must belong to user)."""
+    """
+    Delete an assignment (must belong to user). The assignment is marked deleted (hidden from
+    every endpoint) and 202 is returned; its invites, line events, citations and stored
+    sessions are deleted by a background worker, tracked by GET /<id>/deletion.
+    """
     uid, err = _uid_from_request()
     if err is not None:
         return err[0], err[1]
-    db = get_firestore()
+    db = get_db()
     if not db:
         return jsonify({"error": "Database not configured"}), 503
     try:
@@ -1072,19 +1235,52 @@ def delete_assignment(assignment_id):
         doc = doc_ref.get()
         if not doc.exists:
             return jsonify({"error": "Not found"}), 404
-        if doc.to_dict().get("userId") != uid:
+        d = doc.to_dict()
+        if d.get("userId") != uid:
             return jsonify({"error": "Forbidden"}), 403
-        
-        # Delete all invites for this assignment
-        invites = db.collection(INVITES_COLLECTION).where("assignmentId", "==", assignment_id).stream()
-        for invite in invites:
-            invite.reference.delete()
-        
-        # Delete the assignment
-        doc_ref.delete()
-        current_app.logger.info("[assignments] Deleted assignment %s", assignment_id)
-        return jsonify({"id": assignment_id}), 200
+
+        job_ref = db.collection(DELETIONS_COLLECTION).document(assignment_id)
+        if d.get("deletedAt"):
+            # Already deleted: report the running job instead of queuing another one
+            job = job_ref.get()
+            return jsonify(_deletion_status(assignment_id, job.to_dict() if job.exists else {})), 202
+        now = datetime.utcnow().isoformat() + "Z"
+        job = {"assignmentId": assignment_id, "userId": uid, "state": "queued", "requestedAt": now, "deleted": {}}
+        batch = db.batch()
+        batch.update(doc_ref, {"deletedAt": now})
+        batch.set(job_ref, job)
+        batch.commit()
+        progress.invalidate([assignment_id])
+        status_cache().set(assignment_id, "deleted")
+
+        if not _deletion_queue().put(assignment_id):
+            # Still recorded as queued: resume-deletions finishes it
+            current_app.logger.warning("[assignments] Deletion queue full, assignment %s left queued", assignment_id)
+        current_app.logger.info("[assignments] Marked assignment %s deleted", assignment_id)
+        return jsonify(_deletion_status(assignment_id, job)), 202
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@bp.route("/<assignment_id>/deletion", methods=["GET"])
+def get_assignment_deletion(assignment_id):
+    """Progress of an assignment's cascade deletion (state queued, running, settling, done or failed)."""
+    uid, err = _uid_from_request()
+    if err is not None:
+        return err[0], err[1]
+    db = get_db()
+    if not db:
+        return jsonify({"error": "Database not configured"}), 503
+    try:
+        job = db.collection(DELETIONS_COLLECTION).document(assignment_id).get()
+        if not job.exists:
+            return jsonify({"error": "Not found"}), 404
+        job = job.to_dict()
+        if job.get("userId") != uid:
+            return jsonify({"error": "Forbidden"}), 403
+        return jsonify(_deletion_status(assignment_id, job)), 200
     except Exception as e:
+        current_app.logger.exception(e)
         return jsonify({"error": str(e)}), 500
 
 
@@ -1094,13 +1290,13 @@ def delete_invite(assignment_id, invite_id):
     uid, err = _uid_from_request()
     if err is not None:
         return err[0], err[1]
-    db = get_firestore()
+    db = get_db()
     if not db:
         return jsonify({"error": "Database not configured"}), 503
     try:
         # Verify assignment belongs to user
         assignment_ref = db.collection(COLLECTION).document(assignment_id).get()
-        if not assignment_ref.exists:
+        if not assignment_ref.exists or assignment_ref.to_dict().get("deletedAt"):
             return jsonify({"error": "Assignment not found"}), 404
         if assignment_ref.to_dict().get("userId") != uid:
             return jsonify({"error": "Forbidden"}), 403
@@ -1113,8 +1309,125 @@ def delete_invite(assignment_id, invite_id):
         if invite.to_dict().get("assignmentId") != assignment_id:
             return jsonify({"error": "Invite does not belong to this assignment"}), 400
         
-        invite_ref.delete()
+        batch = db.batch()
+        batch.delete(invite_ref)
+        batch.update(assignment_ref.reference, _invited_count_update(db, assignment_id, assignment_ref.to_dict(), -1))
+        batch.commit()
         current_app.logger.info("[assignments] Deleted invite %s from assignment %s", invite_id, assignment_id)
         return jsonify({"id": invite_id}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+
+@bp.cli.command("rebuild-sessions")
+@click.argument("assignment_ids", nargs=-1)
+@click.option("--all", "rebuild_all", is_flag=True, help="Rebuild every assignment.")
+@click.option("--flagged", is_flag=True, help="Rebuild the assignments whose session store updates failed.")
+def rebuild_sessions_command(assignment_ids, rebuild_all, flagged):
+    """Recompute materialized progress sessions from lineEvents (backfill or repair)."""
+    db = get_db()
+    if db is None:
+        raise click.ClickException("Database not configured")
+    store = progress.session_store(db)
+    if rebuild_all:
+        assignment_ids = [snap.id for snap in db.collection(COLLECTION).stream()]
+    elif flagged:
+        assignment_ids = store.needs_rebuild()
+        if not assignment_ids:
+            click.echo("No flagged assignments")
+            return
+    if not assignment_ids:
+        raise click.UsageError("Pass one or more assignment ids, --all or --flagged")
+    for assignment_id in assignment_ids:
+        docs = db.collection(LINE_EVENTS_COLLECTION).where("assignmentId", "==", assignment_id).stream()
+        written, deleted = store.rebuild(assignment_id, [(doc.id, doc.to_dict()) for doc in docs])
+        progress.invalidate([assignment_id])
+        click.echo(f"{assignment_id}: {written} sessions written, {deleted} deleted")
+
+
+@bp.cli.command("repair-invited-counts")
+@click.argument("assignment_ids", nargs=-1)
+@click.option("--all", "repair_all", is_flag=True, help="Repair every assignment.")
+def repair_invited_counts_command(assignment_ids, repair_all):
+    """Recompute assignments' denormalized invitedCount from their invites (backfill or repair)."""
+    db = get_db()
+    if db is None:
+        raise click.ClickException("Database not configured")
+    if repair_all:
+        assignment_ids = [snap.id for snap in db.collection(COLLECTION).select([]).stream()]
+    if not assignment_ids:
+        raise click.UsageError("Pass one or more assignment ids, or --all")
+    for assignment_id in assignment_ids:
+        ref = db.collection(COLLECTION).document(assignment_id)
+        snap = ref.get()
+        if not snap.exists:
+            click.echo(f"{assignment_id}: not found")
+            continue
+        count = _invited_count(db, assignment_id)
+        stored = snap.to_dict().get("invitedCount")
+        if stored == count:
+            click.echo(f"{assignment_id}: {count} invites")
+            continue
+        ref.update({"invitedCount": count})
+        click.echo(f"{assignment_id}: {count} invites (was {stored})")
+
+
+@bp.cli.command("resume-deletions")
+def resume_deletions_command():
+    """
+    Finish cascade deletions that were queued, interrupted, failed or left settling (e.g. by a
+    restart). Jobs whose final sweep is not due yet are finished once it is.
+    """
+    db = get_db()
+    if db is None:
+        raise click.ClickException("Database not configured")
+    states = ["queued", "running", "settling", "failed"]
+    pending = [job.id for job in db.collection(DELETIONS_COLLECTION).where("state", "in", states).stream()]
+    while pending:
+        settling = []
+        for assignment_id in pending:
+            deleted, resweep_in = _cascade_delete_assignment(db, assignment_id)
+            if resweep_in is None:
+                click.echo(f"{assignment_id}: deleted {deleted}")
+            else:
+                settling.append((resweep_in, assignment_id))
+        if settling:
+            wait = max(resweep_in for resweep_in, _assignment_id in settling)
+            click.echo(f"Waiting {wait:.0f}s for the final sweep of {len(settling)} deletion(s)")
+            time.sleep(wait)
+        pending = [assignment_id for _resweep_in, assignment_id in settling]
+
+
+@bp.cli.command("check-session-engines")
+@click.argument("assignment_ids", nargs=-1)
+@click.option("--all", "check_all", is_flag=True, help="Check every assignment.")
+def check_session_engines_command(assignment_ids, check_all):
+    """Sessionize assignments with both engines and report any difference (and timings)."""
+    if not sessionize.numpy_available():
+        raise click.ClickException("NumPy is not installed")
+    db = get_db()
+    if db is None:
+        raise click.ClickException("Database not configured")
+    if check_all:
+        assignment_ids = [snap.id for snap in db.collection(COLLECTION).stream()]
+    if not assignment_ids:
+        raise click.UsageError("Pass one or more assignment ids, or --all")
+    mismatched = 0
+    for assignment_id in assignment_ids:
+        docs = db.collection(LINE_EVENTS_COLLECTION).where("assignmentId", "==", assignment_id).stream()
+        events = line_events.records((doc.id, doc.to_dict()) for doc in docs)
+        timings = {}
+        results = {}
+        for engine in sessionize.ENGINES:
+            started = time.perf_counter()
+            results[engine] = progress.events_to_sessions(events, engine=engine)
+            timings[engine] = (time.perf_counter() - started) * 1000.0
+        same = results["python"] == results["numpy"]
+        mismatched += not same
+        click.echo(
+            f"{assignment_id}: {len(events)} events, {len(results['python'])} sessions, "
+            f"python {timings['python']:.1f} ms, numpy {timings['numpy']:.1f} ms, "
+            f"{'identical' if same else 'MISMATCH'}"
+        )
+    if mismatched:
+        raise click.ClickException(f"{mismatched} assignment(s) differ between engines")
@@ -1,17 +1,19 @@
 """Classrooms CRUD via Flask; data stored in Firestore."""
 from flask import Blueprint, current_app, jsonify, request
 
-from server.fb_admin import get_firestore, verify_id_token
+from server.fb_admin import verify_id_token
+from server.storage import get_db
 
 
 def _doc_id_from_add_result(result):
     """Return document id from collection.add() result (DocumentReference or tuple)."""
     if hasattr(result, "id"):
         return str(result.id)
-    if isinstance(result, (list, tuple)) and len(result) >= 1:
-        first = result[0]
-        if hasattr(first, "id"):
-            return str(first.id)
+    if isinstance(result, (list, tuple)):
+        # Firestore (and server.storage) return (write_time, DocumentReference)
+        for item in result:
+            if hasattr(item, "id"):
+                return str(item.id)
     return ""
 
 bp = Blueprint("classrooms", __name__, url_prefix="")
@@ -36,7 +38,7 @@ def list_classrooms():
     uid, err = _uid_from_request()
     if err is not None:
         return err[0], err[1]
-    db = get_firestore()
+    db = get_db()
     if not db:
         return jsonify({"error": "Database not configured"}), 503
     try:
@@ -63,7 +65,7 @@ def create_classroom():
     uid, err = _uid_from_request()
     if err is not None:
         return err[0], err[1]
-    db = get_firestore()
+    db = get_db()
     if not db:
         return jsonify({"error": "Database not configured"}), 503
     body = request.get_json() or {}
@@ -98,7 +100,7 @@ def get_classroom(classroom_id):
     uid, err = _uid_from_request()
     if err is not None:
         return err[0], err[1]
-    db = get_firestore()
+    db = get_db()
     if not db:
         return jsonify({"error": "Database not configured"}), 503
     try:
@@ -125,7 +127,7 @@ def update_classroom(classroom_id):
     uid, err = _uid_from_request()
     if err is not None:
         return err[0], err[1]
-    db = get_firestore()
+    db = get_db()
     if not db:
         return jsonify({"error": "Database not configured"}), 503
     doc_ref = db.collection(COLLECTION).document(classroom_id)
@@ -172,7 +174,7 @@ def delete_classroom(classroom_id):
     uid, err = _uid_from_request()
     if err is not None:
         return err[0], err[1]
-    db = get_firestore()
+    db = get_db()
     if not db:
         return jsonify({"error": "Database not configured"}), 503
     try:
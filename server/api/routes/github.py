@@ -1,10 +1,25 @@
-"""GitHub API proxy for user lookup and search. Used to validate usernames and fetch profile data."""
+"""GitHub API proxy for user lookup and search. Used to validate usernames and fetch profile data.
+
+Results are cached per process (LRU of GITHUB_CACHE_SIZE). An entry is fresh for
+GITHUB_USER_CACHE_TTL_SECONDS / GITHUB_SEARCH_CACHE_TTL_SECONDS; after that it is revalidated
+with If-None-Match (a 304 does not count against GitHub's rate limit), and while GitHub is
+rate limited or unreachable it is served stale, for up to GITHUB_CACHE_STALE_SECONDS."""
 import re
+import threading
+import time
+
 import requests
 from flask import Blueprint, current_app, jsonify, request
 
+from server import github_client
+from server.cache import named_cache
+from server.github_client import RateLimitExceeded
+
 bp = Blueprint("github", __name__, url_prefix="")
 
+_stats = {"fresh": 0, "revalidated": 0, "refreshed": 0, "stale": 0, "misses": 0}
+_stats_lock = threading.Lock()
+
 
 def _github_headers():
     headers = {"Accept": "application/vnd.github.v3+json"}
@@ -20,6 +35,100 @@ def _has_token():
     return bool((current_app.config.get("GITHUB_TOKEN") or "").strip())
 
 
+def _github_cache():
+    return named_cache(
+        "github",
+        maxsize=current_app.config.get("GITHUB_CACHE_SIZE", 1024),
+        ttl=current_app.config.get("GITHUB_CACHE_STALE_SECONDS", 86400),
+    )
+
+
+def _count(outcome):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def github_cache_stats():
+    """How cached GitHub lookups were answered, for the metrics endpoint."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _rate_limited(r):
+    """Primary (quota used up) or secondary (Retry-After) rate limit."""
+    if r.status_code == 429:
+        return True
+    return r.status_code == 403 and (r.headers.get("X-RateLimit-Remaining") == "0" or "Retry-After" in r.headers)
+
+
+def _cached_get(key, url, params, fresh_ttl, parse):
+    """
+    GET a GitHub URL through the cache. Returns (data, outcome, r): data is parse(body) of a
+    200 (or the cached data for a 304, a fresh entry, or a rate-limited / failed request
+    while a stale entry exists), else None; outcome is "fresh", "revalidated", "refreshed",
+    "stale" or "miss"; r is GitHub's response (None if not asked or the request failed).
+    Raises RateLimitExceeded when the quota is used up and nothing is cached.
+    """
+    cache = _github_cache()
+    entry = cache.get(key)
+    if entry is not None and entry["freshUntil"] > time.monotonic():
+        _count("fresh")
+        return entry["data"], "fresh", None
+    headers = _github_headers()
+    if entry is not None and entry["etag"]:
+        headers["If-None-Match"] = entry["etag"]
+    try:
+        r = github_client.get(url, params=params, headers=headers, timeout=10)
+    except RateLimitExceeded as e:
+        if entry is None:
+            raise
+        current_app.logger.info("[GitHub] serving stale %s (%s)", key, e)
+        _count("stale")
+        return entry["data"], "stale", None
+    except requests.RequestException as e:
+        current_app.logger.warning("GitHub API request failed: %s", e)
+        r = None
+    if entry is not None and r is not None and r.status_code == 304:
+        cache.set(key, dict(entry, freshUntil=time.monotonic() + fresh_ttl))
+        _count("revalidated")
+        return entry["data"], "revalidated", r
+    if r is not None and r.status_code == 200:
+        data = parse(r.json())
+        cache.set(key, {"data": data, "etag": r.headers.get("ETag"), "freshUntil": time.monotonic() + fresh_ttl})
+        _count("refreshed" if entry is not None else "misses")
+        return data, "refreshed" if entry is not None else "miss", r
+    if entry is not None and (r is None or _rate_limited(r) or r.status_code >= 500):
+        current_app.logger.info("[GitHub] serving stale %s (status=%s)", key, r.status_code if r is not None else "n/a")
+        _count("stale")
+        return entry["data"], "stale", r
+    _count("misses")
+    return None, "miss", r
+
+
+def _with_cache_header(resp, outcome):
+    resp.headers["X-Cache"] = outcome.upper()
+    return resp
+
+
+def _search_items(body):
+    return [
+        {
+            "login": u.get("login"),
+            "avatar_url": u.get("avatar_url"),
+            "name": u.get("login"),  # search API doesn't return name; use login
+        }
+        for u in body.get("items", [])[:10]
+    ]
+
+
+def _user_profile(body):
+    return {
+        "login": body.get("login"),
+        "avatar_url": body.get("avatar_url"),
+        "name": body.get("name") or body.get("login"),
+    }
+
+
 @bp.route("/search/users", methods=["GET"])
 def search_users():
     """Search GitHub users by query (for typeahead). Returns list of { login, avatar_url, name }."""
@@ -30,30 +139,31 @@ def search_users():
     current_app.logger.info("[GitHub search] query=%r token=%s", q, "yes" if _has_token() else "NO")
 
     # GitHub search: restrict to users, limit results
-    url = "https://api.github.com/search/users"
+    url = f"{github_client.API_URL}/search/users"
     params = {"q": f"{q} type:user", "per_page": 10}
     try:
-        r = requests.get(url, params=params, headers=_github_headers(), timeout=10)
-    except requests.RequestException as e:
-        current_app.logger.warning("GitHub API request failed: %s", e)
+        items, outcome, r = _cached_get(
+            ("search", q.lower()), url, params, current_app.config.get("GITHUB_SEARCH_CACHE_TTL_SECONDS", 300), _search_items
+        )
+    except RateLimitExceeded as e:
+        current_app.logger.info("[GitHub search] not sent: %s", e)
+        return jsonify({
+            "items": [],
+            "error": f"GitHub rate limit exceeded. Add GITHUB_TOKEN in server/.env for higher limits, or retry in {e.retry_after:.0f}s.",
+        }), 200
+    if items is not None:
+        current_app.logger.info("[GitHub search] %s items_count=%s", outcome, len(items))
+        return _with_cache_header(jsonify({"items": items}), outcome), 200
+    if r is None:
         return jsonify({"error": "GitHub API unavailable", "items": []}), 200
 
     # Log GitHub response to help debug token / rate limit / errors
-    items_count = "n/a"
     gh_msg = ""
     try:
-        gh_body = r.json()
-        gh_msg = (gh_body.get("message") or "")[:80]
-        if r.status_code == 200:
-            items_count = len(gh_body.get("items", []))
+        gh_msg = (r.json().get("message") or "")[:80]
     except Exception:
         gh_msg = (r.text or "")[:80]
-    current_app.logger.info(
-        "[GitHub search] response status=%s items_count=%s message=%r",
-        r.status_code,
-        items_count,
-        gh_msg or "(none)",
-    )
+    current_app.logger.info("[GitHub search] response status=%s message=%r", r.status_code, gh_msg or "(none)")
 
     if r.status_code == 403:
         # Rate limited or forbidden – return 200 so frontend can show message
@@ -61,23 +171,12 @@ def search_users():
             "items": [],
             "error": "GitHub rate limit exceeded. Add GITHUB_TOKEN in server/.env for higher limits, or wait a minute.",
         }), 200
-    if r.status_code != 200:
-        try:
-            err = r.json()
-            msg = err.get("message", r.text[:200])
-        except Exception:
-            msg = r.text[:200] if r.text else "GitHub API error"
-        return jsonify({"items": [], "error": msg}), 200
-
-    data = r.json()
-    items = []
-    for u in data.get("items", [])[:10]:
-        items.append({
-            "login": u.get("login"),
-            "avatar_url": u.get("avatar_url"),
-            "name": u.get("login"),  # search API doesn't return name; use login
-        })
-    return jsonify({"items": items}), 200
+    try:
+        err = r.json()
+        msg = err.get("message", r.text[:200])
+    except Exception:
+        msg = r.text[:200] if r.text else "GitHub API error"
+    return jsonify({"items": [], "error": msg}), 200
 
 
 @bp.route("/users/<username>", methods=["GET"])
@@ -89,28 +188,28 @@ def get_user(username):
 
     current_app.logger.info("[GitHub user] username=%r token=%s", username, "yes" if _has_token() else "NO")
 
-    url = f"https://api.github.com/users/{username}"
+    url = f"{github_client.API_URL}/users/{username}"
     try:
-        r = requests.get(url, headers=_github_headers(), timeout=10)
-    except requests.RequestException as e:
-        current_app.logger.warning("GitHub API request failed: %s", e)
+        profile, outcome, r = _cached_get(
+            ("user", username.lower()), url, None, current_app.config.get("GITHUB_USER_CACHE_TTL_SECONDS", 3600), _user_profile
+        )
+    except RateLimitExceeded as e:
+        current_app.logger.info("[GitHub user] not sent: %s", e)
+        resp = jsonify({"error": "GitHub rate limit exceeded", "retryAfter": round(e.retry_after)})
+        resp.headers["Retry-After"] = str(max(1, round(e.retry_after)))
+        return resp, 429
+    if profile is not None:
+        current_app.logger.info("[GitHub user] %s", outcome)
+        return _with_cache_header(jsonify(profile), outcome), 200
+    if r is None:
         return jsonify({"error": "GitHub API unavailable"}), 502
 
     try:
-        gh_body = r.json()
-        gh_msg = (gh_body.get("message") or "")[:80]
+        gh_msg = (r.json().get("message") or "")[:80]
     except Exception:
         gh_msg = (r.text or "")[:80]
     current_app.logger.info("[GitHub user] response status=%s message=%r", r.status_code, gh_msg or "(none)")
 
     if r.status_code == 404:
         return jsonify({"error": "User not found on GitHub"}), 404
-    if r.status_code != 200:
-        return jsonify({"error": "GitHub API error", "detail": r.text}), r.status_code
-
-    data = r.json()
-    return jsonify({
-        "login": data.get("login"),
-        "avatar_url": data.get("avatar_url"),
-        "name": data.get("name") or data.get("login"),
-    }), 200
+    return jsonify({"error": "GitHub API error", "detail": r.text}), r.status_code
@@ -1,6 +1,14 @@
 """Health and readiness for frontend and load balancers."""
 from flask import Blueprint, jsonify
 
+from server.api.routes.github import github_cache_stats
+from server.cache import cache_stats
+from server.cascade_delete import get_deletion_queue
+from server.fb_admin import cert_refresh_stats
+from server.github_client import client_stats as github_client_stats
+from server.ingest_queue import get_line_event_queue
+from server.session_store import store_stats as session_store_stats
+
 bp = Blueprint("health", __name__, url_prefix="")
 
 
@@ -15,3 +23,24 @@ def health():
 def ready():
     """Readiness: app is ready to serve."""
     return jsonify({"status": "ok"}), 200
+
+
+@bp.route("/metrics", methods=["GET"])
+def metrics():
+    """
+    In-process metrics: write-behind ingestion and deletion queue depth and flush latency,
+    session store updates applied / failed, cache hit/miss counters (including verified
+    tokens), how GitHub lookups were answered,
+    GitHub connection reuse and rate-limit quotas, token signing cert refresh.
+    """
+    q = get_line_event_queue()
+    dq = get_deletion_queue()
+    return jsonify({
+        "ingestQueue": {"enabled": True, **q.stats()} if q is not None else {"enabled": False},
+        "deletionQueue": {"enabled": True, **dq.stats()} if dq is not None else {"enabled": False},
+        "sessionStore": session_store_stats(),
+        "caches": cache_stats(),
+        "githubCache": github_cache_stats(),
+        "githubClient": github_client_stats(),
+        "tokenCertRefresh": cert_refresh_stats(),
+    }), 200
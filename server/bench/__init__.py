@@ -0,0 +1,2 @@
+"""Benchmarks for the /progress pipeline: synthetic workloads (workload.py) and a staged
+suite with a stored baseline (suite.py; run with `python -m server.bench`)."""
@@ -0,0 +1,149 @@
+"""Run the /progress benchmark suite: python -m server.bench [--sizes 1k,10k,100k,1m] ...
+
+With --baseline FILE, exits 1 when a stage is slower or uses more memory than FILE allows
+(see --time-tolerance / --memory-tolerance); --update-baseline writes this run to FILE instead.
+Baselines are machine-specific, so none is committed: record one on the machine that runs
+the comparison."""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+
+DEFAULT_SIZES = "1k,10k,100k"
+# Differences below these never count as regressions (timer and allocator noise).
+TIME_FLOOR_SECONDS = 0.02
+MEMORY_FLOOR_MIB = 1.0
+
+
+def parse_size(text):
+    text = text.strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text[:-1] if scale > 1 else text) * scale)
+
+
+def label(n):
+    if n % 1_000_000 == 0:
+        return f"{n // 1_000_000}m"
+    if n % 1_000 == 0:
+        return f"{n // 1_000}k"
+    return str(n)
+
+
+def compare(results, baseline, time_tolerance, memory_tolerance):
+    """Regression messages for stages of sizes present in both runs."""
+    problems = []
+    for size, run in results["sizes"].items():
+        base = baseline.get("sizes", {}).get(size)
+        if base is None:
+            continue
+        for stage, got in run["stages"].items():
+            want = base["stages"].get(stage)
+            if want is None:
+                continue
+            if got["seconds"] > want["seconds"] * (1 + time_tolerance) and got["seconds"] - want["seconds"] > TIME_FLOOR_SECONDS:
+                problems.append(f"{size} {stage}: {got['seconds']:.3f}s vs baseline {want['seconds']:.3f}s")
+            if (
+                got.get("peakMiB") is not None
+                and want.get("peakMiB") is not None
+                and got["peakMiB"] > want["peakMiB"] * (1 + memory_tolerance)
+                and got["peakMiB"] - want["peakMiB"] > MEMORY_FLOOR_MIB
+            ):
+                problems.append(f"{size} {stage}: {got['peakMiB']:.1f} MiB vs baseline {want['peakMiB']:.1f} MiB")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m server.bench", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"event counts, e.g. 1k,10k,100k,1m (default {DEFAULT_SIZES})")
+    parser.add_argument("--groups", type=int, default=8, help="repo groups (default 8)")
+    parser.add_argument("--students", type=int, default=3, help="students per group (default 3)")
+    parser.add_argument("--paste-rate", type=float, default=0.03, help="share of active flushes with a paste burst")
+    parser.add_argument("--active-rate", type=float, default=0.6, help="share of flushes with changes during a session")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--engine", choices=("python", "numpy"), default="python", help="sessionization engine")
+    parser.add_argument("--repeat", type=int, default=None, help="timed runs per stage (default 3 up to 10k events, else 1)")
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced memory runs")
+    parser.add_argument("--baseline", help="baseline JSON to compare with (default: no comparison)")
+    parser.add_argument("--update-baseline", action="store_true", help="write this run to --baseline instead")
+    parser.add_argument("--time-tolerance", type=float, default=0.5, help="allowed slowdown (0.5 = 50%%)")
+    parser.add_argument("--memory-tolerance", type=float, default=0.2, help="allowed peak memory growth")
+    parser.add_argument("--json", dest="json_out", help="also write results to this file")
+    args = parser.parse_args(argv)
+    if args.update_baseline and not args.baseline:
+        parser.error("--update-baseline needs --baseline FILE")
+
+    # The SQLite engine in a RAM-backed directory when there is one.
+    workdir = tempfile.mkdtemp(prefix="clearcode-bench-", dir="/dev/shm" if os.path.isdir("/dev/shm") else None)
+    from server.bench.suite import STAGES, Bench, local_app
+    from server.bench.workload import WorkloadSpec
+
+    app = local_app(
+        workdir,
+        PROGRESS_CACHE_SIZE=0,
+        PROGRESS_SESSION_STORE=False,
+        PROGRESS_PARALLEL_MIN_EVENTS=0,
+        PUSH_WRITE_BEHIND=False,
+        SESSION_ENGINE=args.engine,
+    )
+
+    results = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "engine": args.engine,
+        "workload": {"groups": args.groups, "students": args.students, "pasteRate": args.paste_rate,
+                     "activeRate": args.active_rate, "seed": args.seed},
+        "sizes": {},
+    }
+    try:
+        for n in [parse_size(s) for s in args.sizes.split(",") if s.strip()]:
+            spec = WorkloadSpec(n, groups=args.groups, students=args.students, paste_rate=args.paste_rate,
+                                active_rate=args.active_rate, seed=args.seed, assignment_id=f"bench-{label(n)}")
+            repeat = args.repeat if args.repeat is not None else (3 if n <= 10_000 else 1)
+            bench = Bench(app, spec, engine=args.engine, repeat=repeat, memory=not args.no_memory)
+            stages = bench.run()
+            results["sizes"][label(n)] = {
+                "events": n,
+                "citations": bench.citation_count,
+                "sessions": bench.sessions,
+                "stages": stages,
+            }
+            print(f"\n{label(n)} events ({bench.citation_count} citations, {bench.sessions} sessions)")
+            print(f"  {'stage':<22}{'seconds':>10}{'peak MiB':>11}")
+            for stage in STAGES:
+                got = stages[stage]
+                peak = f"{got['peakMiB']:.1f}" if got["peakMiB"] is not None else "-"
+                print(f"  {stage:<22}{got['seconds']:>10.3f}{peak:>11}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+    if not args.baseline:
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline} (run with --update-baseline to record one)")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    problems = compare(results, baseline, args.time_tolerance, args.memory_tolerance)
+    if problems:
+        print("\nRegressions against baseline:")
+        for problem in problems:
+            print(f"  {problem}")
+        return 1
+    print("\nNo regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,255 @@
+"""Deadline-surge load test of the ingestion endpoints: python -m server.bench.loadtest
+
+Simulates K extension clients against one server process. Each client flushes on the
+extension's cadence (every 20 s, first flush at a random offset): a /citations request when
+the flush changed 20 or more lines, then one /push/batch with the flush's runs, as
+clearcode/extension.js does. Flushes come from workload.py with every student working
+through the whole run (no breaks: the deadline surge), so bursts are typing plus paste
+floods. Clients ramp through --clients, one step of --duration seconds each.
+
+By default the app runs in this process on the SQLite backend in a temporary directory,
+served by a threaded werkzeug server (like `flask run`); --url targets a running server
+instead (e.g. gunicorn with the real deployment config; --assignment-id names an existing
+assignment there to write to). Reports throughput, p50/p95/p99
+latency and error rate per endpoint and step, and writes them as JSON (--report)."""
+import argparse
+import contextlib
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import requests
+
+from server.bench.workload import FLUSH_SECONDS, WorkloadSpec, _iso, _student_stream
+
+ENDPOINTS = ("push", "citations")
+PATHS = {"push": "/api/v1/assignments/push/batch", "citations": "/api/v1/assignments/citations"}
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an ascending list (None if empty)."""
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+
+def _flushes(spec, client, count, rng):
+    """The first `count` flushes of one client: [citation payload or None, [event payloads]] each."""
+    group, student = divmod(client, spec.students)
+    flushes = []
+    current_t = None
+    for t, kind, payload in _student_stream(spec, group, student, math.inf, rng):
+        if t != current_t:
+            if len(flushes) == count:
+                break
+            flushes.append([None, []])
+            current_t = t
+        if kind == "citation":
+            flushes[-1][0] = payload
+        else:
+            flushes[-1][1].append(payload)
+    return flushes
+
+
+class Client(threading.Thread):
+    """One extension: sends its flushes on the cadence until stop is set, recording each request."""
+
+    def __init__(self, base_url, flushes, cadence, offset, stop, samples):
+        super().__init__(daemon=True)
+        self.base_url = base_url
+        self.flushes = flushes
+        self.cadence = cadence
+        self.offset = offset
+        self.stop = stop
+        self.samples = samples
+        self.late = 0
+
+    def _send(self, session, endpoint, body):
+        started = time.perf_counter()
+        try:
+            status = session.post(self.base_url + PATHS[endpoint], json=body, timeout=60).status_code
+        except requests.RequestException:
+            status = None
+        self.samples.append((endpoint, time.perf_counter() - started, status, len(body) if endpoint == "push" else 1))
+
+    def run(self):
+        session = requests.Session()
+        due = time.monotonic() + self.offset
+        i = 0
+        while not self.stop.wait(max(0.0, due - time.monotonic())):
+            citation, events = self.flushes[i % len(self.flushes)]  # wraps only if the step overruns
+            i += 1
+            stamp = _iso(datetime.now(timezone.utc))
+            if citation is not None:
+                self._send(session, "citations", dict(citation, createdAt=stamp))
+            self._send(session, "push", [dict(e, updatedAt=stamp) for e in events])
+            due += self.cadence
+            if time.monotonic() > due:
+                # The flush took longer than the cadence: send the next one right away.
+                self.late += 1
+                due = time.monotonic()
+        session.close()
+
+
+def summarize(samples, seconds):
+    """Per-endpoint requests, throughput, error rate and latency percentiles (ms)."""
+    out = {}
+    for endpoint in ENDPOINTS:
+        rows = [s for s in samples if s[0] == endpoint]
+        latencies = sorted(s[1] * 1000 for s in rows)
+        errors = sum(1 for s in rows if s[2] is None or not 200 <= s[2] < 300)
+        out[endpoint] = {
+            "requests": len(rows),
+            "requestsPerSecond": round(len(rows) / seconds, 2),
+            "eventsPerSecond": round(sum(s[3] for s in rows) / seconds, 2),
+            "errors": errors,
+            "errorRate": round(errors / len(rows), 4) if rows else 0.0,
+            "p50Ms": _round(percentile(latencies, 50)),
+            "p95Ms": _round(percentile(latencies, 95)),
+            "p99Ms": _round(percentile(latencies, 99)),
+            "maxMs": _round(latencies[-1] if latencies else None),
+        }
+    return out
+
+
+def _round(value):
+    return round(value, 1) if value is not None else None
+
+
+def run_step(base_url, clients, duration, cadence, spec, seed):
+    """Run `clients` extensions for `duration` seconds; returns the step's report."""
+    rng = random.Random(seed)
+    samples = []  # list.append is atomic: the clients share one list
+    stop = threading.Event()
+    count = math.ceil(duration / cadence) + 1
+    workers = [
+        Client(base_url, _flushes(spec, c, count, random.Random(rng.random())), cadence, rng.uniform(0, cadence), stop, samples)
+        for c in range(clients)
+    ]
+    started = time.monotonic()
+    for w in workers:
+        w.start()
+    time.sleep(duration)
+    stop.set()
+    for w in workers:
+        w.join()
+    elapsed = time.monotonic() - started
+    return {
+        "clients": clients,
+        "seconds": round(elapsed, 1),
+        "lateFlushes": sum(w.late for w in workers),
+        "endpoints": summarize(samples, elapsed),
+    }
+
+
+@contextlib.contextmanager
+def local_server(args, assignment_id):
+    """
+    Serve a local app (SQLite backend in a temporary directory) with assignment_id created
+    on a free port; yields its URL.
+    """
+    import logging
+
+    from werkzeug.serving import make_server
+
+    workdir = tempfile.mkdtemp(prefix="clearcode-load-", dir="/dev/shm" if os.path.isdir("/dev/shm") else None)
+    from server.bench.suite import create_assignment, local_app
+
+    app = local_app(workdir, PUSH_WRITE_BEHIND=args.write_behind)
+    create_assignment(app, assignment_id)
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        # /citations prints every step; keep the report readable.
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            yield f"http://127.0.0.1:{server.server_port}"
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m server.bench.loadtest", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--clients", default="25,50,100,200", help="client counts to ramp through (default 25,50,100,200)")
+    parser.add_argument("--duration", type=float, default=60, help="seconds per step (default 60)")
+    parser.add_argument("--cadence", type=float, default=FLUSH_SECONDS, help=f"seconds between flushes (default {FLUSH_SECONDS})")
+    parser.add_argument("--students", type=int, default=3, help="students per repo group (default 3)")
+    parser.add_argument("--paste-rate", type=float, default=0.05, help="share of flushes with a paste flood (default 0.05)")
+    parser.add_argument("--active-rate", type=float, default=0.9, help="share of ticks with changes (default 0.9)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--url", help="server to load (default: an in-process app on SQLite)")
+    parser.add_argument("--assignment-id", help="existing assignment on --url to write to (required with --url)")
+    parser.add_argument("--write-behind", action="store_true", help="in-process app with PUSH_WRITE_BEHIND on")
+    parser.add_argument("--slo-ms", type=float, default=1000, help="p99 latency budget per endpoint (default 1000)")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="error rate budget (default 0.01)")
+    parser.add_argument("--report", default="loadtest-report.json", help="JSON report path (default loadtest-report.json)")
+    args = parser.parse_args(argv)
+    if args.url and not args.assignment_id:
+        parser.error("--url needs --assignment-id: ingestion only writes to existing assignments")
+
+    client_counts = [int(c) for c in args.clients.split(",") if c.strip()]
+    # One assignment per run; students never break, so every tick is a (likely) flush.
+    spec = WorkloadSpec(
+        0,
+        students=args.students,
+        paste_rate=args.paste_rate,
+        active_rate=args.active_rate,
+        session_minutes=(10**6, 10**6),
+        seed=args.seed,
+        assignment_id=args.assignment_id or f"load-{int(time.time())}",
+        flush_seconds=args.cadence,
+    )
+    report = {
+        "startedAt": _iso(datetime.now(timezone.utc)),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "target": args.url or ("in-process (write-behind)" if args.write_behind else "in-process"),
+        "settings": {"cadenceSeconds": args.cadence, "durationSeconds": args.duration, "students": args.students,
+                     "pasteRate": args.paste_rate, "activeRate": args.active_rate, "seed": args.seed,
+                     "sloMs": args.slo_ms, "maxErrorRate": args.max_error_rate},
+        "steps": [],
+        "maxClientsWithinSlo": None,
+    }
+    target = contextlib.nullcontext(args.url.rstrip("/")) if args.url else local_server(args, spec.assignment_id)
+    with target as base_url:
+        for i, clients in enumerate(client_counts):
+            step = run_step(base_url, clients, args.duration, args.cadence, spec, args.seed + i)
+            step["withinSlo"] = all(
+                e["requests"] == 0 or (e["p99Ms"] <= args.slo_ms and e["errorRate"] <= args.max_error_rate)
+                for e in step["endpoints"].values()
+            )
+            if step["withinSlo"]:
+                report["maxClientsWithinSlo"] = clients
+            report["steps"].append(step)
+            print(f"\n{clients} clients, {step['seconds']}s ({step['lateFlushes']} late flushes)"
+                  f"{'' if step['withinSlo'] else '  OVER BUDGET'}", file=sys.stderr)
+            print(f"  {'endpoint':<11}{'req/s':>8}{'events/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}",
+                  file=sys.stderr)
+            for endpoint, e in step["endpoints"].items():
+                print(f"  {endpoint:<11}{e['requestsPerSecond']:>8}{e['eventsPerSecond']:>10}"
+                      f"{_cell(e['p50Ms'])}{_cell(e['p95Ms'])}{_cell(e['p99Ms'])}{e['errorRate']:>8.1%}",
+                      file=sys.stderr)
+
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+    print(f"\nMax clients within budget: {report['maxClientsWithinSlo']}; report written to {args.report}", file=sys.stderr)
+    return 0
+
+
+def _cell(ms):
+    return f"{ms:>9.1f}" if ms is not None else f"{'-':>9}"
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,297 @@
+"""Stages of the /progress pipeline, timed and memory-profiled over one generated workload.
+
+Each stage runs on the output of the one before it, against the storage backend the
+process is configured with (the runner uses the SQLite engine in a temporary directory):
+
+- ingest: generate the workload and POST it to /push/batch and /citations
+- read: stream the assignment's lineEvents and citations
+- records: line_events.records (parse docs into LineEvent records)
+- sessions: progress.events_to_sessions per repo group
+- merge_details: progress.merge_consecutive_details per session
+- citations: progress.index_citations + progress.citations_for_session per session (what /progress uses)
+- citation_in_session: the earlier per-citation datetime check (citation_in_session) against each citation's nearest sessions
+- progress / progress_summary / progress_stream: GET /progress end to end (cache off)
+
+Time is the best of `repeat` runs; peak memory is traced (tracemalloc) in a separate run,
+so tracing does not slow the timed runs. Peaks are allocations above the stage's start."""
+import base64
+import bisect
+import contextlib
+import gc
+import io
+import json
+import logging
+import os
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+from server.bench.workload import generate
+
+STAGES = (
+    "ingest",
+    "read",
+    "records",
+    "sessions",
+    "merge_details",
+    "citations",
+    "citation_in_session",
+    "progress",
+    "progress_summary",
+    "progress_stream",
+)
+
+
+def local_app(workdir, **config):
+    """
+    A server app on the SQLite backend in workdir, with dev tokens instead of Firebase.
+    Storage is picked by the app config, so use the database inside an app context.
+    """
+    os.environ["DEV_SKIP_TOKEN_VERIFY"] = "1"
+    os.environ["FIREBASE_PROJECT_ID"] = ""
+    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = ""
+    from server.app import create_app
+
+    app = create_app()
+    app.logger.setLevel(logging.WARNING)
+    app.config.update(STORAGE_BACKEND="sqlite", SQLITE_PATH=os.path.join(workdir, "bench.sqlite3"))
+    app.config.update(config)
+    return app
+
+
+def create_assignment(app, assignment_id, uid="bench"):
+    """Store an assignment doc with a fixed id: ingestion only writes to existing assignments."""
+    from server.api.routes import assignments
+
+    with app.app_context():
+        assignments.get_db().collection(assignments.COLLECTION).document(assignment_id).set({
+            "userId": uid,
+            "name": assignment_id,
+            "description": "",
+            "createdAt": "",
+            "dueDate": "",
+            "isGroup": False,
+            "maxGroupSize": None,
+            "groups": [],
+            "invitedCount": 0,
+        })
+
+
+def dev_token(uid="bench"):
+    """Unsigned JWT for the DEV_SKIP_TOKEN_VERIFY path of fb_admin.verify_id_token."""
+    def part(obj):
+        return base64.urlsafe_b64encode(json.dumps(obj).encode()).decode().rstrip("=")
+    return f"{part({'alg': 'none'})}.{part({'sub': uid, 'user_id': uid})}.bench"
+
+
+def citation_in_session(citation_ts, session_start_iso, session_end_iso):
+    """
+    Whether a citation timestamp falls within a session (with the end buffer), parsing
+    every timestamp as datetimes: the per-citation check /progress used before citations
+    were indexed, kept as a baseline for the citations stage.
+    """
+    from server import progress
+    from server.line_events import parse_iso
+
+    start_dt = parse_iso(session_start_iso)
+    end_dt = parse_iso(session_end_iso)
+    if start_dt is None or end_dt is None:
+        return False
+    ts = citation_ts
+    if hasattr(ts, "timestamp"):
+        ts = datetime.fromtimestamp(ts.timestamp(), tz=timezone.utc)
+    elif isinstance(ts, str):
+        ts = parse_iso(ts)
+    else:
+        ts = None
+    if ts is None:
+        return False
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    end_with_buffer = end_dt + timedelta(seconds=progress.CITATION_SESSION_END_BUFFER_SECONDS)
+    return start_dt <= ts <= end_with_buffer
+
+
+def _measure(fn, repeat, memory):
+    """(result, best seconds, peak MiB or None) of fn()."""
+    best = None
+    result = None
+    for _ in range(max(1, repeat)):
+        gc.collect()
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    peak = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            fn()
+            peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        finally:
+            tracemalloc.stop()
+    return result, best, peak
+
+
+class Bench:
+    """One workload in one app: run() executes every stage and returns their measurements."""
+
+    def __init__(self, app, spec, engine="python", repeat=1, memory=True):
+        from server import line_events, progress
+        from server.api.routes import assignments
+
+        self.a = assignments
+        self.line_events = line_events
+        self.progress = progress
+        self.app = app
+        self.client = app.test_client()
+        self.spec = spec
+        self.engine = engine
+        self.repeat = repeat
+        self.memory = memory
+        self.headers = {"Authorization": f"Bearer {dev_token()}"}
+        self.citation_count = 0
+
+    def _ingest(self, assignment_id):
+        """POST the workload under assignment_id; returns the number of citations sent."""
+        a = self.a
+        create_assignment(self.app, assignment_id)
+        batch = []
+        citations = 0
+
+        def flush():
+            resp = self.client.post("/api/v1/assignments/push/batch", json=batch)
+            if resp.status_code != 200:
+                raise RuntimeError(f"/push/batch answered {resp.status_code}: {resp.get_data(as_text=True)[:200]}")
+            batch.clear()
+
+        # /citations prints every step: keep the report readable.
+        with contextlib.redirect_stdout(io.StringIO()):
+            for kind, payload in generate(self.spec):
+                if kind == "citation":
+                    payload["AssignmentID"] = assignment_id
+                    self.client.post("/api/v1/assignments/citations", json=payload)
+                    citations += 1
+                    continue
+                payload["AssignmentID"] = assignment_id
+                batch.append(payload)
+                if len(batch) == a.PUSH_BATCH_MAX_EVENTS:
+                    flush()
+            if batch:
+                flush()
+        return citations
+
+    def _ingest_stage(self):
+        """Ingest once for timing; the traced run goes to a scratch assignment, deleted after."""
+        started = time.perf_counter()
+        self.citation_count = self._ingest(self.spec.assignment_id)
+        elapsed = time.perf_counter() - started
+        peak = None
+        if self.memory:
+            scratch = f"{self.spec.assignment_id}-traced"
+            gc.collect()
+            tracemalloc.start()
+            try:
+                self._ingest(scratch)
+                peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            finally:
+                tracemalloc.stop()
+            from server.cascade_delete import delete_where
+
+            with self.app.app_context():
+                db = self.a.get_db()
+                for collection in self.a.INGEST_COLLECTIONS:
+                    delete_where(db, collection, "assignmentId", scratch)
+                db.collection(self.a.COLLECTION).document(scratch).delete()
+        return elapsed, peak
+
+    def _read(self):
+        with self.app.app_context():
+            db = self.a.get_db()
+        assignment_id = self.spec.assignment_id
+        docs = [
+            (snap.id, snap.to_dict())
+            for snap in db.collection(self.line_events.LINE_EVENTS_COLLECTION).where("assignmentId", "==", assignment_id).stream()
+        ]
+        citations = [
+            snap.to_dict()
+            for snap in db.collection(self.progress.CITATIONS_COLLECTION).where("assignmentId", "==", assignment_id).stream()
+        ]
+        return docs, citations
+
+    def _sessions(self, records):
+        by_repo = {}
+        for r in records:
+            by_repo.setdefault(r.repo, []).append(r)
+        groups = []
+        for repo, group_records in by_repo.items():
+            members = {r.user for r in group_records if r.user}
+            sessions = self.progress.events_to_sessions(group_records, f"{repo}-", engine=self.engine)
+            groups.append((members, sessions))
+        return groups
+
+    def _merge_details(self, groups):
+        return [self.progress.merge_consecutive_details(s["details"]) for _, sessions in groups for s in sessions]
+
+    def _citations(self, groups, citations):
+        p = self.progress
+        index = p.index_citations(citations, self.spec.assignment_id)
+        return [
+            p.citations_for_session(index, members, s["details"][0].ts * 1000, s["details"][-1].ts * 1000)
+            for members, sessions in groups
+            for s in sessions
+        ]
+
+    def _citation_in_session(self, groups, citations):
+        """Each citation checked against the (at most two) sessions of its group nearest in time."""
+        to_epoch_ms = self.line_events.to_epoch_ms
+        by_user = {}
+        for members, sessions in groups:
+            starts = [to_epoch_ms(s["startTime"]) for s in sessions]
+            for user in members:
+                by_user[user] = (starts, sessions)
+        matched = 0
+        for c in citations:
+            entry = by_user.get((c.get("githubUsername") or "").strip().lower())
+            ts = to_epoch_ms(c.get("timestamp"))
+            if entry is None or ts is None:
+                continue
+            starts, sessions = entry
+            i = bisect.bisect_right(starts, ts)
+            for s in sessions[max(0, i - 1):i + 1]:
+                matched += citation_in_session(c.get("timestamp"), s["startTime"], s["endTime"])
+        return matched
+
+    def _get(self, query=""):
+        resp = self.client.get(f"/api/v1/assignments/{self.spec.assignment_id}/progress{query}", headers=self.headers)
+        body = resp.get_data()  # drains streamed responses too
+        if resp.status_code != 200:
+            raise RuntimeError(f"/progress{query} answered {resp.status_code}: {body[:200]!r}")
+        return len(body)
+
+    def run(self):
+        """{stage: {"seconds": s, "peakMiB": m}} for every stage, in STAGES order."""
+        results = {}
+
+        def record(stage, fn):
+            value, seconds, peak = _measure(fn, self.repeat, self.memory)
+            results[stage] = {"seconds": round(seconds, 4), "peakMiB": round(peak, 2) if peak is not None else None}
+            return value
+
+        seconds, peak = self._ingest_stage()
+        results["ingest"] = {"seconds": round(seconds, 4), "peakMiB": round(peak, 2) if peak is not None else None}
+        docs, citations = record("read", self._read)
+        # Inputs are bound as defaults so the del below releases them between stages.
+        records = record("records", lambda docs=docs: self.line_events.records(docs))
+        del docs
+        groups = record("sessions", lambda records=records: self._sessions(records))
+        record("merge_details", lambda groups=groups: self._merge_details(groups))
+        for stage, fn in (("citations", self._citations), ("citation_in_session", self._citation_in_session)):
+            record(stage, lambda fn=fn, groups=groups: fn(groups, citations))
+        self.sessions = sum(len(sessions) for _, sessions in groups)
+        del records, groups
+        record("progress", self._get)
+        record("progress_summary", lambda: self._get("?view=summary"))
+        record("progress_stream", lambda: self._get("?stream=1"))
+        return results
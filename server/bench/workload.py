@@ -0,0 +1,151 @@
+"""Synthetic /push and /citations payloads shaped like the VS Code extension's.
+
+Students work in groups that share a repo link. Each student alternates work sessions and
+breaks; during a session the extension flushes every FLUSH_SECONDS (20 s), sending the
+lines dirtied since the last flush as runs of consecutive lines (one payload per run, run
+form for more than one line). Occasionally a flush carries a paste burst: one long run,
+followed by the citation the extension asks for when 20 or more lines changed."""
+import heapq
+import random
+from datetime import datetime, timedelta, timezone
+
+# Extension flush interval (clearcode/extension.js setInterval).
+FLUSH_SECONDS = 20
+# Lines changed in one flush from which the extension asks for a citation.
+CITATION_MIN_LINES = 20
+
+BASE_TIME = datetime(2024, 9, 2, 8, 0, tzinfo=timezone.utc)
+FILES = ["main.py", "utils.py", "models.py", "test_main.py", "README.md"]
+CODE = [
+    "def {name}(items, limit=None):",
+    "    total = sum(item.price * item.qty for item in items)",
+    "    if limit is not None and total > limit:",
+    "        raise ValueError(f\"total {{total}} over limit\")",
+    "    return {name}_cache.get(key) or compute(key)",
+    "for i, row in enumerate(rows):",
+    "    result.append(transform(row, scale={n}))",
+    "# TODO: handle empty input",
+    "",
+    "class {Name}:",
+    "    def __init__(self, value):",
+    "        self.value = value",
+]
+NAMES = ["parse", "total", "score", "merge", "load", "render"]
+
+
+def _iso(dt):
+    """Like JavaScript's Date.toISOString()."""
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.") + f"{dt.microsecond // 1000:03d}Z"
+
+
+def _line(rng):
+    name = rng.choice(NAMES)
+    return rng.choice(CODE).format(name=name, Name=name.title(), n=rng.randint(1, 9))
+
+
+class WorkloadSpec:
+    """Knobs of the generated workload; defaults resemble one class assignment."""
+
+    def __init__(self, events, groups=8, students=3, paste_rate=0.03, active_rate=0.6,
+                 session_minutes=(5, 60), break_minutes=(15, 720), seed=0,
+                 assignment_id="bench", flush_seconds=FLUSH_SECONDS):
+        self.events = int(events)
+        self.groups = max(1, int(groups))
+        self.students = max(1, int(students))
+        self.paste_rate = float(paste_rate)
+        self.active_rate = float(active_rate)
+        self.session_minutes = session_minutes
+        self.break_minutes = break_minutes
+        self.seed = seed
+        self.assignment_id = assignment_id
+        self.flush_seconds = flush_seconds
+
+
+def _student_stream(spec, group, student, quota, rng):
+    """
+    (time, kind, payload) items of one student in time order, kind "event" or "citation",
+    until quota line events were produced.
+    """
+    username = f"student-{group:02d}-{student:02d}"
+    repo = f"https://github.com/bench-class/group-{group:02d}"
+    t = BASE_TIME + timedelta(minutes=rng.uniform(0, 120))
+    produced = 0
+    while produced < quota:
+        session_end = t + timedelta(minutes=rng.uniform(*spec.session_minutes))
+        cursor = {f: rng.randint(1, 200) for f in FILES}
+        while t < session_end and produced < quota:
+            t += timedelta(seconds=spec.flush_seconds, milliseconds=rng.randint(0, 999))
+            if rng.random() > spec.active_rate:
+                continue
+            stamp = _iso(t)
+            changed = 0
+            files = []
+            for path in rng.sample(FILES, rng.choice((1, 1, 1, 2))):
+                files.append(path)
+                if rng.random() < spec.paste_rate:
+                    start, count = rng.randint(1, 300), rng.randint(CITATION_MIN_LINES, 150)
+                    runs = [(start, count)]
+                else:
+                    # Typing: a few dirty lines around the cursor, sometimes adjacent.
+                    lines = sorted({max(1, cursor[path] + rng.randint(-3, 3)) for _ in range(rng.randint(1, 4))})
+                    cursor[path] = lines[-1]
+                    runs = []
+                    for ln in lines:
+                        if runs and runs[-1][0] + runs[-1][1] == ln:
+                            runs[-1] = (runs[-1][0], runs[-1][1] + 1)
+                        else:
+                            runs.append((ln, 1))
+                for start, count in runs:
+                    if produced >= quota:
+                        break
+                    payload = {
+                        "AssignmentID": spec.assignment_id,
+                        "GitHubName": username,
+                        "GitHubLink": repo,
+                        "FilePath": path,
+                        "LineNumber": start,
+                        "updatedAt": stamp,
+                    }
+                    if count == 1:
+                        payload["LineContent"] = _line(rng)
+                    else:
+                        payload["LineNumberEnd"] = start + count - 1
+                        payload["LineContents"] = [_line(rng) for _ in range(count)]
+                    changed += count
+                    produced += 1
+                    yield t, "event", payload
+            if changed >= CITATION_MIN_LINES:
+                yield t, "citation", {
+                    "AssignmentID": spec.assignment_id,
+                    "GitHubName": username,
+                    "changedLinesInWindow": changed,
+                    "windowSeconds": spec.flush_seconds,
+                    "filesTouched": files,
+                    "aiPrompt": rng.choice(["N/A", "write a function that totals the cart", "fix the failing test"]),
+                    "source": rng.choice(["N/A", "https://docs.python.org/3/", "lecture notes"]),
+                    "createdAt": stamp,
+                }
+        t = session_end + timedelta(minutes=rng.uniform(*spec.break_minutes))
+
+
+def generate(spec):
+    """
+    Yield (kind, payload) for the whole workload in time order (the order the server
+    receives them), exactly spec.events line events plus their citations. Deterministic
+    for a given spec.
+    """
+    rng = random.Random(spec.seed)
+    members = [(g, s) for g in range(spec.groups) for s in range(spec.students)]
+    # Uneven effort: some students write much more than others.
+    weights = [rng.uniform(0.3, 1.7) for _ in members]
+    scale = spec.events / sum(weights)
+    quotas = [int(w * scale) for w in weights]
+    for i in range(spec.events - sum(quotas)):
+        quotas[i % len(quotas)] += 1
+    streams = [
+        _student_stream(spec, g, s, quota, random.Random(rng.random()))
+        for (g, s), quota in zip(members, quotas)
+        if quota > 0
+    ]
+    for _, kind, payload in heapq.merge(*streams, key=lambda item: item[0]):
+        yield kind, payload
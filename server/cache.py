@@ -0,0 +1,110 @@
+"""Small in-process caches: bounded LRU with per-entry TTL and hit/miss counters.
+
+Caches are per process; with several workers each keeps its own copy, so the TTL bounds
+how long a worker can serve data another worker has already invalidated."""
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Thread-safe LRU cache; entries expire ttl seconds after they are set (per-entry ttl optional)."""
+
+    def __init__(self, maxsize=256, ttl=60.0):
+        self.maxsize = max(0, int(maxsize))
+        self.ttl = float(ttl)
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._generations = {}  # key -> number of invalidations, to detect writes during a rebuild
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0 and self.ttl > 0
+
+    def get(self, key, default=None):
+        """Return the cached value, or default if missing or expired."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._data[key]
+                self._misses += 1
+                return default
+            self._data.move_to_end(key)
+            self._hits += 1
+            return entry[1]
+
+    def generation(self, key):
+        """Token for set(..., generation=): changes whenever key is invalidated."""
+        with self._lock:
+            return self._generations.get(key, 0)
+
+    def set(self, key, value, ttl=None, generation=None):
+        """
+        Store value for ttl seconds (default: the cache's ttl); evicts least recently used.
+        With generation (from generation() taken before computing value), the value is
+        dropped if key was invalidated in the meantime, so a slow rebuild can't cache stale data.
+        """
+        if not self.enabled:
+            return
+        ttl = self.ttl if ttl is None else float(ttl)
+        if ttl <= 0:
+            return
+        with self._lock:
+            if generation is not None and self._generations.get(key, 0) != generation:
+                return
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, key):
+        """Drop one key (no-op if absent)."""
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+            if self._data.pop(key, None) is not None:
+                self._invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttlSeconds": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hitRate": round(self._hits / lookups, 4) if lookups else None,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+            }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def named_cache(name, maxsize=256, ttl=60.0):
+    """Return the process-wide cache registered under name, creating it on first use."""
+    with _caches_lock:
+        cache = _caches.get(name)
+        if cache is None:
+            cache = _caches[name] = TTLCache(maxsize=maxsize, ttl=ttl)
+        return cache
+
+
+def cache_stats():
+    """Stats for every registered cache, for the metrics endpoint."""
+    with _caches_lock:
+        caches = dict(_caches)
+    return {name: cache.stats() for name, cache in caches.items()}
@@ -0,0 +1,180 @@
+"""Background cascade deletion of an assignment's documents.
+
+DELETE /assignments/<id> only marks the assignment deleted and queues its id; a background
+worker (a WriteBehindQueue committing one id at a time) removes the documents that reference
+it in batched writes of up to 500 deletes, so the request returns right away however much
+data the assignment has.
+
+Ingestion only writes to live assignments (see assignment_statuses). Statuses are cached
+per process, so other workers may accept writes for a while after the deletion: the
+ingested collections are swept once more when every cached copy has expired. The worker
+does not wait for that: the job is re-queued for when the sweep is due (see cascade_delete)."""
+import logging
+import threading
+import time
+from datetime import datetime
+
+from server.cache import named_cache
+from server.line_events import iso_ms, to_epoch_ms
+
+log = logging.getLogger(__name__)
+
+# One doc per deleted assignment (same id): owner and progress of its cascade deletion.
+DELETIONS_COLLECTION = "assignmentDeletions"
+# Firestore rejects write batches with more than 500 operations.
+BATCH_LIMIT = 500
+# Ingestion writes only to live assignments. Statuses are cached per process this long, so
+# a deletion sweeps the ingested collections again once every worker's copy has expired.
+ASSIGNMENT_STATUS_TTL_SECONDS = 30
+INGEST_REJECTIONS = {"missing": ("Assignment not found", 404), "deleted": ("Assignment deleted", 410)}
+# The second sweep runs this long after the assignment was marked deleted: by then no worker
+# still has it cached as live, with margin for requests and write-behind flushes that
+# checked just before.
+INGEST_SETTLE_SECONDS = 2 * ASSIGNMENT_STATUS_TTL_SECONDS
+
+
+def status_cache():
+    """Per-process cache of assignment statuses for ingestion (see assignment_statuses)."""
+    return named_cache("assignmentStatus", maxsize=4096, ttl=ASSIGNMENT_STATUS_TTL_SECONDS)
+
+
+def assignment_statuses(db, collection, assignment_ids):
+    """
+    {assignment id: "live", "deleted" or "missing"} for ingestion, from the per-process
+    cache (ASSIGNMENT_STATUS_TTL_SECONDS) or one get_all on collection (the assignment
+    docs) for the ids it doesn't hold.
+    """
+    cache = status_cache()
+    statuses = {}
+    unknown = []
+    for assignment_id in set(assignment_ids):
+        status = cache.get(assignment_id)
+        if status is None:
+            unknown.append(assignment_id)
+        else:
+            statuses[assignment_id] = status
+    if unknown:
+        refs = [db.collection(collection).document(assignment_id) for assignment_id in unknown]
+        for snap in db.get_all(refs, field_paths=["deletedAt"]):
+            if not snap.exists:
+                status = "missing"
+            else:
+                status = "deleted" if (snap.to_dict() or {}).get("deletedAt") else "live"
+            cache.set(snap.id, status)
+            statuses[snap.id] = status
+    return statuses
+
+
+def ingest_rejection(status):
+    """(error message, HTTP status) for an assignment ingestion must not write to, else None."""
+    return INGEST_REJECTIONS.get(status)
+
+
+def delete_where(db, collection, field, value, batch_limit=BATCH_LIMIT, on_batch=None):
+    """
+    Delete every doc of collection whose field == value, batch_limit docs per read and
+    write batch (ids only are read). on_batch(n) is called after each committed batch.
+    Returns the number of docs deleted; safe to re-run after a failure.
+    """
+    query = db.collection(collection).where(field, "==", value).select([]).limit(batch_limit)
+    deleted = 0
+    while True:
+        refs = [snap.reference for snap in query.stream()]
+        if not refs:
+            return deleted
+        batch = db.batch()
+        for ref in refs:
+            batch.delete(ref)
+        batch.commit()
+        deleted += len(refs)
+        if on_batch is not None:
+            on_batch(len(refs))
+        if len(refs) < batch_limit:
+            return deleted
+
+
+def cascade_delete(db, assignment_ref, collections, resweep=()):
+    """
+    Run the deletion job of the assignment at assignment_ref (its DELETIONS_COLLECTION doc,
+    same id): delete the docs of every collection that reference it by assignmentId, in
+    order, then the assignment doc itself. The resweep collections are swept once more
+    INGEST_SETTLE_SECONDS after the deletion was requested, for writes accepted while other
+    workers still had the assignment cached as live. That sweep is not waited for: if it is
+    not due yet, the job is left "settling" with its resweepAt time, and running it again
+    from then on finishes it. Progress (docs deleted per collection) is recorded on the job
+    doc after each batch; re-running a failed or interrupted job continues where it stopped.
+    Returns ({collection: docs deleted}, seconds until the job must run again or None when done).
+    """
+    assignment_id = assignment_ref.id
+    job_ref = db.collection(DELETIONS_COLLECTION).document(assignment_id)
+    job = job_ref.get()
+    job_doc = (job.to_dict() or {}) if job.exists else {}
+    deleted = dict(job_doc.get("deleted") or {})
+    settled = job_doc.get("state") == "settling"
+    job_ref.set({"state": "running", "startedAt": datetime.utcnow().isoformat() + "Z", "error": None}, merge=True)
+
+    def sweep(collections):
+        for collection in collections:
+            def on_batch(n, collection=collection):
+                deleted[collection] = deleted.get(collection, 0) + n
+                job_ref.set({"deleted": dict(deleted)}, merge=True)
+
+            delete_where(db, collection, "assignmentId", assignment_id, BATCH_LIMIT, on_batch)
+
+    try:
+        if not settled:
+            # A settling job already swept everything once.
+            sweep(collections)
+        if resweep:
+            requested = to_epoch_ms(job_doc.get("requestedAt"))
+            due = requested / 1000 + INGEST_SETTLE_SECONDS if requested is not None else 0.0
+            wait = due - time.time()
+            if wait > 0:
+                job_ref.set({"state": "settling", "resweepAt": iso_ms(int(due * 1000))}, merge=True)
+                return deleted, wait
+            sweep(resweep)
+        assignment_ref.delete()
+    except Exception as e:
+        job_ref.set({"state": "failed", "error": str(e)}, merge=True)
+        raise
+    job_ref.set({"state": "done", "finishedAt": datetime.utcnow().isoformat() + "Z"}, merge=True)
+    return deleted, None
+
+
+_deletion_queue = None
+_deletion_queue_lock = threading.Lock()
+
+
+def get_deletion_queue(factory=None):
+    """
+    Return the process-wide cascade deletion queue. On first call with a factory, create it
+    with factory() and start it. Returns None if not created. It is not drained at exit:
+    jobs are recorded in Firestore, and unfinished ones are resumed with
+    `flask assignments resume-deletions`.
+    """
+    global _deletion_queue
+    if _deletion_queue is not None or factory is None:
+        return _deletion_queue
+    with _deletion_queue_lock:
+        if _deletion_queue is None:
+            q = factory()
+            q.start()
+            _deletion_queue = q
+    return _deletion_queue
+
+
+def requeue_deletion(assignment_id, delay):
+    """
+    Put assignment_id on the deletion queue again in delay seconds (from a timer thread, so
+    the worker runs other jobs meanwhile). If the queue is full then, or the process exits
+    first, the job stays "settling" for resume-deletions.
+    """
+    def put():
+        q = get_deletion_queue()
+        if q is None or not q.put(assignment_id):
+            log.warning("Deletion queue unavailable, assignment %s left settling", assignment_id)
+
+    timer = threading.Timer(delay, put)
+    timer.daemon = True
+    timer.start()
+    return timer
@@ -3,6 +3,7 @@ import os
 from pathlib import Path
 
 from dotenv import load_dotenv
+from flask import current_app, has_app_context
 
 # Load .env from server root (or project root if running from there)
 _env_path = Path(__file__).resolve().parent / ".env"
@@ -28,10 +29,72 @@ class Config:
 
     # GitHub API – optional token for higher rate limits (60/hr without, 5000/hr with)
     GITHUB_TOKEN = os.environ.get("GITHUB_TOKEN", "")
+    # GitHub responses are cached (LRU) and fresh for the TTLs; stale entries are revalidated
+    # with If-None-Match and served while GitHub is rate limited, for up to STALE_SECONDS.
+    GITHUB_CACHE_SIZE = int(os.environ.get("GITHUB_CACHE_SIZE", "1024"))
+    GITHUB_USER_CACHE_TTL_SECONDS = float(os.environ.get("GITHUB_USER_CACHE_TTL_SECONDS", "3600"))
+    GITHUB_SEARCH_CACHE_TTL_SECONDS = float(os.environ.get("GITHUB_SEARCH_CACHE_TTL_SECONDS", "300"))
+    GITHUB_CACHE_STALE_SECONDS = float(os.environ.get("GITHUB_CACHE_STALE_SECONDS", "86400"))
+    # Outbound GitHub calls share one keep-alive pool (size it to the request threads per
+    # process); calls wait up to MAX_WAIT for a used-up quota to reset, else fail fast with
+    # 429 instead of a GitHub 403. RESERVE keeps that many calls unspent.
+    GITHUB_POOL_SIZE = int(os.environ.get("GITHUB_POOL_SIZE", "10"))
+    GITHUB_RATE_LIMIT_RESERVE = int(os.environ.get("GITHUB_RATE_LIMIT_RESERVE", "0"))
+    GITHUB_RATE_LIMIT_MAX_WAIT_SECONDS = float(os.environ.get("GITHUB_RATE_LIMIT_MAX_WAIT_SECONDS", "2"))
+
+    # Storage backend – "firestore" (default) or "sqlite" (local file at SQLITE_PATH, for
+    # self-hosted / offline deployments; ID tokens are still verified with Firebase Admin).
+    STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "firestore").strip().lower()
+    SQLITE_PATH = os.environ.get("SQLITE_PATH", "")
 
     # Firebase Admin – for Firestore + verifying frontend ID tokens
     FIREBASE_PROJECT_ID = os.environ.get("FIREBASE_PROJECT_ID", "")
     GOOGLE_APPLICATION_CREDENTIALS = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS", "")
+    # Verified ID tokens are cached (LRU) until exp minus the skew; signing certs are re-fetched
+    # in the background every TOKEN_CERT_REFRESH_SECONDS (0 disables). With
+    # TOKEN_REVOCATION_CHECK_SECONDS > 0 tokens are also checked for revocation and a cached
+    # token is re-verified at least that often.
+    TOKEN_CACHE_SIZE = int(os.environ.get("TOKEN_CACHE_SIZE", "1024"))
+    TOKEN_CACHE_SKEW_SECONDS = float(os.environ.get("TOKEN_CACHE_SKEW_SECONDS", "30"))
+    TOKEN_REVOCATION_CHECK_SECONDS = float(os.environ.get("TOKEN_REVOCATION_CHECK_SECONDS", "0"))
+    TOKEN_CERT_REFRESH_SECONDS = float(os.environ.get("TOKEN_CERT_REFRESH_SECONDS", "3600"))
+
+    # Write-behind ingestion – /push and /push/batch enqueue and return 202; a background
+    # thread commits queued line events in Firestore batches. Full queue -> 429 + Retry-After.
+    # A failed commit is retried PUSH_QUEUE_MAX_RETRIES times (backoff 0.5 s, doubling) before
+    # its events are dropped (ingestQueue.dropped in /health/metrics).
+    PUSH_WRITE_BEHIND = os.environ.get("PUSH_WRITE_BEHIND", "0").lower() in ("1", "true", "yes")
+    PUSH_QUEUE_MAXSIZE = int(os.environ.get("PUSH_QUEUE_MAXSIZE", "20000"))
+    PUSH_QUEUE_BATCH_SIZE = int(os.environ.get("PUSH_QUEUE_BATCH_SIZE", "500"))
+    PUSH_QUEUE_FLUSH_SECONDS = float(os.environ.get("PUSH_QUEUE_FLUSH_SECONDS", "1.0"))
+    PUSH_QUEUE_RETRY_AFTER_SECONDS = int(os.environ.get("PUSH_QUEUE_RETRY_AFTER_SECONDS", "5"))
+    PUSH_QUEUE_MAX_RETRIES = int(os.environ.get("PUSH_QUEUE_MAX_RETRIES", "3"))
+
+    # Assignment deletion – DELETE returns 202 and a background thread deletes the assignment's
+    # invites, line events, citations and sessions. Jobs beyond this many stay queued in
+    # Firestore until `flask assignments resume-deletions`.
+    DELETE_QUEUE_MAXSIZE = int(os.environ.get("DELETE_QUEUE_MAXSIZE", "1000"))
+
+    # Materialized progress sessions – ingestion keeps progressSessions up to date and
+    # /progress reads them instead of re-sessionizing every event. Backfill first with
+    # `flask --app server.app assignments rebuild-sessions --all`.
+    PROGRESS_SESSION_STORE = os.environ.get("PROGRESS_SESSION_STORE", "0").lower() in ("1", "true", "yes")
+
+    # /progress result cache (per process, LRU + TTL). Writes for an assignment invalidate it;
+    # the TTL bounds staleness across workers. Size 0 disables it.
+    PROGRESS_CACHE_SIZE = int(os.environ.get("PROGRESS_CACHE_SIZE", "256"))
+    PROGRESS_CACHE_TTL_SECONDS = float(os.environ.get("PROGRESS_CACHE_TTL_SECONDS", "60"))
+
+    # Sessionization engine for live /progress: "python", "numpy" (needs NumPy installed) or
+    # "auto" (numpy for timelines of at least SESSION_NUMPY_MIN_EVENTS events). ?engine= overrides.
+    SESSION_ENGINE = os.environ.get("SESSION_ENGINE", "auto").strip().lower()
+    SESSION_NUMPY_MIN_EVENTS = int(os.environ.get("SESSION_NUMPY_MIN_EVENTS", "50000"))
+
+    # Live /progress builds each group's sessions independently; from this many events per
+    # assignment the groups fan out to a pool of PROGRESS_WORKERS processes (0 = CPU count).
+    # PROGRESS_PARALLEL_MIN_EVENTS=0 keeps everything in-process.
+    PROGRESS_PARALLEL_MIN_EVENTS = int(os.environ.get("PROGRESS_PARALLEL_MIN_EVENTS", "200000"))
+    PROGRESS_WORKERS = int(os.environ.get("PROGRESS_WORKERS", "0"))
 
 
 class DevelopmentConfig(Config):
@@ -58,3 +121,13 @@ def get_config(env: str | None = None) -> type[Config]:
     """Return config class for the given env (default from FLASK_ENV)."""
     name = (env or os.environ.get("FLASK_ENV") or "development").lower()
     return _config_by_name.get(name, DevelopmentConfig)
+
+
+def setting(name, default=None):
+    """
+    A config value for modules outside the request handlers: the current app's config (so
+    app.config overrides apply), or the env's Config class outside an app context.
+    """
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return getattr(get_config(), name, default)
@@ -1,12 +1,21 @@
 """Firebase Admin: init app, Firestore client, and verify ID tokens from frontend.
 Module is named fb_admin to avoid shadowing the firebase_admin package."""
 import base64
+import hashlib
 import json
+import logging
 import os
+import threading
+import time
 from pathlib import Path
 
+from server.cache import named_cache
+from server.config import setting
+
 _firebase_app = None
 _db = None
+_cert_refresher = None
+_cert_refresher_lock = threading.Lock()
 
 
 def _resolve_creds_path(creds_path: str) -> str | None:
@@ -86,15 +95,129 @@ def _decode_jwt_payload_unsafe(token: str) -> dict | None:
         return None
 
 
+def _token_cache():
+    """LRU of verified tokens: sha256(token) -> claims, each kept until the token's exp minus skew."""
+    # Firebase ID tokens live one hour; per-entry TTLs are shorter.
+    return named_cache("idTokens", maxsize=int(setting("TOKEN_CACHE_SIZE", 1024)), ttl=3600)
+
+
+def _cert_fetch_request(app):
+    """
+    (cert URL, session, timeout) of the cert fetches made by app's ID token verifier.
+    These are SDK internals (requirements.txt caps the version); raises RuntimeError naming
+    the installed version if they moved, rather than failing somewhere in a refresh.
+    """
+    import firebase_admin
+    try:
+        from firebase_admin import _token_gen, auth
+        request = auth._get_client(app)._token_verifier.request
+        return _token_gen.ID_TOKEN_CERT_URI, request.session, request.timeout_seconds
+    except (ImportError, AttributeError) as e:
+        raise RuntimeError(
+            f"firebase_admin {firebase_admin.__version__} has no cert fetch request for the cert refresher: {e}"
+        ) from e
+
+
+class _CertRefresher:
+    """
+    Background thread that re-fetches Google's token signing certs every interval seconds,
+    bypassing the HTTP cache of firebase_admin's verifier so the cached certs never expire
+    on a request path.
+    """
+
+    def __init__(self, app, interval):
+        self._app = app
+        self._interval = max(60.0, interval)
+        self._lock = threading.Lock()
+        self._stats = {"refreshes": 0, "failures": 0, "lastRefreshAt": None, "lastError": None, "unsupported": False}
+        self._thread = threading.Thread(target=self._run, name="token-cert-refresher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _refresh(self):
+        # firebase_admin has no public hook for this: reuse its verifier's cache-control session
+        # (a no-cache request replaces the cached response).
+        url, session, timeout = _cert_fetch_request(self._app)
+        resp = session.get(url, headers={"Cache-Control": "no-cache"}, timeout=timeout)
+        resp.raise_for_status()
+
+    def _run(self):
+        log = logging.getLogger(__name__)
+        while True:
+            try:
+                self._refresh()
+            except RuntimeError as e:
+                # The SDK changed under us: stop, and say so in the log and /health/metrics.
+                log.error("Token cert refresh disabled: %s", e)
+                with self._lock:
+                    self._stats["unsupported"] = True
+                    self._stats["lastError"] = str(e)
+                return
+            except Exception as e:
+                log.warning("Token cert refresh failed: %s", e)
+                with self._lock:
+                    self._stats["failures"] += 1
+                    self._stats["lastError"] = str(e)
+            else:
+                with self._lock:
+                    self._stats["refreshes"] += 1
+                    self._stats["lastRefreshAt"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+            time.sleep(self._interval)
+
+    def stats(self):
+        with self._lock:
+            return {"intervalSeconds": self._interval, "running": self._thread.is_alive(), **self._stats}
+
+
+def _start_cert_refresher(app):
+    """Start the cert refresher once per process (TOKEN_CERT_REFRESH_SECONDS, 0 disables)."""
+    global _cert_refresher
+    if _cert_refresher is not None:
+        return
+    interval = float(setting("TOKEN_CERT_REFRESH_SECONDS", 3600))
+    if interval <= 0:
+        return
+    with _cert_refresher_lock:
+        if _cert_refresher is None:
+            _cert_refresher = _CertRefresher(app, interval)
+            _cert_refresher.start()
+
+
+def cert_refresh_stats() -> dict:
+    """Cert refresher state, for the metrics endpoint (the token cache is under caches.idTokens)."""
+    return _cert_refresher.stats() if _cert_refresher is not None else {"running": False}
+
+
 def verify_id_token(token: str) -> dict | None:
-    """Verify a Firebase ID token. Returns decoded claims (with 'uid') or None."""
+    """
+    Verify a Firebase ID token. Returns decoded claims (with 'uid') or None.
+    Verified claims are cached until the token's exp minus TOKEN_CACHE_SKEW_SECONDS, so
+    repeat requests with the same token skip the signature check. With
+    TOKEN_REVOCATION_CHECK_SECONDS > 0, verification also checks revocation and the cached
+    claims are kept at most that long, which bounds how long a revoked token is still served.
+    """
     if not token or not token.strip():
         return None
     token = token.strip()
+    cache = _token_cache()
+    key = hashlib.sha256(token.encode()).hexdigest()
+    claims = cache.get(key)
+    if claims is not None:
+        return dict(claims)
     try:
-        if _init_firebase() is not None:
+        app = _init_firebase()
+        if app is not None:
             from firebase_admin import auth
-            return auth.verify_id_token(token)
+            revocation_check = float(setting("TOKEN_REVOCATION_CHECK_SECONDS", 0))
+            claims = auth.verify_id_token(token, check_revoked=revocation_check > 0)
+            _start_cert_refresher(app)
+            ttl = float(claims.get("exp") or 0) - time.time() - float(setting("TOKEN_CACHE_SKEW_SECONDS", 30))
+            if revocation_check > 0:
+                ttl = min(ttl, revocation_check)
+            if ttl > 0:
+                cache.set(key, dict(claims), ttl=ttl)
+            return claims
     except Exception as e:
         if os.environ.get("FLASK_DEBUG", "").lower() in ("1", "true", "yes"):
             import logging
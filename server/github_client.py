@@ -0,0 +1,185 @@
+"""Outbound GitHub API calls: one pooled keep-alive requests.Session per process, with
+rate-limit-aware scheduling.
+
+Connections to api.github.com are reused across requests (pool of GITHUB_POOL_SIZE, one per
+request thread of the process; extra callers wait for a free connection), so lookups skip
+the TCP and TLS handshakes. X-RateLimit-Remaining / -Reset of every response are tracked
+per rate-limit resource (core, search): when a resource's quota is used up (down to
+GITHUB_RATE_LIMIT_RESERVE), calls wait for the reset if it is at most
+GITHUB_RATE_LIMIT_MAX_WAIT_SECONDS away, else fail fast with RateLimitExceeded instead of
+spending a request on a 403. Quotas are tracked per process; GitHub's headers resync them.
+Settings are read from the app config (see config.setting)."""
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from server.config import setting
+
+API_URL = "https://api.github.com"
+
+_session = None
+_pool_size = None
+_session_lock = threading.Lock()
+_quotas = {}  # resource -> _Quota
+_quotas_lock = threading.Lock()
+_stats = {"requests": 0, "waited": 0, "waitedSeconds": 0.0, "throttled": 0, "rateLimited": 0}
+
+
+class RateLimitExceeded(Exception):
+    """The resource's quota is used up for longer than callers may wait; retry_after in seconds."""
+
+    def __init__(self, resource, retry_after):
+        super().__init__(f"GitHub {resource} rate limit exhausted, resets in {retry_after:.0f}s")
+        self.resource = resource
+        self.retry_after = retry_after
+
+
+class _Quota:
+    """Last known quota of one resource; remaining is decremented for calls in flight."""
+
+    def __init__(self):
+        self.limit = None
+        self.remaining = None
+        self.reset = 0.0  # epoch seconds
+        self.blocked_until = 0.0  # epoch seconds, from Retry-After (secondary rate limits)
+
+    def wait(self, now, reserve):
+        """Seconds until a call may be sent (0: now)."""
+        if self.blocked_until > now:
+            return self.blocked_until - now
+        if self.reset <= now:
+            self.remaining = None  # new window: unknown until the next response
+            return 0.0
+        if self.remaining is not None and self.remaining <= reserve:
+            return self.reset - now
+        return 0.0
+
+    def as_dict(self, now):
+        return {
+            "limit": self.limit,
+            "remaining": self.remaining,
+            "resetInSeconds": round(max(0.0, self.reset - now), 1) if self.reset else None,
+            "blockedForSeconds": round(self.blocked_until - now, 1) if self.blocked_until > now else 0,
+        }
+
+
+def _resource_for(url):
+    """Rate-limit resource a URL is counted against (GitHub also names it in each response)."""
+    return "search" if url.startswith(f"{API_URL}/search/") else "core"
+
+
+def get_session():
+    """The process-wide pooled session for api.github.com."""
+    global _session, _pool_size
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                pool_size = max(1, int(setting("GITHUB_POOL_SIZE", 10)))
+                session = requests.Session()
+                # One host: one pool, pool_size keep-alive connections; pool_block makes extra
+                # concurrent callers wait for a connection instead of opening throwaway ones.
+                session.mount(API_URL, HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True))
+                _pool_size = pool_size
+                _session = session
+    return _session
+
+
+def _acquire(resource):
+    """Wait until resource has quota (reserving one call), or raise RateLimitExceeded."""
+    reserve = setting("GITHUB_RATE_LIMIT_RESERVE", 0)
+    max_wait = setting("GITHUB_RATE_LIMIT_MAX_WAIT_SECONDS", 2)
+    while True:
+        with _quotas_lock:
+            quota = _quotas.setdefault(resource, _Quota())
+            wait = quota.wait(time.time(), reserve)
+            if wait <= 0:
+                if quota.remaining is not None:
+                    quota.remaining -= 1
+                _stats["requests"] += 1
+                return
+            if wait > max_wait:
+                _stats["throttled"] += 1
+                raise RateLimitExceeded(resource, wait)
+            _stats["waited"] += 1
+            _stats["waitedSeconds"] += wait
+        time.sleep(wait)
+
+
+def _record(response, resource):
+    """Update the resource's quota from a response's rate-limit headers."""
+    headers = response.headers
+    resource = headers.get("X-RateLimit-Resource") or resource
+    now = time.time()
+    with _quotas_lock:
+        quota = _quotas.setdefault(resource, _Quota())
+        try:
+            remaining = int(headers["X-RateLimit-Remaining"])
+            reset = float(headers["X-RateLimit-Reset"])
+        except (KeyError, ValueError):
+            remaining = None
+            reset = None
+        if remaining is not None:
+            # Responses of one window can arrive out of order: keep the lowest count.
+            if reset == quota.reset and quota.remaining is not None:
+                remaining = min(remaining, quota.remaining)
+            quota.remaining = remaining
+            quota.reset = reset
+            try:
+                quota.limit = int(headers.get("X-RateLimit-Limit"))
+            except (TypeError, ValueError):
+                pass
+        if response.status_code in (403, 429) and (remaining == 0 or "Retry-After" in headers):
+            _stats["rateLimited"] += 1
+            try:
+                quota.blocked_until = max(quota.blocked_until, now + float(headers["Retry-After"]))
+            except (KeyError, ValueError):
+                pass
+
+
+def get(url, params=None, headers=None, timeout=10):
+    """
+    GET an api.github.com URL through the pooled session once its rate-limit resource has
+    quota. Raises RateLimitExceeded (without calling GitHub) or requests.RequestException.
+    """
+    resource = _resource_for(url)
+    _acquire(resource)
+    try:
+        response = get_session().get(url, params=params, headers=headers, timeout=timeout)
+    except requests.RequestException:
+        with _quotas_lock:
+            quota = _quotas[resource]
+            if quota.remaining is not None:
+                quota.remaining += 1  # the reserved call was not counted by GitHub
+        raise
+    _record(response, resource)
+    return response
+
+
+def _pool_stats():
+    """Connections opened vs requests sent by the session's connection pools (urllib3 counters)."""
+    if _session is None:
+        return {"size": None, "connectionsOpened": 0, "requestsSent": 0, "reuseRate": None}
+    adapter = _session.get_adapter(API_URL)
+    pools = adapter.poolmanager.pools
+    opened = sent = 0
+    for key in pools.keys():
+        pool = pools[key]
+        opened += pool.num_connections
+        sent += pool.num_requests
+    return {
+        "size": _pool_size,
+        "connectionsOpened": opened,
+        "requestsSent": sent,
+        "reuseRate": round(1 - opened / sent, 4) if sent else None,
+    }
+
+
+def client_stats():
+    """Pool reuse, tracked quotas and scheduling counters, for the metrics endpoint."""
+    now = time.time()
+    with _quotas_lock:
+        quotas = {resource: quota.as_dict(now) for resource, quota in _quotas.items()}
+        stats = dict(_stats, waitedSeconds=round(_stats["waitedSeconds"], 3))
+    return {"pool": _pool_stats(), "rateLimit": quotas, **stats}
@@ -0,0 +1,205 @@
+"""Write-behind queue for extension ingestion.
+
+Requests enqueue documents and return immediately; one background thread drains the
+queue and hands coalesced chunks to a commit function (Firestore batched writes); items
+whose commit fails are retried with exponential backoff before they are dropped, unless
+the commit rejects them for good (see Rejected).
+The queue is bounded so a slow database turns into fast 429s instead of piled-up threads."""
+import atexit
+import logging
+import queue
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+
+class Rejected(str):
+    """
+    Commit result for an item that must never be written (e.g. its assignment was deleted):
+    it is not retried, and counted in stats()["rejected"] instead of failed / dropped.
+    """
+
+
+class WriteBehindQueue:
+    """
+    Bounded in-process queue with a single background flusher.
+    commit(items) is called with up to batch_size items, after batch_size items are queued
+    or flush_interval seconds have passed since the oldest queued item, whichever comes first.
+    commit must return a list with one error (None on success) per item. Failed items are
+    committed again up to max_retries times, waiting retry_backoff seconds (doubling) before
+    each retry; items still failing after that are dropped and counted in stats()["dropped"].
+    A Rejected error ends an item at once. put_many calls the queue cannot take are counted
+    in stats()["refused"].
+    """
+
+    def __init__(self, commit, maxsize=10000, batch_size=500, flush_interval=1.0, name="write-behind",
+                 max_retries=3, retry_backoff=0.5):
+        self._commit = commit
+        self._max_retries = max(0, int(max_retries))
+        self._retry_backoff = max(0.0, float(retry_backoff))
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._batch_size = max(1, int(batch_size))
+        self._flush_interval = max(0.0, float(flush_interval))
+        self._name = name
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {
+            "enqueued": 0,
+            "refused": 0,
+            "written": 0,
+            "rejected": 0,
+            "failed": 0,
+            "retried": 0,
+            "dropped": 0,
+            "flushes": 0,
+            "lastFlushSize": 0,
+            "lastFlushMs": None,
+            "maxFlushMs": None,
+            "totalFlushMs": 0.0,
+        }
+
+    @property
+    def maxsize(self):
+        return self._queue.maxsize
+
+    def start(self):
+        """Start the flusher thread (idempotent)."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+            self._thread.start()
+
+    def put_many(self, items):
+        """
+        Enqueue all items or none of them. Returns False when the queue cannot take them all,
+        so callers can answer 429 instead of blocking.
+        """
+        items = list(items)
+        with self._lock:
+            if self._queue.maxsize and self._queue.qsize() + len(items) > self._queue.maxsize:
+                self._stats["refused"] += len(items)
+                return False
+            for item in items:
+                self._queue.put_nowait(item)
+            self._stats["enqueued"] += len(items)
+        return True
+
+    def put(self, item):
+        """Enqueue one item; False if the queue is full."""
+        return self.put_many([item])
+
+    def _take_chunk(self, block):
+        """Collect up to batch_size items; waits at most flush_interval after the first one."""
+        try:
+            first = self._queue.get(timeout=0.5) if block else self._queue.get_nowait()
+        except queue.Empty:
+            return []
+        chunk = [first]
+        deadline = time.monotonic() + self._flush_interval
+        while len(chunk) < self._batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if block and remaining > 0:
+                    chunk.append(self._queue.get(timeout=remaining))
+                else:
+                    chunk.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return chunk
+
+    def _commit_chunk(self, chunk):
+        """Errors of one commit attempt, one per item (an exception fails every item)."""
+        try:
+            return self._commit(chunk)
+        except Exception as e:
+            log.exception("%s: commit of %d items failed", self._name, len(chunk))
+            return [str(e)] * len(chunk)
+
+    def _flush_chunk(self, chunk):
+        started = time.perf_counter()
+        pending = chunk
+        written = failed = retried = rejected = 0
+        for attempt in range(self._max_retries + 1):
+            if attempt:
+                time.sleep(self._retry_backoff * 2 ** (attempt - 1))
+                retried += len(pending)
+            errors = self._commit_chunk(pending)
+            rejected += sum(isinstance(err, Rejected) for err in errors)
+            pending = [item for item, err in zip(pending, errors) if err is not None and not isinstance(err, Rejected)]
+            written += sum(err is None for err in errors)
+            failed += len(pending)
+            if not pending:
+                break
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+        with self._lock:
+            s = self._stats
+            s["written"] += written
+            s["rejected"] += rejected
+            s["failed"] += failed
+            s["retried"] += retried
+            s["dropped"] += len(pending)
+            s["flushes"] += 1
+            s["lastFlushSize"] = len(chunk)
+            s["lastFlushMs"] = round(elapsed_ms, 2)
+            s["maxFlushMs"] = round(max(s["maxFlushMs"] or 0.0, elapsed_ms), 2)
+            s["totalFlushMs"] += elapsed_ms
+        if pending:
+            log.error("%s: dropped %d of %d items after %d retries", self._name, len(pending), len(chunk),
+                      self._max_retries)
+
+    def _run(self):
+        while not self._stop.is_set():
+            chunk = self._take_chunk(block=True)
+            if chunk:
+                self._flush_chunk(chunk)
+
+    def flush(self):
+        """Synchronously commit everything currently queued (used on shutdown)."""
+        while True:
+            chunk = self._take_chunk(block=False)
+            if not chunk:
+                return
+            self._flush_chunk(chunk)
+
+    def stop(self, timeout=5.0):
+        """Stop the flusher thread and drain what is left."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    def stats(self):
+        """Queue depth and flush latency for the metrics endpoint."""
+        with self._lock:
+            s = dict(self._stats)
+        total_ms = s.pop("totalFlushMs")
+        s["avgFlushMs"] = round(total_ms / s["flushes"], 2) if s["flushes"] else None
+        s["depth"] = self._queue.qsize()
+        s["maxsize"] = self._queue.maxsize
+        s["running"] = self._thread is not None and self._thread.is_alive()
+        return s
+
+
+_line_event_queue = None
+_line_event_queue_lock = threading.Lock()
+
+
+def get_line_event_queue(factory=None):
+    """
+    Return the process-wide line event queue. On first call with a factory, create it
+    with factory(), start it, and drain it at interpreter exit. Returns None if not created.
+    """
+    global _line_event_queue
+    if _line_event_queue is not None or factory is None:
+        return _line_event_queue
+    with _line_event_queue_lock:
+        if _line_event_queue is None:
+            q = factory()
+            q.start()
+            atexit.register(q.stop)
+            _line_event_queue = q
+    return _line_event_queue
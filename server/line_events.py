@@ -0,0 +1,280 @@
+"""lineEvents documents: ingestion writes and compact records for the /progress pipeline.
+
+Ingestion stores each event (or run of lines) under a deterministic doc id (see dedup_id), so
+re-sent events overwrite instead of appending, in write batches that also bump the
+assignment's sharded write counter (see write_count).
+
+Each lineEvents doc (or event stored in a progressSessions doc) is parsed once into a
+LineEvent: epoch-millisecond time, canonical user / file, int line number. Grouping,
+sessionization, detail merging and citation matching all work on these records; ISO
+strings are only produced when a response is serialized (iso_ms)."""
+import hashlib
+import logging
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from server import sessionize
+from server.storage import Increment
+
+log = logging.getLogger(__name__)
+
+LINE_EVENTS_COLLECTION = "lineEvents"
+# Write counters of an assignment's line events (docs "<assignmentId>-<shard>"), see write_count.
+VERSIONS_COLLECTION = "progressVersions"
+# Firestore rejects write batches with more than 500 operations.
+BATCH_LIMIT = 500
+# Shards of an assignment's write counter: each batch increments one at random, so a
+# deadline surge doesn't exceed Firestore's sustained write rate on a single document.
+WRITE_COUNT_SHARDS = 8
+# Re-sent content for the same line within one window overwrites the same lineEvents doc.
+# One minute matches the time bucket progress.merge_consecutive_details groups by.
+DEDUP_WINDOW_SECONDS = 60
+# lineEvents docs parsed per chunk while streaming: enough to vectorize timestamp parsing,
+# few enough to keep memory flat.
+STREAM_CHUNK = 2000
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def parse_iso(ts):
+    """Parse ISO timestamp string or Firestore datetime to datetime (timezone-aware if possible)."""
+    if ts is None:
+        return None
+    if hasattr(ts, "isoformat"):
+        return ts
+    s = (ts or "").strip()
+    if not s:
+        return None
+    try:
+        if s.endswith("Z"):
+            s = s[:-1] + "+00:00"
+        return datetime.fromisoformat(s)
+    except (ValueError, TypeError):
+        return None
+
+
+def to_iso(ts):
+    """Convert datetime or ISO string to ISO string for JSON."""
+    if ts is None:
+        return None
+    if hasattr(ts, "isoformat"):
+        return ts.isoformat().replace("+00:00", "Z")
+    if hasattr(ts, "timestamp"):
+        # Firestore Timestamp
+        return datetime.fromtimestamp(ts.timestamp(), tz=timezone.utc).isoformat().replace("+00:00", "Z")
+    return ts if isinstance(ts, str) else None
+
+
+def to_epoch_us(ts):
+    """Parse an ISO string, datetime or Firestore Timestamp to epoch microseconds (None if invalid)."""
+    if ts is not None and not hasattr(ts, "isoformat") and hasattr(ts, "timestamp"):
+        ts = datetime.fromtimestamp(ts.timestamp(), tz=timezone.utc)
+    if not isinstance(ts, (str, datetime)):
+        return None
+    dt = parse_iso(ts)
+    if dt is None:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return (dt - _EPOCH) // timedelta(microseconds=1)
+
+
+def to_epoch_ms(ts):
+    """Like to_epoch_us, in epoch milliseconds."""
+    us = to_epoch_us(ts)
+    return us // 1000 if us is not None else None
+
+
+def iso_ms(ts):
+    """Epoch ms -> 'YYYY-MM-DDTHH:MM:SS.mmmZ' (the format the extension sends)."""
+    if ts is None:
+        return None
+    seconds, ms = divmod(ts, 1000)
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(seconds)) + f".{ms:03d}Z"
+
+
+def dedup_id(event_doc, idempotency_key=None):
+    """
+    Deterministic lineEvents doc id so re-sent events overwrite instead of appending.
+    Uses the client's IdempotencyKey if given, else (assignment, user, file, line), plus the
+    time window of updatedAt in both cases: a reused key never overwrites an event of an
+    older window (and session). Returns None (auto id) when there is no key and updatedAt
+    cannot be parsed.
+    """
+    ts = parse_iso(event_doc.get("updatedAt"))
+    window = None
+    if ts is not None:
+        if ts.tzinfo is None:
+            ts = ts.replace(tzinfo=timezone.utc)
+        window = int(ts.timestamp()) // DEDUP_WINDOW_SECONDS
+    if idempotency_key:
+        raw = f"key\x1f{event_doc['assignmentId']}\x1f{idempotency_key}"
+        if window is not None:
+            raw += f"\x1f{window}"
+    elif window is None:
+        return None
+    else:
+        raw = "\x1f".join([
+            "line",
+            event_doc["assignmentId"],
+            event_doc["githubUsername"],
+            event_doc["filePath"],
+            f"{event_doc['lineNumber']}-{event_doc['lineNumberEnd']}" if "lineNumberEnd" in event_doc else str(event_doc["lineNumber"]),
+            str(window),
+        ])
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def commit(db, items):
+    """
+    Write (doc_id, event_doc) pairs to lineEvents in batches of BATCH_LIMIT (set, so an
+    existing doc id is overwritten); doc_id None means an auto-generated id. Each batch also
+    increments its assignments' write counters (see write_count).
+    Returns one (doc_id, error) per item, in input order; a failed batch marks all its items with the error.
+    """
+    # Coalesce repeated ids: only the last write per doc id is sent; earlier ones share its result.
+    last_index = {doc_id: i for i, (doc_id, _) in enumerate(items) if doc_id}
+    writes = [i for i, (doc_id, _) in enumerate(items) if not doc_id or last_index[doc_id] == i]
+    written = {}  # item index -> (doc_id, error)
+    collection = db.collection(LINE_EVENTS_COLLECTION)
+    versions = db.collection(VERSIONS_COLLECTION)
+    for chunk in _write_chunks(writes, items):
+        batch = db.batch()
+        refs = []
+        counts = {}
+        for i in chunk:
+            doc_id, event_doc = items[i]
+            doc_ref = collection.document(doc_id) if doc_id else collection.document()
+            batch.set(doc_ref, event_doc)
+            refs.append(doc_ref)
+            counts[event_doc["assignmentId"]] = counts.get(event_doc["assignmentId"], 0) + 1
+        for assignment_id, count in counts.items():
+            shard = random.randrange(WRITE_COUNT_SHARDS)
+            batch.set(
+                versions.document(f"{assignment_id}-{shard}"),
+                {"assignmentId": assignment_id, "writes": Increment(count)},
+                merge=True,
+            )
+        try:
+            batch.commit()
+            written.update((i, (ref.id, None)) for i, ref in zip(chunk, refs))
+        except Exception as e:
+            log.exception("lineEvents batch commit failed")
+            written.update((i, (None, str(e))) for i in chunk)
+    return [written[last_index[doc_id] if doc_id else i] for i, (doc_id, _) in enumerate(items)]
+
+
+def _write_chunks(writes, items):
+    """Split item indexes into batches that fit BATCH_LIMIT with one counter write per assignment."""
+    chunk = []
+    assignments = set()
+    for i in writes:
+        assignment_id = items[i][1]["assignmentId"]
+        if len(chunk) + len(assignments | {assignment_id}) > BATCH_LIMIT:
+            yield chunk
+            chunk = []
+            assignments = set()
+        chunk.append(i)
+        assignments.add(assignment_id)
+    if chunk:
+        yield chunk
+
+
+def write_count(db, assignment_id):
+    """Line event writes of an assignment so far: the sum of its counter shards (one get_all)."""
+    versions = db.collection(VERSIONS_COLLECTION)
+    refs = [versions.document(f"{assignment_id}-{shard}") for shard in range(WRITE_COUNT_SHARDS)]
+    return sum((snap.to_dict() or {}).get("writes") or 0 for snap in db.get_all(refs, field_paths=["writes"]) if snap.exists)
+
+
+class LineEvent:
+    """One line event (or run of lines). ts is epoch ms, None if updatedAt was unparseable."""
+
+    __slots__ = ("id", "ts", "user", "file", "line", "line_end", "content", "contents", "repo")
+
+    def __init__(self, id, ts, user, file, line, line_end, content, contents, repo):
+        self.id = id
+        self.ts = ts
+        self.user = user
+        self.file = file
+        self.line = line
+        self.line_end = line_end
+        self.content = content
+        self.contents = contents
+        self.repo = repo
+
+    @classmethod
+    def from_doc(cls, doc_id, doc, ts=None):
+        """
+        Record for a lineEvents doc; ts (epoch ms) is parsed by the caller, usually in bulk.
+        A run read without lineContents (summary projection) keeps its line range for loc.
+        """
+        try:
+            line = int(doc.get("lineNumber")) if doc.get("lineNumber") is not None else None
+        except (TypeError, ValueError):
+            line = None
+        contents = doc.get("lineContents")
+        line_end = doc.get("lineNumberEnd")
+        if line_end is None or not isinstance(contents, list):
+            contents = None
+            if "lineContents" in doc:
+                line_end = None
+        return cls(
+            doc_id,
+            ts,
+            str(doc.get("githubUsername") or "").strip().lower(),
+            str(doc.get("filePath") or "").strip() or None,
+            line,
+            line_end,
+            doc.get("lineContent") or None,
+            contents,
+            (doc.get("githubLink") or "").strip(),
+        )
+
+    @property
+    def loc(self):
+        """Lines covered: the run length for a run, else 1."""
+        if self.contents is not None:
+            return len(self.contents)
+        if self.line_end is not None and self.line is not None:
+            try:
+                return max(1, int(self.line_end) - self.line + 1)
+            except (TypeError, ValueError):
+                return 1
+        return 1
+
+    def lines(self):
+        """(line_number, content or None) for each line covered; empty without a valid line number."""
+        if self.line is None:
+            return []
+        if self.contents is None:
+            return [(self.line, self.content)]
+        return [(self.line + k, c or None) for k, c in enumerate(self.contents)]
+
+
+def records(docs):
+    """
+    Parse (doc_id, lineEvents doc) pairs once into LineEvent records. Timestamps are
+    parsed in bulk (vectorized when NumPy is available); the docs are not kept.
+    """
+    out = []
+    stamps = []
+    for doc_id, doc in docs:
+        out.append(LineEvent.from_doc(doc_id, doc))
+        stamps.append(doc.get("updatedAt"))
+    for record, us in zip(out, sessionize.epoch_us(stamps, to_epoch_us)):
+        record.ts = us // 1000 if us is not None else None
+    return out
+
+
+def iter_records(snaps, chunk_size=STREAM_CHUNK):
+    """Yield LineEvent records for streamed snapshots, parsing timestamps a chunk at a time."""
+    chunk = []
+    for snap in snaps:
+        chunk.append((snap.id, snap.to_dict()))
+        if len(chunk) >= chunk_size:
+            yield from records(chunk)
+            chunk = []
+    if chunk:
+        yield from records(chunk)
@@ -0,0 +1,1099 @@
+"""The /progress pipeline: an assignment's line events grouped into sessions per repo group,
+with merged details and the citations that fall in them attached.
+
+Sessions are built live from lineEvents (streamed in time order into per-group
+sessionizers, or in worker processes for large assignments) or read from the session
+store (session_store.py, with PROGRESS_SESSION_STORE). iter_parts yields them as they are
+built; built sections are cached per process and view, keyed to a cheap fingerprint of the
+assignment's inputs (see version). The assignments blueprint only parses requests and
+shapes responses around these."""
+import atexit
+import bisect
+import itertools
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+
+from server import line_events, sessionize
+from server.cache import named_cache
+from server.config import setting
+from server.line_events import LINE_EVENTS_COLLECTION, iso_ms, parse_iso, to_epoch_ms, to_epoch_us, to_iso
+from server.session_store import SUMMARY_FIELDS as SESSION_SUMMARY_FIELDS, SessionStore, group_hash, session_doc_id
+from server.storage import DESCENDING, count
+
+log = logging.getLogger(__name__)
+
+CITATIONS_COLLECTION = "citations"
+# Auto-close session if no new event for this many minutes (applies collectively to all members).
+SESSION_GAP_MINUTES = 10
+# Max session length in minutes; start a new session if adding this event would exceed it.
+SESSION_MAX_MINUTES = 15
+# Allow citations up to this long after session end to still count (clock skew / ordering).
+CITATION_SESSION_END_BUFFER_SECONDS = 120
+
+
+def _citation_epoch_us(citation_ts):
+    """Citation timestamp as epoch microseconds (naive times are UTC), None if unparseable."""
+    ts = citation_ts
+    if hasattr(ts, "timestamp"):
+        ts = datetime.fromtimestamp(ts.timestamp(), tz=timezone.utc)
+    elif isinstance(ts, str):
+        ts = parse_iso(ts)
+    else:
+        ts = None
+    if ts is None:
+        return None
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return to_epoch_us(ts)
+
+
+def index_citations(citations, assignment_id):
+    """
+    Parse every citation timestamp once and bucket citations per user, sorted by time.
+    Returns {user: (sorted_epoch_us, [(epoch_us, original_index, citation), ...])}.
+    """
+    by_user = {}
+    for i, c in enumerate(citations):
+        if c.get("assignmentId") != assignment_id:
+            continue
+        ts = _citation_epoch_us(c.get("timestamp"))
+        if ts is None:
+            continue
+        user = (c.get("githubUsername") or "").strip().lower()
+        by_user.setdefault(user, []).append((ts, i, c))
+    index = {}
+    for user, items in by_user.items():
+        items.sort(key=lambda x: (x[0], x[1]))
+        index[user] = ([x[0] for x in items], items)
+    return index
+
+
+def citations_for_session(citation_index, allowed_users, start_us, end_us):
+    """
+    Citations of allowed_users within [start, end + CITATION_SESSION_END_BUFFER_SECONDS]
+    (session bounds in epoch microseconds), found by binary search per user and returned in
+    their original (query) order. Same result as filtering every citation with
+    bench.suite.citation_in_session.
+    """
+    end_us += CITATION_SESSION_END_BUFFER_SECONDS * 1_000_000
+    matched = []
+    for user in allowed_users:
+        entry = citation_index.get(user)
+        if entry is None:
+            continue
+        times, items = entry
+        matched.extend(items[bisect.bisect_left(times, start_us):bisect.bisect_right(times, end_us)])
+    matched.sort(key=lambda x: x[1])
+    return [c for _, _, c in matched]
+
+
+# lineEvents fields a summary needs (no line content); see ?view=summary.
+LINE_EVENT_SUMMARY_FIELDS = ["githubUsername", "githubLink", "lineNumber", "lineNumberEnd", "updatedAt"]
+# citations fields a summary needs (counts only, no text).
+CITATION_SUMMARY_FIELDS = ["assignmentId", "githubUsername", "timestamp"]
+
+
+def _record_detail(r, line=None, content=None):
+    """Detail dict for one record, or for one line of a run record when line is given."""
+    if line is not None:
+        return {
+            "timestamp": iso_ms(r.ts),
+            "locChanged": 1,
+            "aiUsed": None,
+            "githubUsername": r.user or None,
+            "lineNumber": line,
+            "filePath": r.file,
+            "lineContent": content,
+        }
+    detail = {
+        "timestamp": iso_ms(r.ts),
+        "locChanged": r.loc,
+        "aiUsed": None,
+        "githubUsername": r.user or None,
+        "lineNumber": r.line,
+        "filePath": r.file,
+        "lineContent": r.content,
+    }
+    if r.contents is not None:
+        detail["lineNumberEnd"] = r.line_end
+        detail["lineContents"] = r.contents
+    return detail
+
+
+def merge_consecutive_details(records):
+    """
+    One pass: group by (user, file, minute), then within each group merge consecutive
+    line numbers into one entry per run (e.g. lines 3–49 at same time -> 3–49).
+    Handles duplicate events per line by keeping the first event seen for each line.
+    Run records (lineNumberEnd + lineContents) contribute each of their lines directly.
+    Returns detail dicts ordered by (timestamp, lineNumber).
+    """
+    if not records:
+        return []
+    groups = {}
+    for r in records:
+        groups.setdefault((r.user, r.file or "", r.ts // 60_000), []).append(r)
+
+    merged = []  # (sort key, detail)
+    for group in groups.values():
+        line_to = {}  # line_number -> (record, content) of the first event covering it
+        for r in group:
+            for ln, content in r.lines():
+                if ln not in line_to:
+                    line_to[ln] = (r, content)
+        if not line_to:
+            for r in group:
+                merged.append(((r.ts, r.line or 0), _record_detail(r)))
+            continue
+        sorted_lines = sorted(line_to)
+        # Consecutive runs: [3,4,5,...,49] -> (3, 49), etc.
+        runs = []
+        run_start = run_end = sorted_lines[0]
+        for ln in sorted_lines[1:]:
+            if ln == run_end + 1:
+                run_end = ln
+            else:
+                runs.append((run_start, run_end))
+                run_start = run_end = ln
+        runs.append((run_start, run_end))
+        # One merged detail per run
+        for run_start, run_end in runs:
+            first, content = line_to[run_start]
+            if run_start == run_end:
+                merged.append(((first.ts, run_start), _record_detail(first, run_start, content)))
+                continue
+            contents = [line_to[ln][1] if line_to[ln][1] is not None else "" for ln in range(run_start, run_end + 1)]
+            merged.append(((first.ts, run_start), {
+                "timestamp": iso_ms(first.ts),
+                "locChanged": run_end - run_start + 1,
+                "aiUsed": None,
+                "githubUsername": first.user or None,
+                "lineNumber": run_start,
+                "lineNumberEnd": run_end,
+                "filePath": first.file,
+                "lineContent": "\n".join(contents),
+            }))
+
+    merged.sort(key=lambda m: m[0])
+    return [detail for _, detail in merged]
+
+
+def _session_from_records(sid, records):
+    """Session dict for records in time order; details stay records until serialization."""
+    return {
+        "id": sid,
+        "startTime": iso_ms(records[0].ts),
+        "endTime": iso_ms(records[-1].ts),
+        "locChanged": sum(r.loc for r in records),
+        "aiUsed": None,
+        "githubUsernames": list({r.user for r in records if r.user}),
+        "eventCount": len(records),
+        "details": records,
+    }
+
+
+def events_to_sessions(records, session_id_prefix="", engine="python"):
+    """
+    Group LineEvent records into sessions collectively (all members in one timeline).
+    - Auto-close session if no new event for SESSION_GAP_MINUTES (10 min).
+    - Max session length SESSION_MAX_MINUTES (15 min); start new session if exceeded.
+    engine picks how boundaries are found (sessionize.ENGINES; same result).
+    Returns list of session dicts: id, startTime, endTime, locChanged, aiUsed, githubUsernames,
+    details (the session's records; _finish_session turns them into detail dicts).
+    Session ids are session_id_prefix + the start time in epoch ms, so a session keeps its
+    id when later events or other sessions change.
+    """
+    timeline = sorted((r for r in records if r.ts is not None), key=lambda r: r.ts)
+    if not timeline:
+        return []
+    starts = sessionize.session_starts(
+        [r.ts for r in timeline],
+        SESSION_GAP_MINUTES * 60_000,
+        SESSION_MAX_MINUTES * 60_000,
+        engine=engine,
+    )
+    return [
+        _session_from_records(f"{session_id_prefix}{timeline[start].ts}", timeline[start:end])
+        for start, end in zip(starts, starts[1:] + [len(timeline)])
+    ]
+
+
+def _session_engine(requested, n_events):
+    """
+    Sessionization engine for a timeline of n_events: an explicit "python" / "numpy", else
+    SESSION_ENGINE, where "auto" picks numpy from SESSION_NUMPY_MIN_EVENTS events on.
+    Falls back to python when NumPy is not installed.
+    """
+    engine = requested or setting("SESSION_ENGINE", "auto")
+    if engine == "auto":
+        threshold = setting("SESSION_NUMPY_MIN_EVENTS", 50000)
+        engine = "numpy" if n_events >= threshold else "python"
+    if engine == "numpy" and not sessionize.numpy_available():
+        return "python"
+    return engine
+
+
+# Sample groups for testing when real groups not available: repo URL -> list of GitHub usernames.
+SAMPLE_GROUPS = {
+    "https://github.com/IainMac32/testrepoHackathon": ["iainmac32"],
+    "https://github.com/kristiandiana/demo-repo": ["kristiandiana"],
+}
+
+
+def session_store_enabled():
+    return bool(setting("PROGRESS_SESSION_STORE"))
+
+
+def session_store(db):
+    """SessionStore applying the same gap / max-span rules as events_to_sessions."""
+    return SessionStore(
+        db,
+        gap_ms=SESSION_GAP_MINUTES * 60_000,
+        max_span_ms=SESSION_MAX_MINUTES * 60_000,
+        to_epoch_ms=to_epoch_ms,
+        window_ms=line_events.DEDUP_WINDOW_SECONDS * 1000,
+    )
+
+
+def apply_to_session_store(db, items, results):
+    """
+    Fold the (doc_id, event_doc) items that were written successfully (per results from
+    line_events.commit) into the materialized sessions. No-op unless PROGRESS_SESSION_STORE is on.
+    A failure is not raised (the events are stored): it is counted in /health/metrics and
+    flags the groups needsRebuild, so /progress reads their assignment live until
+    rebuild-sessions has caught up.
+    """
+    if not session_store_enabled():
+        return
+    written = [(doc_id, event_doc) for (_, event_doc), (doc_id, error) in zip(items, results) if error is None]
+    if not written:
+        return
+    store = session_store(db)
+    try:
+        store.apply(written)
+    except Exception as e:
+        log.exception("Session store update failed")
+        try:
+            store.mark_failed(written, e)
+        except Exception:
+            log.exception("Flagging session groups for rebuild failed")
+
+
+def _stored_session_records(db, docs, chunk_size=line_events.STREAM_CHUNK):
+    """
+    Yield (doc, records) for stored session docs, in order: the LineEvent records of the
+    doc's events, read from lineEvents by id (session docs hold ids and metadata only) with
+    get_all, about chunk_size ids at a time across consecutive docs. Events deleted since
+    are left out.
+    """
+    collection = db.collection(LINE_EVENTS_COLLECTION)
+
+    def read(pending):
+        refs = [collection.document(event_id) for _, ids in pending for event_id in ids]
+        found = {snap.id: snap.to_dict() for snap in db.get_all(refs) if snap.exists}
+        for doc, ids in pending:
+            yield doc, line_events.records((event_id, found[event_id]) for event_id in ids if event_id in found)
+
+    pending = []
+    n = 0
+    for doc in docs:
+        ids = SessionStore.event_ids(doc)
+        pending.append((doc, ids))
+        n += len(ids)
+        if n >= chunk_size:
+            yield from read(pending)
+            pending = []
+            n = 0
+    if pending:
+        yield from read(pending)
+
+
+def _finish_session(session, citation_index, allowed_users, summary=False):
+    """
+    Attach the citations that fall in a session and merge its detail records into
+    detail dicts (one per run of consecutive same-file same-user lines). In place.
+    With summary, only citationCount is set and the detail records are dropped.
+    """
+    records = session["details"]
+    if summary:
+        del session["details"]
+        session["citationCount"] = len(
+            citations_for_session(citation_index, allowed_users, records[0].ts * 1000, records[-1].ts * 1000)
+        )
+        return session
+    session["citations"] = [
+        {
+            "type": c.get("type", ""),
+            "githubUsername": c.get("githubUsername", ""),
+            "timestamp": to_iso(c.get("timestamp")) or "",
+            "text": c.get("text"),
+        }
+        for c in citations_for_session(citation_index, allowed_users, records[0].ts * 1000, records[-1].ts * 1000)
+    ]
+    session["details"] = merge_consecutive_details(records)
+    return session
+
+
+def _group_sessions(records, session_id_prefix, engine, citation_index, joined, min_end=None, summary=False):
+    """
+    All per-group work: sessionize one group's records, then attach citations (of the
+    members in joined, see _allowed_users) and merge details (see _finish_session).
+    Sessions ending before min_end (epoch ms) are dropped.
+    Module-level and self-contained so it can run in a worker process.
+    """
+    sessions = events_to_sessions(records, session_id_prefix=session_id_prefix, engine=engine)
+    return [
+        _finish_session(session, citation_index, _allowed_users(joined, session["details"][-1].ts), summary=summary)
+        for session in sessions
+        if min_end is None or session["details"][-1].ts >= min_end
+    ]
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers):
+    """Process-wide pool for large /progress builds, created on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the parent holds gRPC channels and threads that must not be forked
+            _pool = ProcessPoolExecutor(max_workers=workers or None, mp_context=multiprocessing.get_context("spawn"))
+            atexit.register(_pool.shutdown, wait=False, cancel_futures=True)
+        return _pool
+
+
+def _reset_pool(pool):
+    """Drop a broken pool so the next large build starts a fresh one."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _use_pool(n_groups, n_events):
+    """
+    Whether to build groups in worker processes: several groups (n_groups None: not known
+    yet) and at least PROGRESS_PARALLEL_MIN_EVENTS events.
+    """
+    threshold = setting("PROGRESS_PARALLEL_MIN_EVENTS", 0)
+    return (n_groups is None or n_groups > 1) and bool(threshold) and n_events >= threshold
+
+
+def _run_group_jobs(jobs):
+    """
+    Yield _group_sessions(*job) for every job, in job order; in worker processes when
+    _use_pool says so, results being yielded as soon as they are ready in order.
+    """
+    done = 0
+    if _use_pool(len(jobs), sum(len(job[0]) for job in jobs)):
+        pool = _get_pool(setting("PROGRESS_WORKERS", 0))
+        try:
+            for result in pool.map(_group_sessions, *zip(*jobs)):
+                jobs[done] = None
+                done += 1
+                yield result
+        except BrokenProcessPool:
+            log.exception("Progress worker pool failed; building sessions in-process")
+            _reset_pool(pool)
+    for i in range(done, len(jobs)):
+        job, jobs[i] = jobs[i], None  # release each group's records once its sessions are built
+        yield _group_sessions(*job)
+
+
+def _citation_index_for(citation_index, allowed_users):
+    """The part of a citation index a group needs (keeps what is sent to workers small)."""
+    return {u: citation_index[u] for u in allowed_users if u in citation_index}
+
+
+def _load_store_docs(store, assignment_id, window=None, summary=False):
+    """
+    The stored session docs /progress shows, ordered by start: all of them, or with a
+    window those overlapping it (pages: the sessions that start in [page, next page), and
+    window["next"] is set). With summary, read without their events.
+    """
+    fields = SESSION_SUMMARY_FIELDS if summary else None
+    if window is None:
+        return store.load(assignment_id, fields=fields)
+    docs = store.load(assignment_id, window["start"], window["end"], fields=fields)
+    if window["page"] is not None:
+        docs = [d for d in docs if (d.get("startAt") or 0) >= window["page"]]
+    if window["limit"] is not None:
+        seen = 0
+        for i, doc in enumerate(docs):
+            if seen >= window["limit"] and (doc.get("startAt") or 0) > (docs[i - 1].get("startAt") or 0):
+                window["next"] = doc.get("startAt")
+                docs = docs[:i]
+                break
+            seen += doc.get("eventCount") or len(doc.get("events") or [])
+    return docs
+
+
+def _iter_store_parts(db, assignment_id, docs, citation_index, window=None, summary=False):
+    """
+    Store path: build parts from the materialized progressSessions docs (see
+    _load_store_docs) instead of re-sessionizing every event. Yields parts like
+    _iter_line_event_parts, one group at a time; with a window, events from "to" on are
+    left out. With summary, sessions are taken from the docs as stored, except the ones a
+    summary can't be taken from as stored (crossing "to", or written before locChanged was
+    stored), whose events are read.
+    """
+    store = session_store(db)
+    end = window["end"] if window is not None else None
+
+    by_group = {}  # groupKey -> session docs, groups ordered by their first session
+    for doc in docs:
+        by_group.setdefault(doc.get("groupKey") or "", []).append(doc)
+
+    for i, (repo_url, docs) in enumerate(by_group.items()):
+        group_id = group_hash(assignment_id, repo_url)
+        group_label = repo_url or f"Group {i + 1}"
+        if repo_url and "/" in repo_url:
+            group_label = repo_url.rstrip("/").split("/")[-1]
+        members = sorted({u for doc in docs for u in doc.get("githubUsernames") or []})
+        allowed = {str(m).strip().lower() for m in members if m}
+
+        def as_stored(doc):
+            # Summary docs a summary can be taken from as stored (see the docstring).
+            return summary and "locChanged" in doc and (end is None or (doc.get("endAt") or 0) < end)
+
+        detailed = _stored_session_records(db, [
+            doc if "events" in doc else store.get(session_doc_id(assignment_id, repo_url, doc.get("startAt"))) or doc
+            for doc in docs if not as_stored(doc)
+        ])
+        started = False
+        for doc in docs:
+            sid = session_doc_id(assignment_id, repo_url, doc.get("startAt"))
+            if as_stored(doc):
+                start_ms, end_ms = doc.get("startAt") or 0, doc.get("endAt") or 0
+                session = {
+                    "id": sid,
+                    "startTime": iso_ms(start_ms),
+                    "endTime": iso_ms(end_ms),
+                    "locChanged": doc.get("locChanged"),
+                    "aiUsed": None,
+                    "githubUsernames": list(doc.get("githubUsernames") or []),
+                    "eventCount": doc.get("eventCount"),
+                    "citationCount": len(citations_for_session(citation_index, allowed, start_ms * 1000, end_ms * 1000)),
+                }
+            else:
+                _doc, records = next(detailed)
+                records = [r for r in records if r.ts is not None and (end is None or r.ts < end)]
+                if not records:
+                    continue
+                session = _session_from_records(sid, records)
+                session["githubUsernames"] = list(doc.get("githubUsernames") or [])
+                session = _finish_session(session, citation_index, allowed, summary=summary)
+            if not started:
+                started = True
+                yield ("section", i, {"id": group_id, "label": group_label, "repoLink": repo_url or None, "members": members})
+            yield ("session", group_id, session)
+
+
+def _iso_bound(ms):
+    """
+    Range-filter bound on ISO timestamp strings for epoch ms: 'YYYY-MM-DDTHH:MM:SS.mmm',
+    which sorts before every UTC string of that millisecond ('...mmmZ', '...mmm456Z').
+    """
+    return iso_ms(ms)[:-1]
+
+
+def _ordered_line_event_snaps(query, start_ms=None, end_ms=None):
+    """
+    Stream query ordered by updatedAt (needs the lineEvents (assignmentId, updatedAt ASC)
+    composite index), optionally only events in [start_ms, end_ms) by Firestore range
+    filters. If the ordered query fails before returning anything, e.g. because the index
+    is missing, log it and filter and sort an unordered stream in memory instead.
+    """
+    low = _iso_bound(start_ms) if start_ms is not None else None
+    high = _iso_bound(end_ms) if end_ms is not None else None
+    ranged = query
+    if low is not None:
+        ranged = ranged.where("updatedAt", ">=", low)
+    if high is not None:
+        ranged = ranged.where("updatedAt", "<", high)
+    try:
+        snaps = ranged.order_by("updatedAt").stream()
+        first = next(snaps, None)
+    except Exception:
+        log.exception("Ordered lineEvents query failed; sorting in memory")
+
+        def in_range(snap):
+            updated = snap.get("updatedAt") or ""
+            return (low is None or updated >= low) and (high is None or updated < high)
+
+        return iter(sorted((snap for snap in query.stream() if in_range(snap)), key=lambda snap: snap.get("updatedAt") or ""))
+    return itertools.chain([first], snaps) if first is not None else iter(())
+
+
+def _window_anchor(query, from_ms):
+    """
+    Where to start reading events for a window starting at from_ms: the first event after
+    the last quiet gap (more than SESSION_GAP_MINUTES without events) before from_ms, found
+    by walking back over earlier updatedAt values newest first. Sessions computed from
+    there have the same boundaries as over the whole timeline. Returns epoch ms, or None
+    to read from the first event (no gap before from_ms, or the query failed).
+    """
+    gap = SESSION_GAP_MINUTES * 60_000
+    prev = from_ms
+    try:
+        snaps = (
+            query.where("updatedAt", "<", _iso_bound(from_ms))
+            .order_by("updatedAt", direction=DESCENDING)
+            .select(["updatedAt"])
+            .stream()
+        )
+        for snap in snaps:
+            ts = to_epoch_ms(snap.get("updatedAt"))
+            if ts is None:
+                continue
+            if prev - ts > gap:
+                return prev
+            prev = ts
+    except Exception:
+        log.exception("Window anchor query failed; reading from the first event")
+    return None
+
+
+def _page_records(records, limit, window):
+    """
+    Records of a time-ordered stream up to the end of a page of at least limit events: the
+    first quiet gap (more than SESSION_GAP_MINUTES without events) after limit of them, which
+    no session can span. Sets window["next"] to the time of the event after the gap.
+    """
+    gap = SESSION_GAP_MINUTES * 60_000
+    seen = 0
+    last = None
+    for r in records:
+        if r.ts is not None:
+            if seen >= limit and last is not None and r.ts - last > gap:
+                window["next"] = r.ts
+                return
+            last = r.ts
+        seen += 1
+        yield r
+
+
+def _event_total(query, engine):
+    """
+    Number of events of query, by a count aggregation, when the engine or pool choice
+    depends on it (SESSION_ENGINE auto, PROGRESS_PARALLEL_MIN_EVENTS); else, or if the
+    query fails, 0.
+    """
+    if (engine or setting("SESSION_ENGINE", "auto")) != "auto" and not setting("PROGRESS_PARALLEL_MIN_EVENTS", 0):
+        return 0
+    try:
+        return count(query)
+    except Exception:
+        log.exception("lineEvents count failed; sizing the build as small")
+        return 0
+
+
+def _group_header(assignment_id, i, repo_url, members):
+    """Section header of a repo group (i: its position, for the label of a group without a link)."""
+    group_label = repo_url or f"Group {i + 1}"
+    if repo_url and "/" in repo_url:
+        group_label = repo_url.rstrip("/").split("/")[-1]  # e.g. testrepoHackathon
+    # Stable ids: section = hash of the repo link, session = section id + start time
+    return {"id": group_hash(assignment_id, repo_url), "label": group_label, "repoLink": repo_url, "members": members}
+
+
+class _RepoGroups:
+    """
+    The repo groups of a live build, as a time-ordered record stream reveals them: like the
+    session store's, an event belongs to the group of its own repo link (events without a
+    user or repo link to none). Groups are numbered in order of their first event, and
+    each keeps when its members pushed to it first.
+    """
+
+    def __init__(self, assignment_id):
+        self.assignment_id = assignment_id
+        self.repos = []  # group index -> repo link
+        self.joined = []  # group index -> {user: epoch ms of their first event in the group}
+        self._index = {}  # repo link -> group index
+
+    def route(self, r):
+        """Index of the group of record r (None if it has none), noting a new member."""
+        if not (r.user and r.repo):
+            return None
+        gi = self._index.get(r.repo)
+        if gi is None:
+            gi = self._index[r.repo] = len(self.repos)
+            self.repos.append(r.repo)
+            self.joined.append({})
+        self.joined[gi].setdefault(r.user, r.ts)
+        return gi
+
+    def members(self, gi):
+        return sorted(self.joined[gi])
+
+    def header(self, gi):
+        return _group_header(self.assignment_id, gi, self.repos[gi], self.members(gi))
+
+
+def _allowed_users(joined, end_ms):
+    """
+    Users whose citations a session ending at end_ms gets: the members (user -> epoch ms of
+    their first event in the group) who had joined by then, citation buffer included.
+    """
+    cutoff = end_ms + CITATION_SESSION_END_BUFFER_SECONDS * 1000
+    return {user for user, first in joined.items() if first <= cutoff}
+
+
+class _FallbackSections:
+    """
+    What /progress shows when no repo group has sessions: SAMPLE_GROUPS (members' events)
+    if no event has a repo link and their members have sessions, else one "progress" section
+    with every event. Fed the record stream only until some group is sure to have a
+    session; its closed sessions are held until then.
+    """
+
+    def __init__(self, engine, min_end=None):
+        self.users = {}  # user -> epoch ms of their first event
+        self.repo_link = None
+        self._started = False
+        self._min_end = min_end
+        self._samples = [(repo, sorted(members)) for repo, members in SAMPLE_GROUPS.items()]
+        # One sessionizer per sample group, then the "progress" one
+        self._splitters = [
+            sessionize.Sessionizer(SESSION_GAP_MINUTES * 60_000, SESSION_MAX_MINUTES * 60_000, engine=engine)
+            for _ in range(len(self._samples) + 1)
+        ]
+        self._sessions = [[] for _ in self._splitters]
+
+    def _hold(self, i, closed):
+        self._sessions[i].extend(s for s in closed if self._min_end is None or s[-1].ts >= self._min_end)
+
+    def push(self, r, grouped):
+        """Add the next record (with a time); grouped: whether some event had a repo group so far."""
+        if not self._started:
+            self._started = True
+            self.repo_link = r.repo or None
+        if r.user:
+            self.users.setdefault(r.user, r.ts)
+        self._hold(-1, self._splitters[-1].push(r.ts, r))
+        if grouped:
+            self._samples = None  # real groups exist: the sample groups are never shown
+        if self._samples is not None:
+            for i, (_repo, members) in enumerate(self._samples):
+                if r.user in members:
+                    self._hold(i, self._splitters[i].push(r.ts, r))
+
+    def parts(self, assignment_id, citation_index, summary=False):
+        """The fallback sections' parts (see iter_parts)."""
+        for i, splitter in enumerate(self._splitters):
+            self._hold(i, splitter.finish())
+        if self._samples is not None and any(self._sessions[:-1]):
+            for i, (repo_url, members) in enumerate(self._samples):
+                if not self._sessions[i]:
+                    continue
+                header = _group_header(assignment_id, i, repo_url, members)
+                yield ("section", i, header)
+                for session_records in self._sessions[i]:
+                    session = _session_from_records(f"{header['id']}-{session_records[0].ts}", session_records)
+                    session = _finish_session(session, citation_index, set(members), summary=summary)
+                    yield ("session", header["id"], session)
+            return
+        header = {"id": "progress", "label": "Progress", "repoLink": self.repo_link, "members": list(self.users)}
+        yield ("section", 0, header)
+        for session_records in self._sessions[-1]:
+            session = _session_from_records(f"progress-{session_records[0].ts}", session_records)
+            allowed = _allowed_users(self.users, session_records[-1].ts)
+            yield ("session", "progress", _finish_session(session, citation_index, allowed, summary=summary))
+
+
+def _iter_line_event_parts(db, assignment_id, citation_index, engine=None, window=None, summary=False):
+    """
+    Live path: one stream of the assignment's events ordered by updatedAt, each routed to
+    its repo group's sessionizer (see _RepoGroups). A session gets the citations of the
+    members who had pushed to the repo by its end (see _allowed_users), so a closed session
+    is held only until the stream passes its citation buffer; sessions are yielded then, so
+    memory holds open sessions rather than every event. Members are only complete at the
+    end of the stream: a section whose members grew after its header was yielded gets its
+    header again. Large assignments (see _use_pool) instead collect each group's events and
+    build groups in worker processes. If no group has sessions, see _FallbackSections.
+    engine: see _session_engine. With a window (see iter_parts) only the window's read
+    range (up to the page end) is read, and sessions ending before "from" are left out.
+    With summary, events are read without their line content (see _finish_session).
+    """
+    query = db.collection(LINE_EVENTS_COLLECTION).where("assignmentId", "==", assignment_id)
+    events = query.select(LINE_EVENT_SUMMARY_FIELDS) if summary else query
+    start = end = min_end = limit = None
+    if window is not None:
+        start, end, min_end, limit = window["start"], window["end"], window["from"], window.get("limit")
+    records = line_events.iter_records(_ordered_line_event_snaps(events, start, end))
+    if limit is not None:
+        records = _page_records(records, limit, window)
+    n_events = _event_total(query, engine)
+    group_engine = _session_engine(engine, n_events)
+    groups = _RepoGroups(assignment_id)
+    fallback = _FallbackSections(group_engine, min_end)
+
+    def routed():
+        nonlocal fallback
+        for r in records:
+            if r.ts is None:
+                continue
+            gi = groups.route(r)
+            if fallback is not None:
+                if gi is not None and (min_end is None or r.ts >= min_end):
+                    fallback = None  # this group will have a session
+                else:
+                    fallback.push(r, bool(groups.repos))
+            yield r, gi
+
+    yielded = {}  # group index -> members in its yielded header
+    if _use_pool(None, n_events):
+        group_records = []
+        for r, gi in routed():
+            if gi is None:
+                continue
+            if gi == len(group_records):
+                group_records.append([])
+            group_records[gi].append(r)
+        jobs = [
+            (recs, f"{group_hash(assignment_id, groups.repos[gi])}-", group_engine,
+             _citation_index_for(citation_index, groups.joined[gi]), groups.joined[gi], min_end, summary)
+            for gi, recs in enumerate(group_records)
+        ]
+        del group_records
+        for gi, sessions in enumerate(_run_group_jobs(jobs)):
+            for session in sessions:
+                if gi not in yielded:
+                    yielded[gi] = groups.members(gi)
+                    yield ("section", gi, groups.header(gi))
+                yield ("session", group_hash(assignment_id, groups.repos[gi]), session)
+    else:
+        gap, max_span = SESSION_GAP_MINUTES * 60_000, SESSION_MAX_MINUTES * 60_000
+        buffer_ms = CITATION_SESSION_END_BUFFER_SECONDS * 1000
+        splitters = []
+        held = []  # (epoch ms after which it is released, group index, session records)
+
+        def release(now=None):
+            # Sessions whose citation buffer the stream has passed (all of them at its end)
+            nonlocal held
+            ready = [h for h in held if now is None or h[0] < now]
+            held = [h for h in held if now is not None and h[0] >= now]
+            for _after, gi, session_records in ready:
+                if gi not in yielded:
+                    yielded[gi] = groups.members(gi)
+                    yield ("section", gi, groups.header(gi))
+                group_id = group_hash(assignment_id, groups.repos[gi])
+                session = _session_from_records(f"{group_id}-{session_records[0].ts}", session_records)
+                allowed = _allowed_users(groups.joined[gi], session_records[-1].ts)
+                yield ("session", group_id, _finish_session(session, citation_index, allowed, summary=summary))
+
+        def hold(gi, closed):
+            held.extend(
+                (s[-1].ts + buffer_ms, gi, s) for s in closed if min_end is None or s[-1].ts >= min_end
+            )
+
+        for r, gi in routed():
+            if held:
+                yield from release(r.ts)
+            if gi is None:
+                continue
+            if gi == len(splitters):
+                splitters.append(sessionize.Sessionizer(gap, max_span, engine=group_engine))
+            hold(gi, splitters[gi].push(r.ts, r))
+        for gi, splitter in enumerate(splitters):
+            hold(gi, splitter.finish())
+        yield from release()
+
+    if not yielded:
+        yield from fallback.parts(assignment_id, citation_index, summary=summary)
+        return
+    for gi, members in yielded.items():
+        if groups.members(gi) != members:
+            yield ("section", gi, groups.header(gi))
+
+
+def window_citations(query, window, fields=None):
+    """
+    Citation docs of query (projected to fields if given); with a window only those that
+    can fall in its sessions, by range filters on timestamp (all of them if that query
+    fails, e.g. missing index).
+    """
+    if fields:
+        query = query.select(fields)
+    if window is not None and (window["start"] is not None or window["end"] is not None):
+        ranged = query
+        if window["start"] is not None:
+            ranged = ranged.where("timestamp", ">=", _iso_bound(window["start"]))
+        if window["end"] is not None:
+            ranged = ranged.where("timestamp", "<", _iso_bound(window["end"] + CITATION_SESSION_END_BUFFER_SECONDS * 1000))
+        try:
+            return [doc.to_dict() for doc in ranged.stream()]
+        except Exception:
+            log.exception("Windowed citations query failed; reading all citations")
+    return [doc.to_dict() for doc in query.stream()]
+
+
+def iter_parts(db, assignment_id, engine=None, window=None, summary=False):
+    """
+    Full /progress pipeline: sessions (live or from the session store) with merged details
+    and the citations that fall in them attached, yielded as they are built. Parts are
+    ("section", order, header) before a section's first session, header being the section
+    without "sessions", then ("session", section_id, session); a live build repeats a
+    section's part at the end if its members grew meanwhile. Sessions of different sections
+    may interleave; order is the section's position in the assembled result.
+    window: a time window / page, {"from", "to", "limit", "page", "start", "end"} with times
+    in epoch ms (events in [from, to); end = to) and limit in events, as parsed from the
+    /progress query args; "start" is set here, and "next" when there is a next page.
+    summary: sessions without details / citations (see _finish_session), read without
+    line content or citation text.
+    """
+    # A group whose store update failed misses events: read the assignment live until rebuilt.
+    store = session_store(db) if session_store_enabled() else None
+    if store is not None and store.needs_rebuild(assignment_id):
+        store = None
+    if window is not None:
+        if window["page"] is not None:
+            window["start"] = window["page"]  # pages start at a session boundary
+        elif window["from"] is not None and store is None:
+            events = db.collection(LINE_EVENTS_COLLECTION).where("assignmentId", "==", assignment_id)
+            window["start"] = _window_anchor(events, window["from"])
+        else:
+            window["start"] = window["from"]
+    store_docs = None
+    if store is not None:
+        store_docs = _load_store_docs(store, assignment_id, window=window, summary=summary)
+        if window is not None and store_docs:
+            # Stored sessions overlapping the window can start before "from": their
+            # citations are read from the earliest start, like the live path's gap anchor.
+            first = min(doc.get("startAt") or 0 for doc in store_docs)
+            if window["start"] is None or first < window["start"]:
+                window["start"] = first
+
+    # Citations first: each group attaches its own while building its sessions
+    try:
+        all_citations = window_citations(
+            db.collection(CITATIONS_COLLECTION).where("assignmentId", "==", assignment_id),
+            window,
+            fields=CITATION_SUMMARY_FIELDS if summary else None,
+        )
+    except Exception:
+        all_citations = []
+    citation_index = index_citations(all_citations, assignment_id)
+
+    if store is not None:
+        return _iter_store_parts(db, assignment_id, store_docs, citation_index, window=window, summary=summary)
+    return _iter_line_event_parts(db, assignment_id, citation_index, engine=engine, window=window, summary=summary)
+
+
+def sections_from_parts(parts):
+    """
+    Assemble parts into the /progress sections list, sections in order. A repeated section
+    part updates the header and keeps the sessions yielded so far.
+    """
+    sections = {}  # section id -> (order, section)
+    for part in parts:
+        if part[0] == "section":
+            _kind, order, header = part
+            sessions = sections[header["id"]][1]["sessions"] if header["id"] in sections else []
+            sections[header["id"]] = (order, {**header, "sessions": sessions})
+        else:
+            _kind, section_id, session = part
+            sections[section_id][1]["sessions"].append(session)
+    return [section for _order, section in sorted(sections.values(), key=lambda item: item[0])]
+
+
+def parts_from_sections(sections):
+    """Parts for an already built sections list (e.g. a cached one)."""
+    for order, section in enumerate(sections):
+        yield ("section", order, {k: v for k, v in section.items() if k != "sessions"})
+        for session in section.get("sessions", []):
+            yield ("session", section["id"], session)
+
+
+def build_sections(db, assignment_id, engine=None, window=None, summary=False):
+    """The /progress sections list (see iter_parts)."""
+    return sections_from_parts(iter_parts(db, assignment_id, engine=engine, window=window, summary=summary))
+
+
+def summary_sections(sections):
+    """Summary view of full sections: what a summary build returns, without reading anything."""
+    return [
+        {
+            **section,
+            "sessions": [
+                {
+                    **{k: v for k, v in session.items() if k not in ("details", "citations")},
+                    "citationCount": len(session.get("citations") or []),
+                }
+                for session in section.get("sessions", [])
+            ],
+        }
+        for section in sections
+    ]
+
+
+# /progress views: full sessions, or summaries without details / citations (?view=summary).
+VIEWS = ("full", "summary")
+
+
+def progress_cache():
+    """Per-process cache of built /progress sections, keyed by assignment id and view."""
+    return named_cache(
+        "progress",
+        maxsize=setting("PROGRESS_CACHE_SIZE", 256),
+        ttl=setting("PROGRESS_CACHE_TTL_SECONDS", 60),
+    )
+
+
+def cache_key(assignment_id, view="full"):
+    return str(assignment_id) if view == "full" else f"{assignment_id}\x1f{view}"
+
+
+def invalidate(assignment_ids):
+    """Drop cached /progress results (every view) after writes to these assignments."""
+    cache = progress_cache()
+    for assignment_id in set(assignment_ids):
+        for view in VIEWS:
+            cache.invalidate(cache_key(assignment_id, view))
+
+
+def _newest(query, field):
+    """Value of field on the newest doc of query ordered by field, or None."""
+    docs = list(query.order_by(field, direction=DESCENDING).limit(1).stream())
+    return docs[0].to_dict().get(field) if docs else None
+
+
+def version(db, assignment_id):
+    """
+    Fingerprint of an assignment's progress inputs without reading them: newest lineEvent
+    updatedAt and citation timestamp, doc counts (so late inserts change it too) and the
+    line event write counter (so overwrites of older docs by dedup change it too).
+    Returns (fingerprint, cursor_ms), cursor_ms being the newest activity time, or None
+    if the queries fail (e.g. missing composite index); callers then skip ETag / cursor.
+    """
+    try:
+        events = db.collection(LINE_EVENTS_COLLECTION).where("assignmentId", "==", assignment_id)
+        citations = db.collection(CITATIONS_COLLECTION).where("assignmentId", "==", assignment_id)
+        newest_event = _newest(events, "updatedAt")
+        newest_citation = _newest(citations, "timestamp")
+        counts = (count(events), count(citations))
+        writes = line_events.write_count(db, assignment_id)
+    except Exception:
+        log.exception("Progress version query failed for %s", assignment_id)
+        return None
+    cursor_ms = max(to_epoch_ms(newest_event) or 0, to_epoch_ms(newest_citation) or 0)
+    fingerprint = f"{to_iso(newest_event)}|{to_iso(newest_citation)}|{counts[0]}|{counts[1]}|{writes}"
+    return fingerprint, cursor_ms
+
+
+def session_changed_since(session, since_ms):
+    """
+    Whether the session has activity (last event or an attached citation) after since_ms.
+    Activity times are client clock times, so an event that arrives late with an older
+    timestamp is only seen on a full reload.
+    """
+    times = [to_epoch_ms(session.get("endTime"))]
+    times.extend(to_epoch_ms(c.get("timestamp")) for c in session.get("citations") or [])
+    return max((t for t in times if t is not None), default=0) > since_ms
+
+
+def _section_changed_since(section, since_ms):
+    """The section with only its sessions changed since since_ms, or None if there are none."""
+    sessions = [s for s in section.get("sessions", []) if session_changed_since(s, since_ms)]
+    return {**section, "sessions": sessions} if sessions else None
+
+
+def sections_changed_since(sections, since_ms):
+    """Sections filtered by _section_changed_since; sections left without sessions are dropped."""
+    changed = (_section_changed_since(section, since_ms) for section in sections)
+    return [section for section in changed if section is not None]
+
+
+def find_session(sections, session_id):
+    """(section, session) with that session id, or None."""
+    for section in sections:
+        for session in section.get("sessions", []):
+            if session.get("id") == session_id:
+                return section, session
+    return None
+
+
+def split_session_id(session_id):
+    """(section id, start epoch ms) of a /progress session id, or None if it is not one."""
+    section_id, sep, start = session_id.rpartition("-")
+    if not sep or not section_id or not start.isdigit():
+        return None
+    return section_id, int(start)
+
+
+def session_details(db, assignment_id, section_id, start_ms, members=None):
+    """
+    Merged details and citations of the session of section_id starting at start_ms,
+    reading only that session: its stored doc, or the section's events from start_ms until
+    the session closes. members: the section's members if known (e.g. from a cached build),
+    whose citations the session gets; otherwise those who pushed to it in the session or
+    within its citation buffer. Returns (details, citations), or None if there is no such
+    session (any more).
+    """
+    if session_store_enabled():
+        store = session_store(db)
+        doc = store.get(f"{section_id}-{start_ms}")
+        if doc is None:
+            return None
+        if members is None:
+            members = store.members(assignment_id, doc.get("groupKey") or "")
+        allowed = {str(m).strip().lower() for m in members if m}
+        _doc, records = next(_stored_session_records(db, [doc]))
+        records = [r for r in records if r.ts is not None]
+    else:
+        query = db.collection(LINE_EVENTS_COLLECTION).where("assignmentId", "==", assignment_id)
+        groups = _RepoGroups(assignment_id)
+        samples = {group_hash(assignment_id, repo): set(m) for repo, m in SAMPLE_GROUPS.items()}
+
+        def in_section(r, gi):
+            if section_id == "progress":  # the single fallback section takes every event
+                return True
+            if section_id in samples:
+                return r.user in samples[section_id]
+            return gi is not None and group_hash(assignment_id, groups.repos[gi]) == section_id
+
+        # A group's sessions partition its timeline: replay it from the session's start until
+        # the session closes, and on through its citation buffer to learn members.
+        splitter = sessionize.Sessionizer(SESSION_GAP_MINUTES * 60_000, SESSION_MAX_MINUTES * 60_000)
+        records = None
+        seen = {}  # user -> epoch ms of their first event in the section
+        buffer_ms = CITATION_SESSION_END_BUFFER_SECONDS * 1000
+        for r in line_events.iter_records(_ordered_line_event_snaps(query, start_ms)):
+            if r.ts is None:
+                continue
+            if records is not None and (members is not None or r.ts > records[-1].ts + buffer_ms):
+                break
+            gi = groups.route(r)
+            if not in_section(r, gi):
+                continue
+            if r.user:
+                seen.setdefault(r.user, r.ts)
+            if records is None:
+                closed = splitter.push(r.ts, r)
+                if closed:
+                    records = closed[0]
+        if records is None:
+            records = next(iter(splitter.finish()), [])
+        if members is not None:
+            allowed = {str(m).strip().lower() for m in members if m}
+        elif section_id in samples:
+            allowed = samples[section_id]
+        else:
+            allowed = _allowed_users(seen, records[-1].ts) if records else set()
+    if not records or records[0].ts != start_ms:
+        return None
+    end_ms = records[-1].ts
+    citations = window_citations(
+        db.collection(CITATIONS_COLLECTION).where("assignmentId", "==", assignment_id),
+        {"start": start_ms, "end": end_ms + 1},
+    )
+    session = _session_from_records(f"{section_id}-{start_ms}", records)
+    finished = _finish_session(session, index_citations(citations, assignment_id), allowed)
+    return finished["details"], finished["citations"]
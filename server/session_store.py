@@ -0,0 +1,351 @@
+"""Materialized progress sessions, maintained as line events arrive.
+
+Sessions are kept per (assignment, repo) group in the progressSessions collection, one
+document per session listing its events' ids and metadata (times, users, lines; not the
+line contents, which stay in lineEvents and are read by id for the details), so a
+session doc stays far below Firestore's 1 MiB document limit. Applying new events only loads the
+sessions that can be affected (the one the events fall into and any after it), re-runs
+the gap / max-span rules over them and rewrites the documents that changed, so a late or
+out-of-order event reopens only its own part of the timeline.
+
+Each update of a group runs in a storage transaction that also reads and writes the group's
+progressSessionGroups doc, so concurrent updates of one group (from any worker or instance)
+conflict and are retried (Firestore) or run one after the other (SQLite) instead of
+overwriting each other's events. A group whose update failed is flagged needsRebuild on
+that doc (see mark_failed), so readers can tell its sessions are incomplete until
+rebuild() has run.
+
+Events are grouped by their own repo link (githubLink), as on the live /progress path."""
+import hashlib
+import threading
+import time
+from collections import defaultdict
+
+from server.storage import run_transaction
+
+SESSIONS_COLLECTION = "progressSessions"
+# One doc per group (id: group_hash): the document every update of the group reads and writes.
+GROUPS_COLLECTION = "progressSessionGroups"
+# Firestore rejects write batches with more than 500 operations.
+_BATCH_LIMIT = 500
+# Fields copied from a lineEvents doc into the session doc, besides its id and loc.
+_EVENT_FIELDS = ("updatedAt", "githubUsername", "filePath", "lineNumber", "lineNumberEnd")
+# Session doc fields enough for a summary (no events); see load(fields=...).
+SUMMARY_FIELDS = ("assignmentId", "groupKey", "startAt", "endAt", "githubUsernames", "eventCount", "locChanged")
+
+
+def group_key(event):
+    """Group key for an event: its repo link ("" if missing)."""
+    return (event.get("githubLink") or "").strip()
+
+
+_stats = {"applied": 0, "failed": 0, "lastError": None}
+_stats_lock = threading.Lock()
+
+
+def _loc(stored):
+    """Lines covered by a stored event (same as LineEvent.loc)."""
+    if "loc" in stored:
+        return stored["loc"]
+    contents = stored.get("lineContents")
+    if stored.get("lineNumberEnd") is not None and isinstance(contents, list):
+        return len(contents)
+    return 1
+
+
+def group_hash(assignment_id, key):
+    """Stable id of an assignment's group (key: repo link). /progress uses it as the section id."""
+    return hashlib.sha1(f"{assignment_id}\x1f{key}".encode("utf-8")).hexdigest()[:16]
+
+
+def session_doc_id(assignment_id, key, start_ms):
+    """Session doc id: stable for a given group and first-event time (also the /progress session id)."""
+    return f"{group_hash(assignment_id, key)}-{start_ms}"
+
+
+class SessionStore:
+    """
+    Incremental sessionizer over Firestore. to_epoch_ms(updatedAt) parses an event time
+    (None if unparseable). gap_ms / max_span_ms are the SESSION_GAP / SESSION_MAX rules.
+    """
+
+    def __init__(self, db, gap_ms, max_span_ms, to_epoch_ms, window_ms=60_000):
+        self._db = db
+        self._gap_ms = gap_ms
+        self._max_span_ms = max_span_ms
+        self._to_epoch_ms = to_epoch_ms
+        # Deduplicated events (with or without an IdempotencyKey) overwrite a doc from the same
+        # window, so an overwritten version is never older than the start of the new one's window.
+        self._window_ms = window_ms
+
+    # ---- sessionization -------------------------------------------------
+
+    def _entry(self, doc_id, event):
+        """Compact, sortable record for one event: (sort_key, doc_id, ts_ms, stored_fields)."""
+        ts = self._to_epoch_ms(event.get("updatedAt"))
+        if ts is None:
+            return None
+        stored = {k: event[k] for k in _EVENT_FIELDS if event.get(k) is not None}
+        stored["id"] = doc_id
+        stored["loc"] = _loc(event)
+        # Same order as the live path: updatedAt string, ties in doc id order.
+        return ((event.get("updatedAt") or "", doc_id or ""), doc_id, ts, stored)
+
+    def _sessionize(self, entries):
+        """Greedy gap / max-span split of sorted entries into lists of entries."""
+        sessions = []
+        current = []
+        for entry in entries:
+            ts = entry[2]
+            if current and (ts - current[-1][2] > self._gap_ms or ts - current[0][2] > self._max_span_ms):
+                sessions.append(current)
+                current = []
+            current.append(entry)
+        if current:
+            sessions.append(current)
+        return sessions
+
+    def _session_doc(self, assignment_id, key, entries, now_ms):
+        users = sorted({(e[3].get("githubUsername") or "").strip().lower() for e in entries} - {""})
+        return {
+            "assignmentId": assignment_id,
+            "groupKey": key,
+            "repoLink": key or None,
+            "startAt": entries[0][2],
+            "endAt": entries[-1][2],
+            "githubUsernames": users,
+            "eventCount": len(entries),
+            "locChanged": sum(_loc(e[3]) for e in entries),
+            "events": [e[3] for e in entries],
+            "changedAt": now_ms,
+        }
+
+    # ---- persistence ----------------------------------------------------
+
+    def _commit(self, sets, deletes):
+        collection = self._db.collection(SESSIONS_COLLECTION)
+        ops = [("set", doc_id, doc) for doc_id, doc in sets] + [("delete", doc_id, None) for doc_id in deletes]
+        for start in range(0, len(ops), _BATCH_LIMIT):
+            batch = self._db.batch()
+            for op, doc_id, doc in ops[start:start + _BATCH_LIMIT]:
+                ref = collection.document(doc_id)
+                if op == "set":
+                    batch.set(ref, doc)
+                else:
+                    batch.delete(ref)
+            batch.commit()
+
+    def _plan(self, assignment_id, key, old_docs, entries):
+        """Re-sessionize entries: (session docs to set, doc ids to delete), only what changed."""
+        now_ms = int(time.time() * 1000)
+        entries.sort(key=lambda e: e[0])
+        sets = []
+        keep = set()
+        for session in self._sessionize(entries):
+            doc_id = session_doc_id(assignment_id, key, session[0][2])
+            doc = self._session_doc(assignment_id, key, session, now_ms)
+            keep.add(doc_id)
+            old = old_docs.get(doc_id)
+            if old is not None and old.get("events") == doc["events"] and "locChanged" in old:
+                continue
+            sets.append((doc_id, doc))
+        deletes = [doc_id for doc_id in old_docs if doc_id not in keep]
+        return sets, deletes
+
+    def _group_ref(self, assignment_id, key):
+        return self._db.collection(GROUPS_COLLECTION).document(group_hash(assignment_id, key))
+
+    def _group_doc(self, assignment_id, key):
+        return {"assignmentId": assignment_id, "groupKey": key, "changedAt": int(time.time() * 1000)}
+
+    def _write(self, transaction, assignment_id, key, sets, deletes, **group_fields):
+        """Queue the session writes and the group doc update on a transaction."""
+        collection = self._db.collection(SESSIONS_COLLECTION)
+        for doc_id, doc in sets:
+            transaction.set(collection.document(doc_id), doc)
+        for doc_id in deletes:
+            transaction.delete(collection.document(doc_id))
+        group_doc = dict(self._group_doc(assignment_id, key), **group_fields)
+        transaction.set(self._group_ref(assignment_id, key), group_doc, merge=True)
+
+    # ---- public API -----------------------------------------------------
+
+    def apply(self, items):
+        """
+        Fold newly written (doc_id, event_doc) pairs into the stored sessions.
+        Returns the number of session docs written. Raises if a group's update fails
+        (groups before it are applied); see mark_failed.
+        """
+        by_group = defaultdict(dict)  # group -> {doc_id: entry}; a repeated doc id keeps its last version
+        for doc_id, event in items:
+            assignment_id = str(event.get("assignmentId") or "")
+            entry = self._entry(doc_id, event)
+            if not assignment_id or entry is None:
+                continue
+            by_group[(assignment_id, group_key(event))][doc_id] = entry
+        written = 0
+        for (assignment_id, key), new_entries in by_group.items():
+            written += self._apply_group(assignment_id, key, list(new_entries.values()))
+        with _stats_lock:
+            _stats["applied"] += len(items)
+        return written
+
+    def mark_failed(self, items, error):
+        """
+        Record that applying (doc_id, event_doc) items failed: counts them in store_stats()
+        and flags their groups needsRebuild (best effort: this write can fail too).
+        """
+        with _stats_lock:
+            _stats["failed"] += len(items)
+            _stats["lastError"] = str(error)[:500]
+        groups = {(str(event.get("assignmentId") or ""), group_key(event)) for _, event in items}
+        batch = self._db.batch()
+        for assignment_id, key in sorted(groups):
+            if assignment_id:
+                batch.set(
+                    self._group_ref(assignment_id, key),
+                    dict(self._group_doc(assignment_id, key), needsRebuild=True, error=str(error)[:500]),
+                    merge=True,
+                )
+        batch.commit()
+
+    def needs_rebuild(self, assignment_id=None):
+        """
+        Assignment ids with a group flagged by mark_failed (only assignment_id's, if given):
+        their stored sessions miss events until rebuild().
+        """
+        query = self._db.collection(GROUPS_COLLECTION).where("needsRebuild", "==", True)
+        if assignment_id is not None:
+            query = query.where("assignmentId", "==", assignment_id).limit(1)
+        return sorted({(snap.to_dict() or {}).get("assignmentId") for snap in query.select(["assignmentId"]).stream()})
+
+    def _apply_group(self, assignment_id, key, new_entries):
+        # Earliest time the change can touch: the new events, or the overwritten versions
+        # of them (same dedup window). Sessions ending more than one gap before that are
+        # closed for good and are not read.
+        low = min(e[2] for e in new_entries)
+        low -= low % self._window_ms
+        query = (
+            self._db.collection(SESSIONS_COLLECTION)
+            .where("assignmentId", "==", assignment_id)
+            .where("groupKey", "==", key)
+            .where("endAt", ">=", low - self._gap_ms)
+        )
+        group_ref = self._group_ref(assignment_id, key)
+        new_ids = {e[1] for e in new_entries if e[1]}
+
+        def update(transaction):
+            # Reading the group doc makes concurrent updates of the group conflict on it.
+            group_ref.get(transaction=transaction)
+            old_docs = {snap.id: snap.to_dict() for snap in query.stream(transaction=transaction)}
+            entries = list(new_entries)
+            for doc in old_docs.values():
+                for stored in doc.get("events") or []:
+                    if stored.get("id") in new_ids:
+                        continue  # overwritten by the new version of the same doc
+                    entry = self._entry(stored.get("id"), stored)
+                    if entry is not None:
+                        entries.append(entry)
+            sets, deletes = self._plan(assignment_id, key, old_docs, entries)
+            self._write(transaction, assignment_id, key, sets, deletes)
+            return len(sets)
+
+        return run_transaction(self._db, update)
+
+    def rebuild(self, assignment_id, events):
+        """
+        Recompute every session of an assignment from (doc_id, event_doc) pairs and replace
+        the stored docs, clearing needsRebuild flags. Returns (sessions_written,
+        sessions_deleted). Each group is replaced
+        in one transaction when its writes fit one (else in batches); events ingested after
+        `events` was read are only kept if they land after the rebuild's write.
+        """
+        by_group = defaultdict(list)
+        for doc_id, event in events:
+            entry = self._entry(doc_id, event)
+            if entry is not None:
+                by_group[group_key(event)].append(entry)
+        keys = set(by_group)
+        for collection in (SESSIONS_COLLECTION, GROUPS_COLLECTION):
+            for snap in (
+                self._db.collection(collection).where("assignmentId", "==", assignment_id)
+                .select(["groupKey"]).stream()
+            ):
+                keys.add((snap.to_dict() or {}).get("groupKey") or "")
+        written = deleted = 0
+        for key in keys:
+            w, d = self._rebuild_group(assignment_id, key, by_group.get(key, []))
+            written += w
+            deleted += d
+        return written, deleted
+
+    def _rebuild_group(self, assignment_id, key, entries):
+        query = (
+            self._db.collection(SESSIONS_COLLECTION)
+            .where("assignmentId", "==", assignment_id)
+            .where("groupKey", "==", key)
+        )
+        group_ref = self._group_ref(assignment_id, key)
+        oversized = []
+
+        def update(transaction):
+            group_ref.get(transaction=transaction)
+            old_docs = {snap.id: snap.to_dict() for snap in query.stream(transaction=transaction)}
+            sets, deletes = self._plan(assignment_id, key, old_docs, list(entries))
+            if len(sets) + len(deletes) >= _BATCH_LIMIT:
+                oversized.append((sets, deletes))
+                return len(sets), len(deletes)
+            self._write(transaction, assignment_id, key, sets, deletes, needsRebuild=False, error=None)
+            return len(sets), len(deletes)
+
+        result = run_transaction(self._db, update)
+        if oversized:
+            sets, deletes = oversized[-1]
+            self._commit(sets, deletes)
+            group_ref.set(dict(self._group_doc(assignment_id, key), needsRebuild=False, error=None), merge=True)
+        return result
+
+    def load(self, assignment_id, start_ms=None, end_ms=None, fields=None):
+        """
+        Return the stored session docs for an assignment, ordered by start time; with
+        start_ms / end_ms only sessions that overlap [start_ms, end_ms) (the endAt range
+        needs the (assignmentId, endAt) index). fields projects the docs (e.g. SUMMARY_FIELDS).
+        """
+        query = self._db.collection(SESSIONS_COLLECTION).where("assignmentId", "==", assignment_id)
+        if start_ms is not None:
+            query = query.where("endAt", ">=", start_ms)
+        if fields:
+            query = query.select(list(fields))
+        docs = [snap.to_dict() for snap in query.stream()]
+        if end_ms is not None:
+            docs = [d for d in docs if (d.get("startAt") or 0) < end_ms]
+        docs.sort(key=lambda d: (d.get("startAt") or 0, d.get("groupKey") or ""))
+        return docs
+
+    def get(self, doc_id):
+        """The stored session doc with that id (see session_doc_id), or None."""
+        snap = self._db.collection(SESSIONS_COLLECTION).document(doc_id).get()
+        return snap.to_dict() if snap.exists else None
+
+    @staticmethod
+    def event_ids(doc):
+        """lineEvents doc ids of a stored session, in session order."""
+        return [stored["id"] for stored in doc.get("events") or [] if stored.get("id")]
+
+    def members(self, assignment_id, key):
+        """GitHub usernames across all stored sessions of a group."""
+        snaps = (
+            self._db.collection(SESSIONS_COLLECTION)
+            .where("assignmentId", "==", assignment_id)
+            .where("groupKey", "==", key)
+            .select(["githubUsernames"])
+            .stream()
+        )
+        return sorted({u for snap in snaps for u in (snap.to_dict() or {}).get("githubUsernames") or []})
+
+
+
+def store_stats():
+    """Events applied and failed (and the last error) in this process, for the metrics endpoint."""
+    with _stats_lock:
+        return dict(_stats)
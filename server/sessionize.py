@@ -0,0 +1,133 @@
+"""Session boundaries for /progress: the gap / max-span rules over a timeline of epoch times.
+
+A new session starts when an event comes more than `gap` after the previous one, or more
+than `max_span` after the first event of the current session. Two engines find the same
+boundaries: a plain Python loop, and (when NumPy is installed) a vectorized one that finds
+every gap break with one diff over the timeline and splits each gap-free segment on
+max-span by binary search, so its Python-level work is per session instead of per event."""
+try:
+    import numpy as np
+except ImportError:  # optional: the Python engine is used instead
+    np = None
+
+ENGINES = ("python", "numpy")
+
+
+def numpy_available():
+    return np is not None
+
+
+def session_starts_python(times, gap, max_span):
+    """Indices where sessions start, for times in timeline order."""
+    starts = []
+    first = last = None
+    for i, t in enumerate(times):
+        if i == 0 or t - last > gap or t - first > max_span:
+            starts.append(i)
+            first = t
+        last = t
+    return starts
+
+
+def session_starts_numpy(times, gap, max_span):
+    """Same as session_starts_python, vectorized. Requires NumPy."""
+    n = len(times)
+    if n == 0:
+        return []
+    t = np.asarray(times, dtype=np.int64)
+    diffs = np.diff(t)
+    if (diffs < 0).any():
+        # Timeline not in time order (e.g. mixed timestamp formats sort differently as
+        # strings): the span rule is no longer monotone, so binary search does not apply.
+        return session_starts_python(times, gap, max_span)
+    segment_starts = np.concatenate(([0], np.flatnonzero(diffs > gap) + 1)).tolist()
+    segment_ends = segment_starts[1:] + [n]
+    # For every event, the first later event more than max_span after it: where the next
+    # session starts if this event opens one (unless a gap break comes first).
+    span_next = np.searchsorted(t, t + max_span, side="right").tolist()
+    starts = []
+    for start, end in zip(segment_starts, segment_ends):
+        # Greedy max-span split of one gap-free segment, jumping session to session.
+        while start < end:
+            starts.append(start)
+            start = span_next[start]
+    return starts
+
+
+# Lengths of YYYY-MM-DDTHH:MM:SS[.fff|.ffffff]Z, the UTC shape the extension sends.
+_CANONICAL_UTC_LENGTHS = (20, 24, 27)
+
+
+def epoch_us(values, parse_one):
+    """
+    Epoch microseconds for a list of timestamps (None where unparseable). Canonical UTC
+    strings are parsed in one NumPy call; anything else goes through parse_one(value).
+    """
+    out = [None] * len(values)
+    fast = []
+    if np is not None:
+        fast = [
+            i for i, v in enumerate(values)
+            if isinstance(v, str) and len(v) in _CANONICAL_UTC_LENGTHS and v[10] == "T" and v[-1] == "Z"
+        ]
+    if fast:
+        try:
+            parsed = np.array([values[i][:-1] for i in fast], dtype="datetime64[us]").astype(np.int64).tolist()
+        except ValueError:  # some string is not a valid date: parse them one by one
+            fast = []
+        else:
+            for i, ts in zip(fast, parsed):
+                out[i] = ts
+    if len(fast) < len(values):
+        done = set(fast)
+        for i, v in enumerate(values):
+            if i not in done:
+                out[i] = parse_one(v)
+    return out
+
+
+def session_starts(times, gap, max_span, engine="python"):
+    """Session start indices using the named engine ("numpy" falls back to Python without NumPy)."""
+    if engine == "numpy" and np is not None:
+        return session_starts_numpy(times, gap, max_span)
+    return session_starts_python(times, gap, max_span)
+
+
+class Sessionizer:
+    """
+    Incremental session_starts: push (ts, item) pairs in timeline order and get back the
+    sessions (lists of items) that can no longer change, so only open sessions are held.
+    The Python engine closes a session at the first event that breaks it; the NumPy engine
+    buffers one gap-free segment and splits it on max-span once the next gap (or finish())
+    closes the segment.
+    """
+
+    def __init__(self, gap, max_span, engine="python"):
+        self.gap = gap
+        self.max_span = max_span
+        self.vectorized = engine == "numpy" and np is not None
+        self._times = []
+        self._items = []
+
+    def push(self, ts, item):
+        """Add the next event; returns the sessions it closed (usually none)."""
+        closed = []
+        if self._times and (
+            ts - self._times[-1] > self.gap or (not self.vectorized and ts - self._times[0] > self.max_span)
+        ):
+            closed = self._close()
+        self._times.append(ts)
+        self._items.append(item)
+        return closed
+
+    def finish(self):
+        """Close and return whatever is still open."""
+        return self._close() if self._times else []
+
+    def _close(self):
+        times, items = self._times, self._items
+        self._times, self._items = [], []
+        if not self.vectorized:
+            return [items]
+        starts = session_starts_numpy(times, self.gap, self.max_span)
+        return [items[a:b] for a, b in zip(starts, starts[1:] + [len(items)])]
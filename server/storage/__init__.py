@@ -0,0 +1,79 @@
+"""Storage backend for the routes: Firestore (default) or a local SQLite engine.
+
+Routes get a client from get_db() and use the subset of the Firestore client API they need:
+collection(name) / document(id); get, set (merge), update, delete on documents; where
+("==", "in", "<", "<=", ">", ">="), order_by, select, limit, stream and count() on queries;
+get_all(refs, field_paths) and batch() writes; Increment in updates; run_transaction and
+count below.
+server/storage/sqlite.py implements the same subset on SQLite, indexed like
+server/firestore.indexes.json.
+
+STORAGE_BACKEND picks the backend: "firestore" (Firebase Admin, see fb_admin.py) or "sqlite"
+(file at SQLITE_PATH), for self-hosted and offline deployments. Both are read from the app
+config (see config.setting)."""
+import os
+import threading
+
+from server.config import setting
+from server.fb_admin import get_firestore
+
+try:
+    from google.cloud.firestore import Increment, Query
+
+    DESCENDING = Query.DESCENDING
+except ImportError:  # firebase-admin not installed: only the SQLite backend is usable
+    class Increment:
+        """Numeric field transform: add value to the stored number (0 if missing)."""
+
+        def __init__(self, value):
+            self.value = value
+
+    DESCENDING = "DESCENDING"
+
+BACKENDS = ("firestore", "sqlite")
+DEFAULT_SQLITE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "clearcode.sqlite3")
+
+_sqlite_dbs = {}  # path -> SQLiteClient
+_sqlite_lock = threading.Lock()
+
+
+def backend_name():
+    """The configured backend (STORAGE_BACKEND, default firestore)."""
+    name = (setting("STORAGE_BACKEND") or "firestore").strip().lower()
+    return name if name in BACKENDS else "firestore"
+
+
+def get_db():
+    """Return the configured storage client, or None if it is not configured."""
+    if backend_name() != "sqlite":
+        return get_firestore()
+    path = setting("SQLITE_PATH") or DEFAULT_SQLITE_PATH
+    db = _sqlite_dbs.get(path)
+    if db is None:
+        with _sqlite_lock:
+            db = _sqlite_dbs.get(path)
+            if db is None:
+                from server.storage.sqlite import SQLiteClient
+
+                db = _sqlite_dbs[path] = SQLiteClient(path)
+    return db
+
+
+def run_transaction(db, fn):
+    """
+    Call fn(transaction) atomically and return its result. fn does all its reads through the
+    transaction (doc.get(transaction=...), query.stream(transaction=...)) before queueing
+    writes with transaction.set / update / delete. Firestore re-runs fn when a document it
+    read changed before the commit; the SQLite engine runs one transaction at a time.
+    """
+    if hasattr(db, "run_transaction"):
+        return db.run_transaction(fn)
+    from google.cloud.firestore import transactional
+
+    return transactional(fn)(db.transaction())
+
+
+def count(query):
+    """Number of docs matching a query, via an aggregation (no documents downloaded)."""
+    result = query.count().get()
+    return int(result[0][0].value) if result and result[0] else 0
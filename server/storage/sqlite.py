@@ -0,0 +1,456 @@
+"""SQLite storage engine implementing the Firestore client subset the routes use (see server/storage).
+
+Each collection is a table (id TEXT PRIMARY KEY, data TEXT holding the document as JSON).
+Filters and sort keys are json_extract() expressions, and every collection gets expression
+indexes: the composite indexes of server/firestore.indexes.json, e.g. lineEvents
+(assignmentId, updatedAt), plus SINGLE_FIELD_INDEXES for the fields routes filter on
+(Firestore indexes single fields automatically). The database runs in WAL mode with one
+connection per thread, so reads do not wait for writes; each batch commits in one transaction.
+run_transaction holds the database's write lock while its function reads and writes, so
+transactions of all threads and processes on the file run one after the other."""
+import json
+import os
+import re
+import secrets
+import sqlite3
+import string
+import threading
+from datetime import date, datetime, timezone
+from pathlib import Path
+
+INDEXES_PATH = Path(__file__).resolve().parent.parent / "firestore.indexes.json"
+
+# Fields the routes filter on by themselves, per collection.
+SINGLE_FIELD_INDEXES = {
+    "assignments": ["userId"],
+    "assignmentInvites": ["assignmentId", "githubUsername"],
+    "assignmentDeletions": ["state"],
+    "citations": ["assignmentId"],
+    "classrooms": ["userId"],
+    "lineEvents": ["assignmentId"],
+    "progressSessions": ["assignmentId"],
+    "progressSessionGroups": ["assignmentId"],
+    "progressVersions": ["assignmentId"],
+}
+
+_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+_ID_CHARS = string.ascii_letters + string.digits
+_OPERATORS = {"==": "=", "<": "<", "<=": "<=", ">": ">", ">=": ">="}
+
+
+class NotFound(Exception):
+    """update() of a document that does not exist."""
+
+
+class Conflict(Exception):
+    """create() / add() of a document id that already exists."""
+
+
+def _name(name):
+    if not isinstance(name, str) or not _NAME.match(name):
+        raise ValueError(f"Unsupported collection or field name: {name!r}")
+    return name
+
+
+def _field(field):
+    """SQL expression for a top-level document field."""
+    return f"json_extract(data, '$.{_name(field)}')"
+
+
+def _auto_id():
+    """20-character random id, like Firestore's."""
+    return "".join(secrets.choice(_ID_CHARS) for _ in range(20))
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Cannot store {type(value).__name__}")
+
+
+def _dumps(data):
+    return json.dumps(data, separators=(",", ":"), default=_json_default)
+
+
+def _is_increment(value):
+    return type(value).__name__ == "Increment" and hasattr(value, "value")
+
+
+def _resolve(value, current):
+    """Stored value for value written over current (applies Increment transforms)."""
+    if _is_increment(value):
+        return (current if isinstance(current, (int, float)) and not isinstance(current, bool) else 0) + value.value
+    if isinstance(value, dict):
+        return {k: _resolve(v, None) for k, v in value.items()}
+    return value
+
+
+def _merge(base, data):
+    """set(merge=True): nested maps are merged, other values replaced."""
+    for key, value in data.items():
+        if isinstance(value, dict) and isinstance(base.get(key), dict):
+            _merge(base[key], value)
+        else:
+            base[key] = _resolve(value, base.get(key))
+    return base
+
+
+def _update(base, data):
+    """update(): keys are field paths ("a.b"); each path's value is replaced."""
+    for path, value in data.items():
+        parts = path.split(".")
+        target = base
+        for part in parts[:-1]:
+            if not isinstance(target.get(part), dict):
+                target[part] = {}
+            target = target[part]
+        target[parts[-1]] = _resolve(value, target.get(parts[-1]))
+    return base
+
+
+def _composite_indexes():
+    """{collection: [field list, ...]} from firestore.indexes.json (directions do not matter here)."""
+    try:
+        spec = json.loads(INDEXES_PATH.read_text())
+    except (OSError, ValueError):
+        return {}
+    indexes = {}
+    for index in spec.get("indexes", []):
+        fields = tuple(f["fieldPath"] for f in index.get("fields", []))
+        known = indexes.setdefault(index.get("collectionGroup"), [])
+        if fields and fields not in known:
+            known.append(fields)
+    return indexes
+
+
+class DocumentSnapshot:
+    """A document as read: id, reference, exists, to_dict() (projected to fields if given)."""
+
+    def __init__(self, reference, raw, fields=None):
+        self.reference = reference
+        self.id = reference.id
+        self._raw = raw
+        self._fields = fields
+
+    @property
+    def exists(self):
+        return self._raw is not None
+
+    def to_dict(self):
+        if self._raw is None:
+            return None
+        data = json.loads(self._raw)
+        if self._fields is not None:
+            data = {k: data[k] for k in self._fields if k in data}
+        return data
+
+    def get(self, field):
+        """One field's value; KeyError if it is missing (as in Firestore)."""
+        data = self.to_dict() or {}
+        if field not in data:
+            raise KeyError(field)
+        return data[field]
+
+
+class AggregationResult:
+    def __init__(self, alias, value):
+        self.alias = alias
+        self.value = value
+
+
+class CountQuery:
+    """query.count(): get() returns [[AggregationResult]] like Firestore's aggregation queries."""
+
+    def __init__(self, query, alias=None):
+        self._query = query
+        self._alias = alias or "count"
+
+    def get(self):
+        sql, params = self._query._sql("1")
+        count = self._query._client._conn().execute(f"SELECT COUNT(*) FROM ({sql})", params).fetchone()[0]
+        return [[AggregationResult(self._alias, count)]]
+
+
+class Query:
+    """Immutable query over one collection; each method returns a new Query."""
+
+    def __init__(self, client, collection, filters=(), orders=(), fields=None, limit=None):
+        self._client = client
+        self._collection = collection
+        self._filters = filters
+        self._orders = orders
+        self._fields = fields
+        self._limit = limit
+
+    def _copy(self, **changes):
+        args = {
+            "filters": self._filters,
+            "orders": self._orders,
+            "fields": self._fields,
+            "limit": self._limit,
+            **changes,
+        }
+        return Query(self._client, self._collection, **args)
+
+    def where(self, field, op, value):
+        if op == "in":
+            values = list(value)
+            if not values:
+                return self._copy(filters=self._filters + (("0", ()),))
+            clause = f"{_field(field)} IN ({', '.join('?' * len(values))})"
+            return self._copy(filters=self._filters + ((clause, tuple(values)),))
+        if op not in _OPERATORS:
+            raise ValueError(f"Unsupported operator: {op!r}")
+        clause = f"{_field(field)} {_OPERATORS[op]} ?"
+        return self._copy(filters=self._filters + ((clause, (value,)),))
+
+    def order_by(self, field, direction="ASCENDING"):
+        descending = str(direction).upper().startswith("DESC")
+        # As in Firestore, ordering on a field leaves out documents without it.
+        clause = f"{_field(field)} IS NOT NULL"
+        return self._copy(
+            filters=self._filters + ((clause, ()),),
+            orders=self._orders + ((_field(field), descending),),
+        )
+
+    def select(self, field_paths):
+        return self._copy(fields=tuple(_name(f) for f in field_paths))
+
+    def limit(self, count):
+        return self._copy(limit=int(count))
+
+    def _sql(self, columns):
+        sql = f'SELECT {columns} FROM "{self._collection}"'
+        params = []
+        if self._filters:
+            sql += " WHERE " + " AND ".join(clause for clause, _ in self._filters)
+            for _, values in self._filters:
+                params.extend(values)
+        orders = [f"{expr} {'DESC' if desc else 'ASC'}" for expr, desc in self._orders]
+        sql += " ORDER BY " + ", ".join(orders + ["id ASC"])
+        if self._limit is not None:
+            sql += " LIMIT ?"
+            params.append(self._limit)
+        return sql, params
+
+    def stream(self, transaction=None):
+        """
+        Yield matching snapshots, reading rows as they are consumed. Inside run_transaction
+        nothing else can commit, so the separate connection sees the transaction's snapshot.
+        """
+        columns = "id, '{}'" if self._fields == () else "id, data"
+        sql, params = self._sql(columns)
+        collection = self._client.collection(self._collection)
+        # A connection of its own, so the caller can write while iterating.
+        conn = self._client._connect()
+        try:
+            for doc_id, raw in conn.execute(sql, params):
+                yield DocumentSnapshot(collection.document(doc_id), raw, self._fields or None)
+        finally:
+            conn.close()
+
+    def get(self):
+        return list(self.stream())
+
+    def count(self, alias=None):
+        return CountQuery(self, alias)
+
+
+class DocumentReference:
+    def __init__(self, client, collection, doc_id):
+        self._client = client
+        self._collection = collection
+        self.id = doc_id
+        self.path = f"{collection}/{doc_id}"
+
+    def get(self, field_paths=None, transaction=None):
+        row = self._client._conn().execute(
+            f'SELECT data FROM "{self._collection}" WHERE id = ?', (self.id,)
+        ).fetchone()
+        fields = tuple(_name(f) for f in field_paths) if field_paths is not None else None
+        return DocumentSnapshot(self, row[0] if row else None, fields)
+
+    def set(self, document_data, merge=False):
+        self._client._commit([("set", self, document_data, merge)])
+
+    def create(self, document_data):
+        self._client._commit([("create", self, document_data, False)])
+
+    def update(self, field_updates):
+        self._client._commit([("update", self, field_updates, False)])
+
+    def delete(self):
+        self._client._commit([("delete", self, None, False)])
+
+
+class CollectionReference(Query):
+    def __init__(self, client, name):
+        super().__init__(client, name)
+        self.id = name
+
+    def document(self, document_id=None):
+        return DocumentReference(self._client, self._collection, document_id or _auto_id())
+
+    def add(self, document_data, document_id=None):
+        """Create a document with a new id; returns (write time, reference) like Firestore."""
+        ref = self.document(document_id)
+        ref.create(document_data)
+        return datetime.now(timezone.utc), ref
+
+
+class WriteBatch:
+    """Writes applied together in one SQLite transaction on commit()."""
+
+    def __init__(self, client):
+        self._client = client
+        self._ops = []
+
+    def set(self, reference, document_data, merge=False):
+        self._ops.append(("set", reference, document_data, merge))
+        return self
+
+    def create(self, reference, document_data):
+        self._ops.append(("create", reference, document_data, False))
+        return self
+
+    def update(self, reference, field_updates):
+        self._ops.append(("update", reference, field_updates, False))
+        return self
+
+    def delete(self, reference):
+        self._ops.append(("delete", reference, None, False))
+        return self
+
+    def commit(self):
+        ops, self._ops = self._ops, []
+        self._client._commit(ops)
+        return []
+
+
+class Transaction(WriteBatch):
+    """Writes queued by a run_transaction function; applied in its transaction when it returns."""
+
+    def commit(self):
+        raise RuntimeError("Transaction writes are committed by run_transaction")
+
+
+class SQLiteClient:
+    """Firestore-like client over one SQLite database file."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._tables = set()
+        self._tables_lock = threading.Lock()
+        self._composite_indexes = _composite_indexes()
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _conn(self):
+        """This thread's connection."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _ensure_table(self, name):
+        """Create the collection's table and indexes on first use."""
+        if name in self._tables:
+            return
+        with self._tables_lock:
+            if name in self._tables:
+                return
+            conn = self._conn()
+            conn.execute(f'CREATE TABLE IF NOT EXISTS "{name}" (id TEXT PRIMARY KEY, data TEXT NOT NULL)')
+            indexes = [(f,) for f in SINGLE_FIELD_INDEXES.get(name, [])] + self._composite_indexes.get(name, [])
+            for fields in indexes:
+                index_name = "__".join((name, *fields))
+                columns = ", ".join(_field(f) for f in fields)
+                conn.execute(f'CREATE INDEX IF NOT EXISTS "{index_name}" ON "{name}" ({columns})')
+            self._tables.add(name)
+
+    def collection(self, name):
+        self._ensure_table(_name(name))
+        return CollectionReference(self, name)
+
+    def batch(self):
+        return WriteBatch(self)
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        """Snapshots for references (one query per collection); missing documents have exists False."""
+        references = list(references)
+        fields = tuple(_name(f) for f in field_paths) if field_paths is not None else None
+        by_collection = {}
+        for ref in references:
+            by_collection.setdefault(ref._collection, []).append(ref.id)
+        found = {}
+        conn = self._conn()
+        for collection, ids in by_collection.items():
+            self._ensure_table(collection)
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                rows = conn.execute(
+                    f'SELECT id, data FROM "{collection}" WHERE id IN ({", ".join("?" * len(chunk))})', chunk
+                )
+                found.update(((collection, doc_id), raw) for doc_id, raw in rows)
+        for ref in references:
+            yield DocumentSnapshot(ref, found.get((ref._collection, ref.id)), fields)
+
+    def run_transaction(self, fn):
+        """
+        Call fn(transaction) inside BEGIN IMMEDIATE and apply the writes it queued on the
+        transaction before COMMIT; returns fn's result. An exception rolls everything back.
+        """
+        conn = self._conn()
+        transaction = Transaction(self)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(transaction)
+            for kind, ref, data, merge in transaction._ops:
+                self._apply(conn, kind, ref, data, merge)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    def _commit(self, ops):
+        """Apply (kind, reference, data, merge) writes in one transaction."""
+        if not ops:
+            return
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for kind, ref, data, merge in ops:
+                self._apply(conn, kind, ref, data, merge)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _apply(self, conn, kind, ref, data, merge):
+        table = ref._collection
+        if kind == "delete":
+            conn.execute(f'DELETE FROM "{table}" WHERE id = ?', (ref.id,))
+            return
+        row = conn.execute(f'SELECT data FROM "{table}" WHERE id = ?', (ref.id,)).fetchone()
+        current = json.loads(row[0]) if row else None
+        if kind == "create" and current is not None:
+            raise Conflict(f"Document already exists: {ref.path}")
+        if kind == "update":
+            if current is None:
+                raise NotFound(f"No document to update: {ref.path}")
+            doc = _update(current, data)
+        elif merge and current is not None:
+            doc = _merge(current, data)
+        else:
+            doc = _merge({}, data)
+        conn.execute(f'INSERT OR REPLACE INTO "{table}" (id, data) VALUES (?, ?)', (ref.id, _dumps(doc)))
@@ -0,0 +1,130 @@
+"""Cascade deletion: the final sweep after the ingestion settle time is scheduled, not slept through.
+
+cascade_delete runs on a SQLite database in a temporary directory and a fake clock."""
+import time
+
+import pytest
+
+from server import cascade_delete as cd
+from server.bench.suite import create_assignment, local_app
+from server.line_events import iso_ms
+from server.storage.sqlite import SQLiteClient
+
+T0 = 1_772_445_600_000  # 2026-03-02T10:00:00Z
+
+
+class _Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def db(tmp_path):
+    return SQLiteClient(tmp_path / "deletions.sqlite3")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock(T0 / 1000)
+    monkeypatch.setattr(cd, "time", clock)
+    return clock
+
+
+def _request_deletion(db, assignment_id, requested_at_ms):
+    ref = db.collection("assignments").document(assignment_id)
+    ref.set({"name": assignment_id, "deletedAt": iso_ms(requested_at_ms)})
+    db.collection(cd.DELETIONS_COLLECTION).document(assignment_id).set(
+        {"assignmentId": assignment_id, "state": "queued", "requestedAt": iso_ms(requested_at_ms), "deleted": {}}
+    )
+    return ref
+
+
+def _add(db, collection, assignment_id, n):
+    for i in range(n):
+        db.collection(collection).add({"assignmentId": assignment_id, "i": i})
+
+
+def _job(db, assignment_id):
+    return db.collection(cd.DELETIONS_COLLECTION).document(assignment_id).get().to_dict()
+
+
+def test_final_sweep_is_scheduled_not_waited_for(db, clock):
+    ref = _request_deletion(db, "gone", T0)
+    _add(db, "invites", "gone", 2)
+    _add(db, "lineEvents", "gone", 3)
+    _add(db, "lineEvents", "kept", 1)
+    clock.now += 5
+
+    deleted, resweep_in = cd.cascade_delete(db, ref, ["invites", "lineEvents"], resweep=["lineEvents"])
+    assert deleted == {"invites": 2, "lineEvents": 3}
+    assert resweep_in == pytest.approx(cd.INGEST_SETTLE_SECONDS - 5)
+    job = _job(db, "gone")
+    assert job["state"] == "settling"
+    assert job["resweepAt"] == iso_ms(T0 + cd.INGEST_SETTLE_SECONDS * 1000)
+    assert ref.get().exists
+
+    # A write accepted by a worker that still had the assignment cached as live.
+    _add(db, "lineEvents", "gone", 1)
+    clock.now += resweep_in - 1
+    assert cd.cascade_delete(db, ref, ["invites", "lineEvents"], resweep=["lineEvents"])[1] == pytest.approx(1)
+    clock.now += 1
+    deleted, resweep_in = cd.cascade_delete(db, ref, ["invites", "lineEvents"], resweep=["lineEvents"])
+    assert resweep_in is None
+    assert deleted == {"invites": 2, "lineEvents": 4}
+    assert _job(db, "gone")["state"] == "done"
+    assert not ref.get().exists
+    assert [snap.to_dict()["assignmentId"] for snap in db.collection("lineEvents").stream()] == ["kept"]
+
+
+def test_job_past_its_settle_time_finishes_in_one_run(db, clock):
+    ref = _request_deletion(db, "old", T0 - cd.INGEST_SETTLE_SECONDS * 1000)
+    _add(db, "lineEvents", "old", 2)
+    deleted, resweep_in = cd.cascade_delete(db, ref, ["invites", "lineEvents"], resweep=["lineEvents"])
+    assert (deleted, resweep_in) == ({"lineEvents": 2}, None)
+    assert _job(db, "old")["state"] == "done"
+
+
+def test_requeue_puts_the_job_back_after_the_delay(monkeypatch):
+    queued = []
+
+    class Queue:
+        def put(self, item):
+            queued.append(item)
+            return True
+
+    monkeypatch.setattr(cd, "_deletion_queue", Queue())
+    timer = cd.requeue_deletion("later", 0.05)
+    assert queued == []
+    timer.join(timeout=5)
+    assert queued == ["later"]
+
+
+def test_resume_deletions_finishes_settling_jobs(tmp_path):
+    app = local_app(str(tmp_path))
+    create_assignment(app, "resume-settling")
+    from server.api.routes import assignments
+
+    with app.app_context():
+        db = assignments.get_db()
+        # Swept once 59.8 s ago, then the process exited before the final sweep.
+        requested = int(time.time() * 1000) - cd.INGEST_SETTLE_SECONDS * 1000 + 200
+        db.collection(cd.DELETIONS_COLLECTION).document("resume-settling").set({
+            "assignmentId": "resume-settling",
+            "state": "settling",
+            "requestedAt": iso_ms(requested),
+            "deleted": {"lineEvents": 1},
+        })
+        db.collection("lineEvents").add({"assignmentId": "resume-settling"})
+
+    result = app.test_cli_runner().invoke(args=["assignments", "resume-deletions"])
+    assert result.exit_code == 0, result.output
+    lines = result.output.splitlines()
+    assert lines[0].startswith("Waiting ") and lines[0].endswith("for the final sweep of 1 deletion(s)")
+    assert lines[1] == "resume-settling: deleted {'lineEvents': 2}"
+    with app.app_context():
+        db = assignments.get_db()
+        assert db.collection(cd.DELETIONS_COLLECTION).document("resume-settling").get().to_dict()["state"] == "done"
+        assert not db.collection(assignments.COLLECTION).document("resume-settling").get().exists
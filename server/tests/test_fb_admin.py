@@ -0,0 +1,147 @@
+"""fb_admin: the verified ID token cache (TTL, expiry, revocation) and the cert refresher's SDK check.
+
+firebase_admin's verify_id_token is stubbed; both fb_admin and the cache run on a fake clock."""
+import logging
+
+import pytest
+from firebase_admin import auth
+from flask import Flask
+
+from server import cache as cache_module
+from server import fb_admin
+
+NOW = 1_772_445_600.0  # 2026-03-02T10:00:00Z
+
+
+class _Clock:
+    def __init__(self):
+        self.now = NOW
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+
+class _Verifier:
+    """Stands in for firebase_admin.auth.verify_id_token: returns the claims, or raises the error, set per token."""
+
+    def __init__(self):
+        self.results = {}
+        self.calls = []
+
+    def __call__(self, token, check_revoked=False):
+        self.calls.append((token, check_revoked))
+        result = self.results[token]
+        if isinstance(result, Exception):
+            raise result
+        return dict(result)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(fb_admin, "time", clock)
+    monkeypatch.setattr(cache_module, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def verifier(monkeypatch, clock):
+    verifier = _Verifier()
+    monkeypatch.setattr(auth, "verify_id_token", verifier)
+    monkeypatch.setattr(fb_admin, "_init_firebase", lambda: object())
+    monkeypatch.setattr(fb_admin, "_start_cert_refresher", lambda app: None)
+    monkeypatch.delenv("FLASK_DEBUG", raising=False)
+    monkeypatch.delenv("DEV_SKIP_TOKEN_VERIFY", raising=False)
+    fb_admin._token_cache().clear()
+    yield verifier
+    fb_admin._token_cache().clear()
+
+
+def _config(**config):
+    app = Flask(__name__)
+    app.config.update({"TOKEN_CACHE_SIZE": 16, "TOKEN_CACHE_SKEW_SECONDS": 30, **config})
+    return app.app_context()
+
+
+def _claims(uid, expires_in):
+    return {"uid": uid, "sub": uid, "exp": int(NOW + expires_in)}
+
+
+def test_cached_until_exp_minus_now_minus_skew(verifier, clock):
+    verifier.results["t1"] = _claims("u1", 600)
+    with _config():
+        assert fb_admin.verify_id_token("t1")["uid"] == "u1"
+        clock.now += 569
+        assert fb_admin.verify_id_token(" t1 ")["uid"] == "u1"
+        assert len(verifier.calls) == 1
+        clock.now += 1  # 600 - 30 seconds after the first verification
+        assert fb_admin.verify_id_token("t1")["uid"] == "u1"
+        assert len(verifier.calls) == 2
+
+
+def test_skew_is_read_from_the_config(verifier, clock):
+    verifier.results["t1"] = _claims("u1", 600)
+    with _config(TOKEN_CACHE_SKEW_SECONDS=300):
+        fb_admin.verify_id_token("t1")
+        clock.now += 299
+        fb_admin.verify_id_token("t1")
+        assert len(verifier.calls) == 1
+        clock.now += 1
+        fb_admin.verify_id_token("t1")
+        assert len(verifier.calls) == 2
+
+
+def test_tokens_within_the_skew_of_exp_are_not_cached(verifier):
+    verifier.results["t1"] = _claims("u1", 20)
+    with _config():
+        assert fb_admin.verify_id_token("t1")["uid"] == "u1"
+        assert fb_admin.verify_id_token("t1")["uid"] == "u1"
+    assert len(verifier.calls) == 2
+    assert fb_admin._token_cache().stats()["size"] == 0
+
+
+def test_expired_token_is_not_served_from_the_cache(verifier, clock):
+    verifier.results["t1"] = _claims("u1", 600)
+    with _config():
+        assert fb_admin.verify_id_token("t1")["uid"] == "u1"
+        clock.now += 600
+        verifier.results["t1"] = auth.ExpiredIdTokenError("Token expired", None)
+        assert fb_admin.verify_id_token("t1") is None
+        assert fb_admin.verify_id_token("t1") is None
+    assert len(verifier.calls) == 3
+
+
+def test_revocation_is_not_checked_by_default(verifier):
+    verifier.results["t1"] = _claims("u1", 600)
+    with _config():
+        fb_admin.verify_id_token("t1")
+    assert verifier.calls == [("t1", False)]
+
+
+def test_revoked_token_is_not_served_past_the_revocation_check(verifier, clock):
+    verifier.results["t1"] = _claims("u1", 600)
+    with _config(TOKEN_REVOCATION_CHECK_SECONDS=60):
+        assert fb_admin.verify_id_token("t1")["uid"] == "u1"
+        verifier.results["t1"] = auth.RevokedIdTokenError("The Firebase ID token has been revoked.")
+        clock.now += 59
+        assert fb_admin.verify_id_token("t1")["uid"] == "u1"
+        clock.now += 1
+        assert fb_admin.verify_id_token("t1") is None
+        assert fb_admin.verify_id_token("t1") is None
+    assert verifier.calls == [("t1", True)] * 3
+
+
+def test_cert_refresher_stops_loudly_without_the_sdk_internals(monkeypatch, caplog):
+    monkeypatch.setattr(auth, "_get_client", lambda app: object())  # no _token_verifier
+    refresher = fb_admin._CertRefresher(object(), 3600)
+    with caplog.at_level(logging.ERROR, logger=fb_admin.__name__):
+        refresher.start()
+        refresher._thread.join(timeout=5)
+    stats = refresher.stats()
+    assert stats["running"] is False
+    assert stats["unsupported"] is True
+    assert "firebase_admin" in stats["lastError"]
+    assert any("Token cert refresh disabled" in record.getMessage() for record in caplog.records)
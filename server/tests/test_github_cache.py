@@ -0,0 +1,150 @@
+"""GitHub proxy cache (api/routes/github.py): 304 revalidation, and stale data while GitHub is down or over quota.
+
+GitHub is a stubbed session behind github_client; user lookups are never fresh (TTL 0), so every
+lookup revalidates, while searches stay fresh for the default TTL."""
+import json
+import time
+
+import pytest
+import requests
+
+from server import github_client
+from server.api.routes import github
+from server.bench.suite import local_app
+
+USERS = "/api/v1/github/users"
+
+
+class _Session:
+    """Stands in for github_client's pooled session: answers GETs from a queue, records what was sent."""
+
+    def __init__(self):
+        self.replies = []
+        self.sent = []
+
+    def reply(self, status, body=None, **headers):
+        r = requests.Response()
+        r.status_code = status
+        r._content = json.dumps(body).encode() if body is not None else b""
+        r.headers.update(headers)
+        self.replies.append(r)
+
+    def fail(self, error):
+        self.replies.append(error)
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        self.sent.append((url, dict(headers or {})))
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+
+@pytest.fixture(scope="module")
+def app(tmp_path_factory):
+    return local_app(str(tmp_path_factory.mktemp("github-cache")), GITHUB_USER_CACHE_TTL_SECONDS=0)
+
+
+@pytest.fixture(scope="module")
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def session(app, monkeypatch):
+    session = _Session()
+    monkeypatch.setattr(github_client, "_session", session)
+    monkeypatch.setattr(github_client, "_quotas", {})
+    with app.app_context():
+        github._github_cache().clear()
+    yield session
+    assert session.replies == []
+
+
+def _profile(login):
+    return {"login": login, "avatar_url": f"https://avatars.example/{login}", "name": login.title()}
+
+
+def test_miss_then_304_revalidation(client, session):
+    session.reply(200, _profile("octo"), ETag='"v1"')
+    resp = client.get(f"{USERS}/Octo")
+    assert resp.status_code == 200
+    assert resp.headers["X-Cache"] == "MISS"
+    assert "If-None-Match" not in session.sent[0][1]
+
+    session.reply(304, ETag='"v1"')
+    resp = client.get(f"{USERS}/octo")  # usernames are cached case-insensitively
+    assert resp.status_code == 200
+    assert resp.headers["X-Cache"] == "REVALIDATED"
+    assert resp.get_json() == _profile("octo")
+    assert session.sent[1][1]["If-None-Match"] == '"v1"'
+
+
+def test_changed_profile_is_refreshed_with_the_new_etag(client, session):
+    session.reply(200, _profile("mona"), ETag='"v1"')
+    session.reply(200, dict(_profile("mona"), name="Mona Lisa"), ETag='"v2"')
+    session.reply(304)
+    assert client.get(f"{USERS}/mona").headers["X-Cache"] == "MISS"
+    resp = client.get(f"{USERS}/mona")
+    assert resp.headers["X-Cache"] == "REFRESHED"
+    assert resp.get_json()["name"] == "Mona Lisa"
+    assert client.get(f"{USERS}/mona").get_json()["name"] == "Mona Lisa"
+    assert [headers.get("If-None-Match") for _url, headers in session.sent] == [None, '"v1"', '"v2"']
+
+
+def test_fresh_entries_are_not_sent(client, session):
+    session.reply(200, {"items": [_profile("octo"), _profile("octocat")]}, ETag='"s1"')
+    first = client.get("/api/v1/github/search/users?q=octo")
+    second = client.get("/api/v1/github/search/users?q=OCTO")
+    assert first.headers["X-Cache"] == "MISS"
+    assert second.headers["X-Cache"] == "FRESH"
+    assert second.get_json() == first.get_json()
+    assert len(session.sent) == 1
+
+
+@pytest.mark.parametrize("outage", ["unreachable", "server error"])
+def test_stale_data_while_github_is_down(client, session, outage):
+    username = f"down-{outage.replace(' ', '-')}"
+    session.reply(200, _profile(username), ETag='"v1"')
+    assert client.get(f"{USERS}/{username}").status_code == 200
+    if outage == "unreachable":
+        session.fail(requests.ConnectionError("connection refused"))
+    else:
+        session.reply(502, {"message": "Bad Gateway"})
+    resp = client.get(f"{USERS}/{username}")
+    assert resp.status_code == 200
+    assert resp.headers["X-Cache"] == "STALE"
+    assert resp.get_json() == _profile(username)
+
+
+def test_uncached_lookup_while_github_is_down_is_502(client, session):
+    session.fail(requests.Timeout("read timed out"))
+    assert client.get(f"{USERS}/never-seen").status_code == 502
+
+
+def test_stale_data_while_over_quota(client, session):
+    reset = str(int(time.time()) + 3600)
+    session.reply(200, _profile("quota"), ETag='"v1"', **{"X-RateLimit-Remaining": "5", "X-RateLimit-Reset": reset})
+    assert client.get(f"{USERS}/quota").headers["X-Cache"] == "MISS"
+    # GitHub answers the revalidation with its rate-limit 403.
+    session.reply(403, {"message": "API rate limit exceeded"}, **{"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": reset})
+    resp = client.get(f"{USERS}/quota")
+    assert resp.status_code == 200
+    assert resp.headers["X-Cache"] == "STALE"
+    # The quota is now known to be used up: nothing more is sent until the reset.
+    resp = client.get(f"{USERS}/quota")
+    assert resp.headers["X-Cache"] == "STALE"
+    assert resp.get_json() == _profile("quota")
+    assert len(session.sent) == 2
+    resp = client.get(f"{USERS}/not-cached")
+    assert resp.status_code == 429
+    assert 3500 <= int(resp.headers["Retry-After"]) <= 3600
+    assert len(session.sent) == 2
+
+
+def test_not_found_is_not_cached(client, session):
+    session.reply(404, {"message": "Not Found"})
+    session.reply(404, {"message": "Not Found"})
+    assert client.get(f"{USERS}/ghost").status_code == 404
+    assert client.get(f"{USERS}/ghost").status_code == 404
+    assert [headers.get("If-None-Match") for _url, headers in session.sent] == [None, None]
@@ -0,0 +1,174 @@
+"""github_client: calls back off on low quota (wait for a near reset, else RateLimitExceeded without a request).
+
+The pooled session is stubbed and github_client runs on a fake clock."""
+import pytest
+import requests
+from flask import Flask
+
+from server import github_client
+from server.github_client import API_URL, RateLimitExceeded
+
+NOW = 1_772_445_600.0  # 2026-03-02T10:00:00Z
+USER = f"{API_URL}/users/octo"
+SEARCH = f"{API_URL}/search/users"
+
+
+class _Clock:
+    def __init__(self):
+        self.now = NOW
+        self.slept = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class _Session:
+    """Stands in for the pooled session: every GET gets the next queued reply."""
+
+    def __init__(self):
+        self.replies = []
+        self.sent = []
+
+    def reply(self, status=200, remaining=None, reset_in=None, **headers):
+        r = requests.Response()
+        r.status_code = status
+        r._content = b"{}"
+        if remaining is not None:
+            headers.update({"X-RateLimit-Limit": "60", "X-RateLimit-Remaining": str(remaining)})
+        if reset_in is not None:
+            headers["X-RateLimit-Reset"] = str(int(NOW + reset_in))
+        r.headers.update(headers)
+        self.replies.append(r)
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        self.sent.append(url)
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(github_client, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def session(monkeypatch, clock):
+    session = _Session()
+    monkeypatch.setattr(github_client, "_session", session)
+    monkeypatch.setattr(github_client, "_quotas", {})
+    monkeypatch.setattr(github_client, "_stats", dict.fromkeys(github_client._stats, 0))
+    return session
+
+
+def _config(**config):
+    app = Flask(__name__)
+    app.config.update({"GITHUB_RATE_LIMIT_RESERVE": 0, "GITHUB_RATE_LIMIT_MAX_WAIT_SECONDS": 2, **config})
+    return app.app_context()
+
+
+def test_used_up_quota_fails_fast_until_the_reset(session, clock):
+    session.reply(remaining=1, reset_in=600)
+    session.reply(remaining=0, reset_in=600)
+    with _config():
+        github_client.get(USER)
+        github_client.get(USER)
+        with pytest.raises(RateLimitExceeded) as exc:
+            github_client.get(USER)
+        assert exc.value.resource == "core"
+        assert exc.value.retry_after == pytest.approx(600)
+        assert len(session.sent) == 2
+        # After the reset the quota is unknown again, so the call is sent.
+        clock.now += 600
+        session.reply(remaining=59, reset_in=4200)
+        github_client.get(USER)
+    assert len(session.sent) == 3
+    assert github_client._stats["throttled"] == 1
+
+
+def test_calls_in_flight_count_against_the_quota(session):
+    session.reply(remaining=2, reset_in=600)
+    with _config():
+        github_client.get(USER)
+        quota = github_client._quotas["core"]
+        github_client._acquire("core")
+        github_client._acquire("core")  # the last call this window
+        assert quota.remaining == 0
+        with pytest.raises(RateLimitExceeded):
+            github_client._acquire("core")
+
+
+def test_near_reset_is_waited_for(session, clock):
+    session.reply(remaining=0, reset_in=1.5)
+    session.reply(remaining=59, reset_in=3600)
+    with _config():
+        github_client.get(USER)
+        github_client.get(USER)
+    assert clock.slept == [pytest.approx(1.0)]  # the reset header has whole seconds
+    assert len(session.sent) == 2
+    assert (github_client._stats["waited"], github_client._stats["throttled"]) == (1, 0)
+
+
+def test_reserve_is_kept_back(session):
+    session.reply(remaining=3, reset_in=600)
+    with _config(GITHUB_RATE_LIMIT_RESERVE=3):
+        github_client.get(USER)
+        with pytest.raises(RateLimitExceeded):
+            github_client.get(USER)
+    with _config(GITHUB_RATE_LIMIT_RESERVE=3, GITHUB_RATE_LIMIT_MAX_WAIT_SECONDS=900):
+        session.reply(remaining=59, reset_in=4200)
+        github_client.get(USER)  # waits out the window instead
+    assert len(session.sent) == 2
+
+
+def test_retry_after_blocks_the_resource(session, clock):
+    session.reply(status=403, **{"Retry-After": "30"})
+    session.reply(status=429, **{"Retry-After": "1"})
+    with _config():
+        github_client.get(SEARCH)
+        with pytest.raises(RateLimitExceeded) as exc:
+            github_client.get(SEARCH)
+        assert exc.value.resource == "search"
+        assert exc.value.retry_after == pytest.approx(30)
+        clock.now += 30
+        github_client.get(SEARCH)
+        assert github_client._quotas["search"].blocked_until == pytest.approx(clock.now + 1)
+    assert github_client._stats["rateLimited"] == 2
+
+
+def test_resources_back_off_separately(session):
+    session.reply(remaining=0, reset_in=60, **{"X-RateLimit-Resource": "search"})
+    session.reply(remaining=4999, reset_in=3600)
+    with _config():
+        github_client.get(SEARCH)
+        with pytest.raises(RateLimitExceeded):
+            github_client.get(SEARCH)
+        github_client.get(USER)
+    assert session.sent == [SEARCH, USER]
+
+
+def test_out_of_order_responses_keep_the_lowest_count(session):
+    session.reply(remaining=10, reset_in=600)
+    session.reply(remaining=12, reset_in=600)  # sent earlier, answered later
+    with _config():
+        github_client.get(USER)
+        github_client.get(USER)
+    # 10 left, less the second call reserved before its (stale) answer came back.
+    assert github_client._quotas["core"].remaining == 9
+
+
+def test_failed_request_gives_its_call_back(session):
+    session.reply(remaining=5, reset_in=600)
+    session.replies.append(requests.ConnectionError("connection reset"))
+    with _config():
+        github_client.get(USER)
+        with pytest.raises(requests.ConnectionError):
+            github_client.get(USER)
+    assert github_client._quotas["core"].remaining == 5
@@ -0,0 +1,52 @@
+"""Ingestion endpoints reject writes to missing and deleted assignments."""
+import pytest
+
+from server.bench.suite import create_assignment, dev_token, local_app
+
+
+@pytest.fixture(scope="module")
+def app(tmp_path_factory):
+    return local_app(str(tmp_path_factory.mktemp("ingest")))
+
+
+@pytest.fixture(scope="module")
+def client(app):
+    return app.test_client()
+
+
+def _event(assignment_id):
+    return {
+        "AssignmentID": assignment_id,
+        "GitHubName": "student1",
+        "GitHubLink": "https://github.com/example/ingest",
+        "FilePath": "main.py",
+        "LineNumber": 1,
+        "LineContent": "print('hi')",
+        "updatedAt": "2026-03-02T10:00:00Z",
+    }
+
+
+def _citation(assignment_id):
+    return {"AssignmentID": assignment_id, "GitHubName": "student1", "source": "docs", "text": "from the docs"}
+
+
+def test_missing_assignment_is_rejected(client):
+    assert client.post("/api/v1/assignments/push", json=_event("no-such-assignment")).status_code == 404
+    resp = client.post("/api/v1/assignments/push/batch", json=[_event("no-such-assignment")])
+    assert resp.status_code == 404
+    assert resp.get_json()["results"][0]["error"] == "Assignment not found"
+    assert client.post("/api/v1/assignments/citations", json=_citation("no-such-assignment")).status_code == 404
+
+
+def test_deleted_assignment_is_rejected(app, client):
+    create_assignment(app, "deleted-assignment")
+    assert client.post("/api/v1/assignments/push", json=_event("deleted-assignment")).status_code == 200
+    resp = client.delete("/api/v1/assignments/deleted-assignment", headers={"Authorization": f"Bearer {dev_token()}"})
+    assert resp.status_code == 202
+    assert client.post("/api/v1/assignments/push", json=_event("deleted-assignment")).status_code == 410
+    assert client.post("/api/v1/assignments/citations", json=_citation("deleted-assignment")).status_code == 410
+    # Valid items of live assignments are still stored next to rejected ones.
+    create_assignment(app, "live-assignment")
+    resp = client.post("/api/v1/assignments/push/batch", json=[_event("deleted-assignment"), _event("live-assignment")])
+    assert resp.status_code == 200
+    assert [r["ok"] for r in resp.get_json()["results"]] == [False, True]
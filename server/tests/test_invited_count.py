@@ -0,0 +1,88 @@
+"""The assignment doc's denormalized invitedCount: kept in step by invites / removals, repaired by the CLI."""
+import pytest
+
+from server.bench.suite import create_assignment, dev_token, local_app
+
+AUTH = {"Authorization": f"Bearer {dev_token()}"}
+
+
+@pytest.fixture(scope="module")
+def app(tmp_path_factory):
+    return local_app(str(tmp_path_factory.mktemp("invited-count")))
+
+
+@pytest.fixture(scope="module")
+def client(app):
+    return app.test_client()
+
+
+def _assignment_doc(app, assignment_id):
+    from server.api.routes import assignments
+
+    with app.app_context():
+        return assignments.get_db().collection(assignments.COLLECTION).document(assignment_id)
+
+
+def _listed_count(client, assignment_id):
+    resp = client.get("/api/v1/assignments", headers=AUTH)
+    assert resp.status_code == 200, resp.get_data(as_text=True)
+    return next(a["invitedCount"] for a in resp.get_json() if a["id"] == assignment_id)
+
+
+def _invite(client, assignment_id, username):
+    return client.post(f"/api/v1/assignments/{assignment_id}/invite", json={"githubUsername": username}, headers=AUTH)
+
+
+def test_invites_and_removals_keep_the_count(app, client):
+    create_assignment(app, "invited-step")
+    ids = []
+    for username in ("alice", "bob", "carol"):
+        resp = _invite(client, "invited-step", username)
+        assert resp.status_code in (200, 201), resp.get_data(as_text=True)
+        ids.append(resp.get_json()["id"])
+    assert _invite(client, "invited-step", "Alice").status_code == 409  # already invited
+    assert _assignment_doc(app, "invited-step").get().to_dict()["invitedCount"] == 3
+    assert _listed_count(client, "invited-step") == 3
+
+    resp = client.delete(f"/api/v1/assignments/invited-step/invite/{ids[1]}", headers=AUTH)
+    assert resp.status_code == 200
+    assert client.delete(f"/api/v1/assignments/invited-step/invite/{ids[1]}", headers=AUTH).status_code == 404
+    assert _assignment_doc(app, "invited-step").get().to_dict()["invitedCount"] == 2
+    assert _listed_count(client, "invited-step") == 2
+
+
+def test_docs_without_a_count_are_counted_and_then_stored(app, client):
+    create_assignment(app, "invited-legacy")
+    assert _invite(client, "invited-legacy", "alice").status_code in (200, 201)
+    # An assignment stored before invitedCount existed.
+    ref = _assignment_doc(app, "invited-legacy")
+    ref.set({k: v for k, v in ref.get().to_dict().items() if k != "invitedCount"})
+    assert _listed_count(client, "invited-legacy") == 1
+    assert _invite(client, "invited-legacy", "bob").status_code in (200, 201)
+    assert _assignment_doc(app, "invited-legacy").get().to_dict()["invitedCount"] == 2
+
+
+def test_repair_invited_counts_fixes_drift(app, client):
+    create_assignment(app, "invited-drift")
+    create_assignment(app, "invited-exact")
+    for username in ("alice", "bob"):
+        assert _invite(client, "invited-drift", username).status_code in (200, 201)
+    _assignment_doc(app, "invited-drift").update({"invitedCount": 7})
+    assert _listed_count(client, "invited-drift") == 7
+
+    runner = app.test_cli_runner()
+    args = ["assignments", "repair-invited-counts", "invited-drift", "invited-exact", "invited-nope"]
+    result = runner.invoke(args=args)
+    assert result.exit_code == 0, result.output
+    assert result.output.splitlines() == [
+        "invited-drift: 2 invites (was 7)",
+        "invited-exact: 0 invites",
+        "invited-nope: not found",
+    ]
+    assert _listed_count(client, "invited-drift") == 2
+
+    _assignment_doc(app, "invited-exact").update({"invitedCount": -1})
+    result = runner.invoke(args=["assignments", "repair-invited-counts", "--all"])
+    assert result.exit_code == 0, result.output
+    assert "invited-exact: 0 invites (was -1)" in result.output.splitlines()
+    assert runner.invoke(args=["assignments", "repair-invited-counts"]).exit_code != 0
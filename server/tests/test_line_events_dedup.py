@@ -0,0 +1,97 @@
+"""lineEvents doc ids (dedup_id) and commit: re-sent events overwrite, other windows do not.
+
+Writes go to a SQLite database in a temporary directory (server/storage/sqlite.py)."""
+import pytest
+
+from server import line_events
+from server.storage.sqlite import SQLiteClient
+
+
+@pytest.fixture
+def db(tmp_path):
+    return SQLiteClient(tmp_path / "dedup.sqlite3")
+
+
+def _doc(updated_at, content="x = 1", line=3, **fields):
+    return {
+        "assignmentId": "dedup",
+        "githubUsername": "student1",
+        "githubLink": "https://github.com/example/dedup",
+        "filePath": "main.py",
+        "lineNumber": line,
+        "lineContent": content,
+        "updatedAt": updated_at,
+        **fields,
+    }
+
+
+def _stored(db):
+    return {snap.id: snap.to_dict() for snap in db.collection(line_events.LINE_EVENTS_COLLECTION).stream()}
+
+
+def _commit(db, *docs, key=None):
+    return line_events.commit(db, [(line_events.dedup_id(doc, key), doc) for doc in docs])
+
+
+def test_resend_in_the_same_window_overwrites(db):
+    # 10:00:05 and 10:00:55 fall in the same 60 s window.
+    (first_id, error), = _commit(db, _doc("2026-03-02T10:00:05Z", "x = 1"))
+    assert error is None
+    (second_id, error), = _commit(db, _doc("2026-03-02T10:00:55.500Z", "x = 2"))
+    assert error is None
+    assert second_id == first_id
+    stored = _stored(db)
+    assert list(stored) == [first_id]
+    assert stored[first_id]["lineContent"] == "x = 2"
+    assert line_events.write_count(db, "dedup") == 2
+
+
+def test_resend_in_the_next_window_does_not_overwrite(db):
+    (first_id, _), = _commit(db, _doc("2026-03-02T10:00:55Z", "x = 1"))
+    (second_id, _), = _commit(db, _doc("2026-03-02T10:01:05Z", "x = 2"))
+    assert second_id != first_id
+    assert {doc["lineContent"] for doc in _stored(db).values()} == {"x = 1", "x = 2"}
+
+
+def test_window_is_taken_in_utc():
+    assert line_events.dedup_id(_doc("2026-03-02T11:00:30+01:00")) == line_events.dedup_id(_doc("2026-03-02T10:00:10Z"))
+    assert line_events.dedup_id(_doc("2026-03-02T10:00:10")) == line_events.dedup_id(_doc("2026-03-02T10:00:10Z"))
+
+
+def test_other_lines_users_and_runs_get_their_own_ids():
+    base = line_events.dedup_id(_doc("2026-03-02T10:00:05Z"))
+    assert line_events.dedup_id(_doc("2026-03-02T10:00:05Z", line=4)) != base
+    assert line_events.dedup_id(_doc("2026-03-02T10:00:05Z", githubUsername="student2")) != base
+    assert line_events.dedup_id(_doc("2026-03-02T10:00:05Z", lineNumberEnd=5)) != base
+
+
+def test_duplicate_ids_in_one_batch_are_coalesced(db):
+    results = _commit(db, _doc("2026-03-02T10:00:05Z", "x = 1"), _doc("2026-03-02T10:00:10Z", "x = 2"))
+    assert results[0] == results[1]
+    doc_id, error = results[0]
+    assert doc_id and error is None
+    assert _stored(db) == {doc_id: _doc("2026-03-02T10:00:10Z", "x = 2")}
+    # Only the last write per id is sent, so the write counter moves once.
+    assert line_events.write_count(db, "dedup") == 1
+
+
+def test_idempotency_key_never_overwrites_an_older_window(db):
+    key = "client-batch-7"
+    (first_id, _), = _commit(db, _doc("2026-03-02T10:00:05Z", "x = 1"), key=key)
+    (same_window_id, _), = _commit(db, _doc("2026-03-02T10:00:45Z", "x = 2", line=9), key=key)
+    (later_id, _), = _commit(db, _doc("2026-03-02T10:20:00Z", "x = 3"), key=key)
+    assert same_window_id == first_id  # the key identifies the event, whatever its line
+    assert later_id != first_id
+    stored = _stored(db)
+    assert stored[first_id]["lineContent"] == "x = 2"
+    assert stored[later_id]["lineContent"] == "x = 3"
+    # A key is never the id of the line-based dedup.
+    assert first_id != line_events.dedup_id(_doc("2026-03-02T10:00:05Z"))
+
+
+def test_unparseable_time_gets_an_auto_id_unless_keyed(db):
+    assert line_events.dedup_id(_doc("not a date")) is None
+    assert line_events.dedup_id(_doc("not a date"), "k") == line_events.dedup_id(_doc(""), "k")
+    results = _commit(db, _doc("not a date"), _doc("not a date"))
+    assert results[0][0] != results[1][0]
+    assert len(_stored(db)) == 2
@@ -0,0 +1,129 @@
+"""/progress ETags (304 on If-None-Match, new tags after writes) and ?since= filtering."""
+import json
+
+import pytest
+
+from server.bench.suite import create_assignment, dev_token, local_app
+from server.line_events import to_epoch_ms
+
+REPO = "https://github.com/example/progress-etag"
+AUTH = {"Authorization": f"Bearer {dev_token()}"}
+
+
+@pytest.fixture(scope="module")
+def app(tmp_path_factory):
+    return local_app(str(tmp_path_factory.mktemp("progress-etag")))
+
+
+@pytest.fixture(scope="module")
+def client(app):
+    return app.test_client()
+
+
+def _event(assignment_id, line, updated_at, content=None):
+    return {
+        "AssignmentID": assignment_id,
+        "GitHubName": "student1",
+        "GitHubLink": REPO,
+        "FilePath": "main.py",
+        "LineNumber": line,
+        "LineContent": content or f"line {line}",
+        "updatedAt": updated_at,
+    }
+
+
+def _citation(assignment_id, timestamp):
+    return {
+        "AssignmentID": assignment_id,
+        "GitHubName": "student1",
+        "type": "external source (manual)",
+        "source": "docs",
+        "text": "pasted from the docs",
+        "timestamp": timestamp,
+    }
+
+
+def _get(client, assignment_id, query="", etag=None):
+    headers = dict(AUTH)
+    if etag is not None:
+        headers["If-None-Match"] = f'"{etag}"'
+    return client.get(f"/api/v1/assignments/{assignment_id}/progress?{query}", headers=headers)
+
+
+def _etag(resp):
+    assert resp.status_code == 200, resp.get_data(as_text=True)
+    etag, _weak = resp.get_etag()
+    assert etag
+    return etag
+
+
+def test_unchanged_assignment_is_304(app, client):
+    create_assignment(app, "etag-unchanged")
+    resp = client.post("/api/v1/assignments/push", json=_event("etag-unchanged", 1, "2026-03-02T10:00:00Z"))
+    assert resp.status_code == 200
+    etag = _etag(_get(client, "etag-unchanged"))
+    resp = _get(client, "etag-unchanged", etag=etag)
+    assert resp.status_code == 304
+    assert resp.get_data() == b""
+    assert resp.get_etag()[0] == etag
+    # Each representation and query has its own tag.
+    assert _etag(_get(client, "etag-unchanged", "stream=1")) != etag
+    assert _etag(_get(client, "etag-unchanged", "view=summary")) != etag
+
+
+@pytest.mark.parametrize("write", ["new event", "overwrite", "citation"])
+def test_writes_change_the_etag(app, client, write):
+    assignment_id = f"etag-{write.replace(' ', '-')}"
+    create_assignment(app, assignment_id)
+    resp = client.post("/api/v1/assignments/push", json=_event(assignment_id, 1, "2026-03-02T10:00:00Z"))
+    assert resp.status_code == 200
+    etag = _etag(_get(client, assignment_id))
+    if write == "new event":
+        resp = client.post("/api/v1/assignments/push", json=_event(assignment_id, 2, "2026-03-02T10:00:10Z"))
+    elif write == "overwrite":
+        # Same line in the same dedup window: the doc is overwritten, counts and times stay.
+        resp = client.post("/api/v1/assignments/push", json=_event(assignment_id, 1, "2026-03-02T10:00:00Z", "x = 2"))
+    else:
+        resp = client.post("/api/v1/assignments/citations", json=_citation(assignment_id, "2026-03-02T10:00:05Z"))
+    assert resp.status_code in (200, 201)
+    resp = _get(client, assignment_id, etag=etag)
+    assert _etag(resp) != etag
+    assert resp.get_json()["sections"]
+
+
+def test_since_returns_only_sessions_with_later_activity(app, client):
+    assignment_id = "etag-since"
+    create_assignment(app, assignment_id)
+    events = [
+        _event(assignment_id, 1, "2026-03-02T10:00:00Z"),
+        _event(assignment_id, 2, "2026-03-02T10:05:00Z"),
+        _event(assignment_id, 3, "2026-03-02T12:00:00Z"),
+    ]
+    assert client.post("/api/v1/assignments/push/batch", json=events).status_code == 200
+    full = _get(client, assignment_id).get_json()
+    assert int(full["cursor"]) == to_epoch_ms("2026-03-02T12:00:00Z")
+    assert len(full["sections"][0]["sessions"]) == 2
+
+    def session_starts(query):
+        body = _get(client, assignment_id, query).get_json()
+        return [s["startTime"] for section in body["sections"] for s in section["sessions"]]
+
+    assert session_starts(f"since={full['cursor']}") == []
+    assert session_starts(f"since={to_epoch_ms('2026-03-02T11:00:00Z')}") == ["2026-03-02T12:00:00.000Z"]
+    # A citation attached to the first session is activity in it.
+    resp = client.post("/api/v1/assignments/citations", json=_citation(assignment_id, "2026-03-02T10:06:00Z"))
+    assert resp.status_code in (200, 201)
+    assert session_starts(f"since={to_epoch_ms('2026-03-02T10:05:30Z')}") == [
+        "2026-03-02T10:00:00.000Z",
+        "2026-03-02T12:00:00.000Z",
+    ]
+    # The streamed form filters the same way.
+    resp = _get(client, assignment_id, f"stream=1&since={to_epoch_ms('2026-03-02T11:00:00Z')}")
+    lines = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+    assert [line["startTime"] for line in lines if line["type"] == "session"] == ["2026-03-02T12:00:00.000Z"]
+
+
+def test_since_must_be_a_cursor(app, client):
+    create_assignment(app, "etag-bad-since")
+    resp = _get(client, "etag-bad-since", "since=yesterday")
+    assert resp.status_code == 400
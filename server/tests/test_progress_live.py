@@ -0,0 +1,101 @@
+"""Live /progress builds (no session store): one ordered pass over the assignment's lineEvents.
+
+Runs the app on the SQLite backend in a temporary directory with dev tokens, like the
+benchmarks (server/bench)."""
+import json
+
+import pytest
+
+from server.bench.suite import create_assignment, dev_token, local_app
+from server.storage import sqlite
+
+REPO_A = "https://github.com/example/live-a"
+REPO_B = "https://github.com/example/live-b"
+
+
+@pytest.fixture(scope="module")
+def app(tmp_path_factory):
+    return local_app(str(tmp_path_factory.mktemp("live")), PROGRESS_CACHE_SIZE=0)
+
+
+@pytest.fixture(scope="module")
+def client(app):
+    return app.test_client()
+
+
+def _event(assignment_id, user, repo, line, updated_at):
+    return {
+        "AssignmentID": assignment_id,
+        "GitHubName": user,
+        "GitHubLink": repo,
+        "FilePath": "main.py",
+        "LineNumber": line,
+        "LineContent": f"line {line}",
+        "updatedAt": updated_at,
+    }
+
+
+def _push_timeline(client, assignment_id):
+    # alice works in A twice; carol in B in between; bob joins A only at 11:00.
+    events = [
+        _event(assignment_id, "alice", REPO_A, 1, "2026-03-02T10:00:00Z"),
+        _event(assignment_id, "alice", REPO_A, 2, "2026-03-02T10:30:00Z"),
+        _event(assignment_id, "carol", REPO_B, 1, "2026-03-02T10:45:00Z"),
+        _event(assignment_id, "bob", REPO_A, 3, "2026-03-02T11:00:00Z"),
+    ]
+    assert client.post("/api/v1/assignments/push/batch", json=events).status_code == 200
+    citation = {
+        "AssignmentID": assignment_id,
+        "GitHubName": "alice",
+        "type": "external source (manual)",
+        "source": "docs",
+        "text": "pasted from the docs",
+        "timestamp": "2026-03-02T10:00:30Z",
+    }
+    assert client.post("/api/v1/assignments/citations", json=citation).status_code in (200, 201)
+    return len(events)
+
+
+def _line_event_reads(monkeypatch):
+    """Counts the lineEvents docs read by unlimited streams (version() reads only the newest)."""
+    reads = {"lineEvents": 0}
+    stream = sqlite.Query.stream
+
+    def counting_stream(self, transaction=None):
+        for snap in stream(self, transaction=transaction):
+            if self._collection == "lineEvents" and self._limit is None:
+                reads["lineEvents"] += 1
+            yield snap
+
+    monkeypatch.setattr(sqlite.Query, "stream", counting_stream)
+    return reads
+
+
+def test_build_reads_each_event_once(app, client, monkeypatch):
+    assignment_id = "live-single-pass"
+    create_assignment(app, assignment_id)
+    n_events = _push_timeline(client, assignment_id)
+    reads = _line_event_reads(monkeypatch)
+
+    resp = client.get(f"/api/v1/assignments/{assignment_id}/progress", headers={"Authorization": f"Bearer {dev_token()}"})
+    assert resp.status_code == 200, resp.get_data(as_text=True)
+    assert reads["lineEvents"] == n_events
+    sections = {section["repoLink"]: section for section in resp.get_json()["sections"]}
+    assert sections[REPO_A]["members"] == ["alice", "bob"]
+    assert [s["eventCount"] for s in sections[REPO_A]["sessions"]] == [1, 1, 1]
+    assert [c["text"] for c in sections[REPO_A]["sessions"][0]["citations"]] == ["pasted from the docs"]
+    assert sections[REPO_B]["members"] == ["carol"]
+
+
+def test_stream_repeats_a_section_line_when_its_members_grow(app, client):
+    assignment_id = "live-members-grow"
+    create_assignment(app, assignment_id)
+    _push_timeline(client, assignment_id)
+
+    resp = client.get(f"/api/v1/assignments/{assignment_id}/progress?stream=1",
+                      headers={"Authorization": f"Bearer {dev_token()}"})
+    assert resp.status_code == 200
+    lines = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+    headers = [line for line in lines if line["type"] == "section" and line["repoLink"] == REPO_A]
+    assert [h["members"] for h in headers] == [["alice"], ["alice", "bob"]]
+    assert lines[-1]["type"] == "end" and lines[-1]["sections"] == 2
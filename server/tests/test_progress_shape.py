@@ -0,0 +1,128 @@
+"""/progress response shape: keys and the 'YYYY-MM-DDTHH:MM:SS.mmmZ' timestamps (line_events.iso_ms).
+
+Events are pushed with the timestamp forms clients send (no fraction, tenths, microseconds, no
+zone); sessions and details always come back in the canonical millisecond form, on the live
+path and on the session store (PROGRESS_SESSION_STORE)."""
+import json
+import re
+
+import pytest
+
+from server.bench.suite import create_assignment, dev_token, local_app
+
+REPO = "https://github.com/example/progress-shape"
+AUTH = {"Authorization": f"Bearer {dev_token()}"}
+ISO_MS = re.compile(r"^\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d\.\d{3}Z$")
+SECTION_KEYS = {"id", "label", "members", "repoLink", "sessions"}
+SESSION_KEYS = {"id", "startTime", "endTime", "eventCount", "locChanged", "githubUsernames", "aiUsed"}
+DETAIL_KEYS = {"timestamp", "githubUsername", "filePath", "lineNumber", "lineContent", "locChanged", "aiUsed"}
+
+
+@pytest.fixture(scope="module", params=["live", "store"])
+def app(request, tmp_path_factory):
+    return local_app(
+        str(tmp_path_factory.mktemp(f"progress-shape-{request.param}")),
+        PROGRESS_SESSION_STORE=request.param == "store",
+        PROGRESS_CACHE_SIZE=0,
+    )
+
+
+@pytest.fixture(scope="module")
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture(scope="module")
+def assignment_id(app, client):
+    assignment_id = f"shape-{'store' if app.config['PROGRESS_SESSION_STORE'] else 'live'}"
+    create_assignment(app, assignment_id)
+
+    def event(line, updated_at):
+        return {
+            "AssignmentID": assignment_id,
+            "GitHubName": "student1",
+            "GitHubLink": REPO,
+            "FilePath": "main.py",
+            "LineNumber": line,
+            "LineContent": f"line {line}",
+            "updatedAt": updated_at,
+        }
+
+    events = [
+        event(1, "2026-03-02T10:00:00Z"),
+        event(2, "2026-03-02T10:00:05.5Z"),  # merged with line 1 into one run detail
+        event(3, "2026-03-02T10:02:07.123456Z"),
+        event(9, "2026-03-02T10:03:00"),
+    ]
+    resp = client.post("/api/v1/assignments/push/batch", json=events)
+    assert resp.status_code == 200, resp.get_data(as_text=True)
+    resp = client.post("/api/v1/assignments/citations", json={
+        "AssignmentID": assignment_id,
+        "GitHubName": "student1",
+        "type": "external source (manual)",
+        "source": "docs",
+        "text": "pasted from the docs",
+        "timestamp": "2026-03-02T10:01:00Z",
+    })
+    assert resp.status_code in (200, 201)
+    return assignment_id
+
+
+def _get(client, assignment_id, path="progress", query=""):
+    resp = client.get(f"/api/v1/assignments/{assignment_id}/{path}?{query}", headers=AUTH)
+    assert resp.status_code == 200, resp.get_data(as_text=True)
+    return resp
+
+
+def _details(details):
+    return [(d["timestamp"], d["lineNumber"], d.get("lineNumberEnd"), d["locChanged"]) for d in details]
+
+
+EXPECTED_DETAILS = [
+    ("2026-03-02T10:00:00.000Z", 1, 2, 2),
+    ("2026-03-02T10:02:07.123Z", 3, None, 1),
+    ("2026-03-02T10:03:00.000Z", 9, None, 1),
+]
+
+
+def test_full_response_shape(client, assignment_id):
+    body = _get(client, assignment_id).get_json()
+    assert set(body) == {"cursor", "sections"}
+    assert body["cursor"] == "1772445780000"  # the last event, in epoch ms
+    section, = body["sections"]
+    assert set(section) == SECTION_KEYS
+    assert (section["repoLink"], section["members"]) == (REPO, ["student1"])
+    session, = section["sessions"]
+    assert set(session) == SESSION_KEYS | {"details", "citations"}
+    assert session["id"] == f"{section['id']}-1772445600000"
+    assert (session["startTime"], session["endTime"]) == ("2026-03-02T10:00:00.000Z", "2026-03-02T10:03:00.000Z")
+    assert (session["eventCount"], session["locChanged"], session["githubUsernames"]) == (4, 4, ["student1"])
+    for detail in session["details"]:
+        assert DETAIL_KEYS <= set(detail) <= DETAIL_KEYS | {"lineNumberEnd"}
+        assert ISO_MS.match(detail["timestamp"])
+    assert _details(session["details"]) == EXPECTED_DETAILS
+    assert session["details"][0]["lineContent"] == "line 1\nline 2"
+    # Citations keep the timestamp they were stored with.
+    assert [c["timestamp"] for c in session["citations"]] == ["2026-03-02T10:01:00Z"]
+
+
+def test_summary_and_details_shape(client, assignment_id):
+    section, = _get(client, assignment_id, query="view=summary").get_json()["sections"]
+    session, = section["sessions"]
+    assert set(session) == SESSION_KEYS | {"citationCount"}
+    assert (session["startTime"], session["endTime"]) == ("2026-03-02T10:00:00.000Z", "2026-03-02T10:03:00.000Z")
+    assert session["citationCount"] == 1
+
+    details = _get(client, assignment_id, f"progress/sessions/{session['id']}/details").get_json()
+    assert set(details) == {"id", "sectionId", "details", "citations"}
+    assert (details["id"], details["sectionId"]) == (session["id"], section["id"])
+    assert _details(details["details"]) == EXPECTED_DETAILS
+
+
+def test_stream_shape(client, assignment_id):
+    body = _get(client, assignment_id, query="stream=1").get_data(as_text=True)
+    lines = [json.loads(line) for line in body.splitlines()]
+    assert [line["type"] for line in lines] == ["section", "session", "end"]
+    session = lines[1]
+    assert (session["startTime"], session["endTime"]) == ("2026-03-02T10:00:00.000Z", "2026-03-02T10:03:00.000Z")
+    assert _details(session["details"]) == EXPECTED_DETAILS
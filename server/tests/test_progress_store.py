@@ -0,0 +1,64 @@
+"""/progress on the session store (PROGRESS_SESSION_STORE) with a from / to window.
+
+Runs the app on the SQLite backend in a temporary directory with dev tokens, like the
+benchmarks (server/bench)."""
+import pytest
+
+from server.bench.suite import create_assignment, dev_token, local_app
+
+REPO = "https://github.com/example/store-window"
+
+
+@pytest.fixture(scope="module")
+def app(tmp_path_factory):
+    return local_app(str(tmp_path_factory.mktemp("store")), PROGRESS_SESSION_STORE=True, PROGRESS_CACHE_SIZE=0)
+
+
+@pytest.fixture(scope="module")
+def client(app):
+    return app.test_client()
+
+
+def _event(assignment_id, line, updated_at):
+    return {
+        "AssignmentID": assignment_id,
+        "GitHubName": "student1",
+        "GitHubLink": REPO,
+        "FilePath": "main.py",
+        "LineNumber": line,
+        "LineContent": f"line {line}",
+        "updatedAt": updated_at,
+    }
+
+
+def _progress(client, assignment_id, query):
+    resp = client.get(f"/api/v1/assignments/{assignment_id}/progress?{query}",
+                      headers={"Authorization": f"Bearer {dev_token()}"})
+    assert resp.status_code == 200, resp.get_data(as_text=True)
+    return [s for section in resp.get_json()["sections"] for s in section["sessions"]]
+
+
+def test_window_keeps_citations_of_a_stored_session_straddling_from(app, client):
+    assignment_id = "store-window-straddle"
+    create_assignment(app, assignment_id)
+    # One session 10:00-10:08; the window starts inside it, after the citation.
+    events = [_event(assignment_id, i, f"2026-03-02T10:0{i}:00Z") for i in range(0, 9, 2)]
+    assert client.post("/api/v1/assignments/push/batch", json=events).status_code == 200
+    citation = {
+        "AssignmentID": assignment_id,
+        "GitHubName": "student1",
+        "type": "external source (manual)",
+        "source": "docs",
+        "text": "pasted from the docs",
+        "timestamp": "2026-03-02T10:01:00Z",
+    }
+    assert client.post("/api/v1/assignments/citations", json=citation).status_code in (200, 201)
+
+    window = "from=2026-03-02T10:05:00Z&to=2026-03-02T11:00:00Z"
+    sessions = _progress(client, assignment_id, window)
+    assert len(sessions) == 1
+    assert sessions[0]["startTime"] == "2026-03-02T10:00:00.000Z"
+    assert [c["text"] for c in sessions[0]["citations"]] == ["pasted from the docs"]
+
+    summary = _progress(client, assignment_id, window + "&view=summary")
+    assert [s["citationCount"] for s in summary] == [1]
@@ -0,0 +1,110 @@
+"""POST /push/batch: per-item results, request-level errors, and live / rejected assignments mixed."""
+import pytest
+
+from server.bench.suite import create_assignment, dev_token, local_app
+
+REPO = "https://github.com/example/push-batch"
+URL = "/api/v1/assignments/push/batch"
+
+
+@pytest.fixture(scope="module")
+def app(tmp_path_factory):
+    return local_app(str(tmp_path_factory.mktemp("push-batch")), PROGRESS_CACHE_SIZE=0)
+
+
+@pytest.fixture(scope="module")
+def client(app):
+    return app.test_client()
+
+
+def _event(assignment_id, line, updated_at="2026-03-02T10:00:00Z"):
+    return {
+        "AssignmentID": assignment_id,
+        "GitHubName": "student1",
+        "GitHubLink": REPO,
+        "FilePath": "main.py",
+        "LineNumber": line,
+        "LineContent": f"line {line}",
+        "updatedAt": updated_at,
+    }
+
+
+def _event_count(client, assignment_id):
+    resp = client.get(f"/api/v1/assignments/{assignment_id}/progress",
+                      headers={"Authorization": f"Bearer {dev_token()}"})
+    assert resp.status_code == 200, resp.get_data(as_text=True)
+    return sum(s["eventCount"] for section in resp.get_json()["sections"] for s in section["sessions"])
+
+
+def test_invalid_items_fail_alone(app, client):
+    create_assignment(app, "batch-partial")
+    no_line = {k: v for k, v in _event("batch-partial", 2).items() if k != "LineNumber"}
+    bad_line = {**_event("batch-partial", 3), "LineNumber": "three"}
+    resp = client.post(URL, json=[_event("batch-partial", 1), no_line, bad_line, "not an object"])
+    assert resp.status_code == 200
+    body = resp.get_json()
+    assert (body["ok"], body["accepted"], body["rejected"]) == (False, 1, 3)
+    results = body["results"]
+    assert [r["index"] for r in results] == [0, 1, 2, 3]
+    assert results[0]["ok"] and results[0]["id"]
+    assert results[1] == {"index": 1, "ok": False, "error": "Missing fields", "missing": ["LineNumber"]}
+    assert results[2]["error"] == "LineNumber and LineNumberEnd must be integers"
+    assert results[3]["error"] == "Expected JSON object"
+    assert _event_count(client, "batch-partial") == 1
+
+
+def test_every_item_invalid_is_400(client):
+    resp = client.post(URL, json=[{"AssignmentID": "batch-partial"}])
+    assert resp.status_code == 400
+    assert resp.get_json()["accepted"] == 0
+
+
+@pytest.mark.parametrize("body", [{"events": "not a list"}, {"event": []}, "just a string", 42])
+def test_malformed_body_is_400(client, body):
+    resp = client.post(URL, json=body)
+    assert resp.status_code == 400
+    assert resp.get_json() == {"error": "Expected JSON array of events"}
+
+
+def test_invalid_json_is_400(client):
+    resp = client.post(URL, data="[{", content_type="application/json")
+    assert resp.status_code == 400
+
+
+def test_oversized_batch_is_413(client):
+    from server.api.routes.assignments import PUSH_BATCH_MAX_EVENTS
+
+    resp = client.post(URL, json={"events": [{}] * (PUSH_BATCH_MAX_EVENTS + 1)})
+    assert resp.status_code == 413
+    assert resp.get_json()["received"] == PUSH_BATCH_MAX_EVENTS + 1
+
+
+def test_live_and_rejected_assignments_in_one_batch(app, client):
+    create_assignment(app, "batch-live")
+    create_assignment(app, "batch-deleted")
+    resp = client.delete("/api/v1/assignments/batch-deleted", headers={"Authorization": f"Bearer {dev_token()}"})
+    assert resp.status_code == 202
+    events = [
+        _event("batch-live", 1),
+        _event("batch-deleted", 1),
+        _event("batch-missing", 1),
+        _event("batch-live", 2),
+    ]
+    resp = client.post(URL, json=events)
+    assert resp.status_code == 200
+    results = resp.get_json()["results"]
+    assert [r["ok"] for r in results] == [True, False, False, True]
+    assert results[1]["error"] == "Assignment deleted"
+    assert results[2]["error"] == "Assignment not found"
+    assert _event_count(client, "batch-live") == 2
+
+
+@pytest.mark.parametrize("assignment_id, status", [("batch-deleted-only", 410), ("batch-missing-only", 404)])
+def test_batch_only_for_a_rejected_assignment(app, client, assignment_id, status):
+    if status == 410:
+        create_assignment(app, assignment_id)
+        resp = client.delete(f"/api/v1/assignments/{assignment_id}", headers={"Authorization": f"Bearer {dev_token()}"})
+        assert resp.status_code == 202
+    resp = client.post(URL, json=[_event(assignment_id, 1), _event(assignment_id, 2)])
+    assert resp.status_code == status
+    assert resp.get_json()["rejected"] == 2
@@ -0,0 +1,99 @@
+"""SessionStore: sessions applied in out-of-order increments match a rebuild and the live path.
+
+The store runs on a SQLite database in a temporary directory (server/storage/sqlite.py)."""
+import random
+
+import pytest
+
+from server import line_events, progress
+from server.line_events import iso_ms
+from server.session_store import SessionStore, session_doc_id
+from server.storage.sqlite import SQLiteClient
+
+ASSIGNMENT = "store-apply"
+REPOS = ["https://github.com/example/store-a", "https://github.com/example/store-b"]
+T0 = 1_772_445_600_000  # 2026-03-02T10:00:00Z
+
+
+@pytest.fixture
+def store(tmp_path):
+    return progress.session_store(SQLiteClient(tmp_path / "store.sqlite3"))
+
+
+def _event(i, minute, repo=0, user="student1"):
+    return f"e{i:04d}", {
+        "assignmentId": ASSIGNMENT,
+        "githubUsername": user,
+        "githubLink": REPOS[repo],
+        "filePath": "main.py",
+        "lineNumber": i,
+        "lineContent": f"line {i}",
+        "updatedAt": iso_ms(T0 + int(minute * 60_000)),
+    }
+
+
+def _stored(store):
+    return sorted((doc["groupKey"], doc["startAt"], SessionStore.event_ids(doc)) for doc in store.load(ASSIGNMENT))
+
+
+def _live(events):
+    """Sessions as the live /progress path builds them: each repo group sessionized on its own."""
+    records = line_events.records(sorted(events, key=lambda item: (item[1]["updatedAt"], item[0])))
+    sessions = []
+    for repo in REPOS:
+        prefix = session_doc_id(ASSIGNMENT, repo, "")
+        for session in progress.events_to_sessions([r for r in records if r.repo == repo], session_id_prefix=prefix):
+            start = int(session["id"][len(prefix):])
+            sessions.append((repo, start, [r.id for r in session["details"]]))
+    return sorted(sessions)
+
+
+def _rebuilt(tmp_path, events):
+    store = progress.session_store(SQLiteClient(tmp_path / "rebuilt.sqlite3"))
+    store.rebuild(ASSIGNMENT, events)
+    return _stored(store)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_out_of_order_increments_match_rebuild_and_live(store, tmp_path, seed):
+    rng = random.Random(seed)
+    minutes = sorted(rng.uniform(0, 240) for _ in range(150))
+    events = [
+        _event(i, m, repo=rng.randrange(2), user=rng.choice(["student1", "student2"]))
+        for i, m in enumerate(minutes)
+    ]
+    shuffled = list(events)
+    rng.shuffle(shuffled)
+    for start in range(0, len(shuffled), 30):
+        store.apply(shuffled[start:start + 30])
+    assert _stored(store) == _rebuilt(tmp_path, events) == _live(events)
+
+
+def test_event_bridging_two_stored_sessions(store, tmp_path):
+    # 10:00-10:05 and 10:20-10:25: a 15 minute gap, two sessions.
+    events = [_event(0, 0), _event(1, 5), _event(2, 20), _event(3, 25)]
+    store.apply(events[2:])
+    store.apply(events[:2])
+    assert [start for _key, start, _ids in _stored(store)] == [T0, T0 + 20 * 60_000]
+    # 10:12 is within the gap of both neighbours: the sessions merge until max-span splits them.
+    events.append(_event(4, 12))
+    store.apply(events[-1:])
+    stored = _stored(store)
+    assert stored == _rebuilt(tmp_path, events) == _live(events)
+    assert [ids for _key, _start, ids in stored] == [["e0000", "e0001", "e0004"], ["e0002", "e0003"]]
+    # 10:16 joins the first session's gap-free run but would stretch it past 15 minutes.
+    events.append(_event(5, 16))
+    store.apply(events[-1:])
+    assert _stored(store) == _live(events)
+
+
+def test_group_marked_needs_rebuild_is_fixed_by_rebuild(store, tmp_path):
+    events = [_event(i, i * 2, repo=i % 2) for i in range(10)]
+    store.apply(events[:6])
+    # The update with the last events failed: they are missing until a rebuild.
+    store.mark_failed(events[6:], RuntimeError("transaction aborted"))
+    assert store.needs_rebuild(ASSIGNMENT) == [ASSIGNMENT]
+    assert _stored(store) != _live(events)
+    store.rebuild(ASSIGNMENT, events)
+    assert store.needs_rebuild(ASSIGNMENT) == []
+    assert _stored(store) == _rebuilt(tmp_path, events) == _live(events)
@@ -0,0 +1,98 @@
+"""The Python and NumPy sessionize engines find the same sessions, on seeded random timelines."""
+import random
+
+import pytest
+
+from server import line_events, progress, sessionize
+from server.line_events import iso_ms, to_epoch_us
+
+pytestmark = pytest.mark.skipif(not sessionize.numpy_available(), reason="NumPy is not installed")
+
+GAP = progress.SESSION_GAP_MINUTES * 60_000
+MAX_SPAN = progress.SESSION_MAX_MINUTES * 60_000
+SEEDS = range(20)
+
+
+def _timeline(rng, n):
+    """Sorted epoch ms times whose steps hit the edge cases: repeats, exactly the gap, just over it."""
+    steps = [0, 1, 1_000, 60_000, GAP - 1, GAP, GAP + 1, MAX_SPAN, MAX_SPAN + 1]
+    t = 1_767_225_600_000
+    times = []
+    for _ in range(n):
+        t += rng.choice(steps) if rng.random() < 0.3 else rng.randrange(0, GAP + 60_000)
+        times.append(t)
+    return times
+
+
+def _sessionizer_sessions(times, engine):
+    splitter = sessionize.Sessionizer(GAP, MAX_SPAN, engine=engine)
+    sessions = []
+    for i, t in enumerate(times):
+        sessions.extend(splitter.push(t, i))
+    sessions.extend(splitter.finish())
+    return sessions
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_engines_find_the_same_starts(seed):
+    rng = random.Random(seed)
+    times = _timeline(rng, rng.randrange(1, 400))
+    expected = sessionize.session_starts_python(times, GAP, MAX_SPAN)
+    assert sessionize.session_starts_numpy(times, GAP, MAX_SPAN) == expected
+    bounds = list(zip(expected, expected[1:] + [len(times)]))
+    assert _sessionizer_sessions(times, "python") == [list(range(a, b)) for a, b in bounds]
+    assert _sessionizer_sessions(times, "numpy") == [list(range(a, b)) for a, b in bounds]
+
+
+def test_gap_and_max_span_are_inclusive():
+    t = 1_767_225_600_000
+    # Exactly the gap apart: same session. One ms more: a new one.
+    assert sessionize.session_starts_numpy([t, t + GAP, t + 2 * GAP + 1], GAP, MAX_SPAN) == [0, 2]
+    # A session may span exactly max_span; the event after that starts the next one.
+    times = [t + i * 60_000 for i in range(progress.SESSION_MAX_MINUTES + 2)]
+    assert sessionize.session_starts_python(times, GAP, MAX_SPAN) == [0, progress.SESSION_MAX_MINUTES + 1]
+    assert sessionize.session_starts_numpy(times, GAP, MAX_SPAN) == [0, progress.SESSION_MAX_MINUTES + 1]
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_unsorted_times_fall_back_to_the_python_loop(seed):
+    rng = random.Random(seed)
+    times = _timeline(rng, 50)
+    rng.shuffle(times)
+    expected = sessionize.session_starts_python(times, GAP, MAX_SPAN)
+    assert sessionize.session_starts_numpy(times, GAP, MAX_SPAN) == expected
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_events_to_sessions_agree_with_unparseable_timestamps(seed):
+    rng = random.Random(seed)
+    stamps = [iso_ms(t) for t in _timeline(rng, 200)]
+    for i in rng.sample(range(len(stamps)), 20):
+        stamps[i] = rng.choice([None, "", "not a date", "2026-13-45T99:00:00Z"])
+    rng.shuffle(stamps)
+    records = line_events.records(
+        (f"e{i}", {"githubUsername": "alice", "filePath": "main.py", "lineNumber": i, "updatedAt": s})
+        for i, s in enumerate(stamps)
+    )
+    sessions = {
+        engine: [(s["id"], [r.id for r in s["details"]]) for s in progress.events_to_sessions(records, engine=engine)]
+        for engine in sessionize.ENGINES
+    }
+    assert sessions["numpy"] == sessions["python"]
+    assert sum(len(ids) for _sid, ids in sessions["python"]) == sum(r.ts is not None for r in records) == 180
+
+
+def test_epoch_us_matches_parsing_one_by_one():
+    values = [
+        "2026-03-02T10:00:00Z",
+        "2026-03-02T10:00:00.123Z",
+        "2026-03-02T10:00:00.123456Z",
+        "2026-03-02T11:00:00+01:00",
+        "2026-03-02T10:00:00",
+        None,
+        "",
+    ]
+    assert sessionize.epoch_us(values, to_epoch_us) == [to_epoch_us(v) for v in values]
+    # One invalid canonical-looking string sends the whole list through parse_one.
+    values.append("2026-13-45T99:00:00Z")
+    assert sessionize.epoch_us(values, to_epoch_us) == [to_epoch_us(v) for v in values]
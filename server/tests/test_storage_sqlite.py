@@ -0,0 +1,161 @@
+"""The SQLite storage engine (server/storage/sqlite.py) keeps the Firestore semantics the routes rely on."""
+import threading
+
+import pytest
+
+from server.storage import DESCENDING, Increment, count, run_transaction
+from server.storage.sqlite import Conflict, NotFound, SQLiteClient, Transaction
+
+
+@pytest.fixture
+def db(tmp_path):
+    return SQLiteClient(tmp_path / "storage.sqlite3")
+
+
+@pytest.fixture
+def scores(db):
+    col = db.collection("scores")
+    batch = db.batch()
+    for doc_id, doc in {
+        "a": {"group": "x", "score": 3, "name": "ann"},
+        "b": {"group": "x", "score": 1, "name": "bob"},
+        "c": {"group": "y", "score": 3, "name": "cat"},
+        "d": {"group": "y", "name": "dan"},  # no score
+    }.items():
+        batch.set(col.document(doc_id), doc)
+    batch.commit()
+    return col
+
+
+def _ids(query):
+    return [snap.id for snap in query.stream()]
+
+
+def test_where_operators(scores):
+    assert _ids(scores.where("group", "==", "x")) == ["a", "b"]
+    assert _ids(scores.where("score", "<", 3)) == ["b"]
+    assert _ids(scores.where("score", "<=", 3)) == ["a", "b", "c"]
+    assert _ids(scores.where("score", ">", 1)) == ["a", "c"]
+    assert _ids(scores.where("score", ">=", 1).where("group", "==", "y")) == ["c"]
+    assert _ids(scores.where("name", "in", ["dan", "ann", "eve"])) == ["a", "d"]
+    assert _ids(scores.where("name", "in", [])) == []
+    with pytest.raises(ValueError):
+        scores.where("score", "!=", 1)
+
+
+def test_order_by_skips_missing_fields_and_breaks_ties_by_id(scores):
+    assert _ids(scores.order_by("score")) == ["b", "a", "c"]
+    assert _ids(scores.order_by("score", direction=DESCENDING)) == ["a", "c", "b"]
+    assert _ids(scores.order_by("group", direction=DESCENDING).order_by("name")) == ["c", "d", "a", "b"]
+    assert _ids(scores.order_by("score").limit(2)) == ["b", "a"]
+
+
+def test_select_projects_fields(scores):
+    snap = next(scores.where("name", "==", "ann").select(["score"]).stream())
+    assert snap.to_dict() == {"score": 3}
+    assert snap.get("score") == 3
+    with pytest.raises(KeyError):
+        snap.get("name")
+    assert [s.to_dict() for s in scores.select([]).limit(1).stream()] == [{}]
+
+
+def test_count_aggregation(scores):
+    assert count(scores) == 4
+    assert count(scores.where("group", "==", "y")) == 2
+    assert count(scores.where("score", ">", 5)) == 0
+
+
+def test_get_all_keeps_reference_order(db, scores):
+    other = db.collection("others")
+    other.document("z").set({"v": 1})
+    refs = [scores.document("c"), other.document("z"), scores.document("missing"), scores.document("a")]
+    snaps = list(db.get_all(refs, field_paths=["name"]))
+    assert [(s.id, s.exists) for s in snaps] == [("c", True), ("z", True), ("missing", False), ("a", True)]
+    assert snaps[0].to_dict() == {"name": "cat"}
+    assert snaps[1].to_dict() == {}
+    assert snaps[2].to_dict() is None
+
+
+def test_increment_with_merge(db):
+    ref = db.collection("counters").document("c")
+    ref.set({"n": Increment(2), "meta": {"a": 1}}, merge=True)  # missing doc: counts from 0
+    ref.set({"n": Increment(3), "meta": {"b": 2}}, merge=True)
+    assert ref.get().to_dict() == {"n": 5, "meta": {"a": 1, "b": 2}}
+    ref.update({"meta.a": Increment(1), "label": "x"})
+    assert ref.get().to_dict() == {"n": 5, "meta": {"a": 2, "b": 2}, "label": "x"}
+    ref.set({"n": Increment(1)})  # without merge the document is replaced
+    assert ref.get().to_dict() == {"n": 1}
+    ref.set({"n": "text"}, merge=True)
+    ref.set({"n": Increment(4)}, merge=True)  # a non-number counts as 0
+    assert ref.get(field_paths=["n"]).to_dict() == {"n": 4}
+
+
+def test_create_update_and_delete(db):
+    col = db.collection("docs")
+    _written_at, ref = col.add({"v": 1})
+    assert len(ref.id) == 20 and ref.get().exists
+    with pytest.raises(Conflict):
+        col.document(ref.id).create({"v": 2})
+    with pytest.raises(NotFound):
+        col.document("nope").update({"v": 2})
+    ref.delete()
+    assert not ref.get().exists
+    with pytest.raises(ValueError):
+        db.collection("bad name")
+
+
+def test_batch_is_atomic(db):
+    col = db.collection("docs")
+    col.document("kept").set({"v": 1})
+    batch = db.batch()
+    batch.set(col.document("new"), {"v": 1})
+    batch.delete(col.document("kept"))
+    batch.update(col.document("nope"), {"v": 2})
+    with pytest.raises(NotFound):
+        batch.commit()
+    assert not col.document("new").get().exists
+    assert col.document("kept").get().exists
+
+
+def test_transaction_commits_queued_writes_or_nothing(db):
+    col = db.collection("accounts")
+    col.document("a").set({"balance": 10})
+
+    def move(transaction):
+        balance = col.document("a").get(transaction=transaction).to_dict()["balance"]
+        transaction.set(col.document("a"), {"balance": balance - 4})
+        transaction.set(col.document("b"), {"balance": 4})
+        return balance
+
+    assert run_transaction(db, move) == 10
+    assert [s.to_dict()["balance"] for s in db.get_all([col.document("a"), col.document("b")])] == [6, 4]
+
+    def fail(transaction):
+        transaction.set(col.document("a"), {"balance": 0})
+        raise RuntimeError("abort")
+
+    with pytest.raises(RuntimeError):
+        run_transaction(db, fail)
+    assert col.document("a").get().to_dict() == {"balance": 6}
+    with pytest.raises(RuntimeError):
+        Transaction(db).commit()
+
+
+def test_concurrent_transactions_do_not_lose_updates(db):
+    ref = db.collection("counters").document("shared")
+    ref.set({"n": 0})
+
+    def bump(transaction):
+        n = ref.get(transaction=transaction).to_dict()["n"]
+        transaction.update(ref, {"n": n + 1})
+
+    def worker():
+        for _ in range(25):
+            run_transaction(db, bump)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert ref.get().to_dict() == {"n": 100}
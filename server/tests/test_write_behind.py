@@ -0,0 +1,122 @@
+"""Write-behind ingestion (PUSH_WRITE_BEHIND): queued writes and what the flusher does with them.
+
+The line event queue is process-wide: each test module starts its own, bound to its app."""
+import time
+
+import pytest
+
+from server import ingest_queue
+from server.bench.suite import create_assignment, dev_token, local_app
+
+REPO = "https://github.com/example/write-behind"
+
+
+@pytest.fixture(scope="module")
+def app(tmp_path_factory):
+    # Flushes only once two events are queued (or after a minute), so tests control them.
+    app = local_app(
+        str(tmp_path_factory.mktemp("write-behind")),
+        PUSH_WRITE_BEHIND=True,
+        PUSH_QUEUE_BATCH_SIZE=2,
+        PUSH_QUEUE_FLUSH_SECONDS=60,
+        PUSH_QUEUE_MAXSIZE=3,
+        PUSH_QUEUE_RETRY_AFTER_SECONDS=7,
+        PROGRESS_CACHE_SIZE=0,
+    )
+    previous = ingest_queue._line_event_queue
+    ingest_queue._line_event_queue = None
+    yield app
+    q = ingest_queue._line_event_queue
+    if q is not None:
+        q.stop()
+    ingest_queue._line_event_queue = previous
+
+
+@pytest.fixture(scope="module")
+def client(app):
+    return app.test_client()
+
+
+def _event(assignment_id, line):
+    return {
+        "AssignmentID": assignment_id,
+        "GitHubName": "student1",
+        "GitHubLink": REPO,
+        "FilePath": "main.py",
+        "LineNumber": line,
+        "LineContent": f"line {line}",
+        "updatedAt": "2026-03-02T10:00:00Z",
+    }
+
+
+def _wait_for_flushes(q, n, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while q.stats()["flushes"] < n:
+        assert time.monotonic() < deadline, q.stats()
+        time.sleep(0.01)
+    return q.stats()
+
+
+def _event_count(client, assignment_id):
+    resp = client.get(f"/api/v1/assignments/{assignment_id}/progress",
+                      headers={"Authorization": f"Bearer {dev_token()}"})
+    assert resp.status_code == 200, resp.get_data(as_text=True)
+    return sum(s["eventCount"] for section in resp.get_json()["sections"] for s in section["sessions"])
+
+
+def test_events_of_an_assignment_deleted_while_queued_are_rejected_not_retried(app, client):
+    create_assignment(app, "wb-deleted")
+    create_assignment(app, "wb-live")
+    assert client.post("/api/v1/assignments/push", json=_event("wb-deleted", 1)).status_code == 202
+    q = ingest_queue.get_line_event_queue()
+    before = q.stats()
+    resp = client.delete("/api/v1/assignments/wb-deleted", headers={"Authorization": f"Bearer {dev_token()}"})
+    assert resp.status_code == 202
+    # The second event fills the batch: both are flushed together.
+    assert client.post("/api/v1/assignments/push", json=_event("wb-live", 2)).status_code == 202
+    started = time.monotonic()
+    stats = _wait_for_flushes(q, before["flushes"] + 1)
+    assert time.monotonic() - started < 0.5  # no retry backoff
+    assert stats["rejected"] - before["rejected"] == 1
+    assert stats["written"] - before["written"] == 1
+    for key in ("failed", "retried", "dropped"):
+        assert stats[key] == before[key], key
+    assert _event_count(client, "wb-live") == 1
+
+
+def test_queued_writes_are_202_and_land_after_the_flush(app, client):
+    create_assignment(app, "wb-queued")
+    resp = client.post("/api/v1/assignments/push/batch", json=[_event("wb-queued", 1), _event("wb-queued", 2)])
+    assert resp.status_code == 202
+    body = resp.get_json()
+    assert body["queued"] is True and body["accepted"] == 2
+    assert all(r["ok"] and r["id"] for r in body["results"])
+    q = ingest_queue.get_line_event_queue()
+    deadline = time.monotonic() + 10.0
+    while _event_count(client, "wb-queued") < 2:
+        assert time.monotonic() < deadline, q.stats()
+        time.sleep(0.01)
+
+    resp = client.post("/api/v1/assignments/push", json=_event("wb-queued", 3))
+    assert resp.status_code == 202
+    assert resp.get_json()["queued"] is True
+
+
+def test_full_queue_is_429_with_retry_after(app, client, monkeypatch):
+    create_assignment(app, "wb-full")
+    assert client.post("/api/v1/assignments/push", json=_event("wb-full", 0)).status_code == 202
+    q = ingest_queue.get_line_event_queue()
+    # More events than the queue holds (PUSH_QUEUE_MAXSIZE=3): none of them is queued.
+    before = q.stats()
+    resp = client.post("/api/v1/assignments/push/batch", json=[_event("wb-full", line) for line in range(1, 5)])
+    assert resp.status_code == 429
+    assert resp.headers["Retry-After"] == "7"
+    assert resp.get_json()["retryAfter"] == 7
+    stats = q.stats()
+    assert stats["refused"] - before["refused"] == 4
+    assert stats["enqueued"] == before["enqueued"]
+
+    monkeypatch.setattr(q, "put_many", lambda items: False)  # a queue that stays full
+    resp = client.post("/api/v1/assignments/push", json=_event("wb-full", 5))
+    assert resp.status_code == 429
+    assert resp.headers["Retry-After"] == "7"